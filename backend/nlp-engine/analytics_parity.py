@@ -0,0 +1,286 @@
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import sentiment_analyzer as sa
+from benchmark import scored_records
+from rollup_store import RollupStore
+
+# (records, topics) corpora checked by default
+DEFAULT_SIZES = [(200, 5), (1702, 20), (20000, 200), (100000, 5000)]
+DEFAULT_SEEDS = [0, 1, 2]
+
+
+def detect_emerging_concerns_reference(sentiment_data, time_window_days=7, threshold=2.0):
+    """
+    Per-topic loop that detect_emerging_concerns replaced, kept as its reference
+
+    Each topic's rows are filtered, sorted and reduced one at a time.
+    """
+    if isinstance(sentiment_data, list):
+        df = pd.DataFrame(sentiment_data)
+    else:
+        df = sentiment_data
+
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    recent_cutoff = pd.Timestamp.now() - pd.Timedelta(days=time_window_days)
+    recent_data = df[df['timestamp'] >= recent_cutoff]
+
+    daily_topic_sentiment = recent_data.groupby([
+        'topic', pd.Grouper(key='timestamp', freq='D')
+    ])['score'].agg(['mean', 'count']).reset_index()
+
+    emerging_concerns = []
+    for topic in daily_topic_sentiment['topic'].unique():
+        topic_data = daily_topic_sentiment[daily_topic_sentiment['topic'] == topic]
+        if len(topic_data) < 3 or topic_data['count'].sum() < 10:
+            continue
+
+        topic_data = topic_data.sort_values('timestamp')
+        sentiment_values = topic_data['mean'].values
+        if len(sentiment_values) >= 3:
+            ma = np.convolve(sentiment_values, np.ones(3)/3, mode='valid')
+            if len(ma) >= 2 and ma[-1] < ma[0] - threshold * np.std(sentiment_values):
+                emerging_concerns.append({
+                    'topic': topic,
+                    'sentiment_start': float(ma[0]),
+                    'sentiment_end': float(ma[-1]),
+                    'change': float(ma[-1] - ma[0]),
+                    'message_volume': int(topic_data['count'].sum()),
+                    'confidence': min(1.0, abs(ma[-1] - ma[0]) / (np.std(sentiment_values) + 1e-5))
+                })
+
+    emerging_concerns.sort(key=lambda x: x['confidence'], reverse=True)
+    return emerging_concerns
+
+
+def generate_demographic_insights_reference(sentiment_data):
+    """generate_demographic_insights before the single-pass insights engine, kept as its reference"""
+    df = pd.DataFrame(sentiment_data) if isinstance(sentiment_data, list) else sentiment_data
+
+    insights = {}
+    if 'metadata' in df.columns and isinstance(df['metadata'].iloc[0], dict):
+        if 'demographic' not in df.columns:
+            df['demographic'] = df['metadata'].apply(
+                lambda x: x.get('demographic', 'Unspecified') if isinstance(x, dict) else 'Unspecified'
+            )
+
+    if 'demographic' in df.columns:
+        demo_sentiment = df.groupby('demographic')['score'].agg(['mean', 'count', 'std']).reset_index()
+        demo_sentiment = demo_sentiment.sort_values('count', ascending=False)
+        overall_mean = df['score'].mean()
+
+        demographic_insights = []
+        for _, row in demo_sentiment.iterrows():
+            if row['count'] < 10:
+                continue
+            diff = row['mean'] - overall_mean
+            sentiment_text = 'more positive' if diff > 0 else 'more negative'
+            demographic_insights.append({
+                'demographic': row['demographic'],
+                'sentiment_mean': float(row['mean']),
+                'sample_size': int(row['count']),
+                'difference_from_overall': float(diff),
+                'insight_text': f"{row['demographic']} are {abs(diff):.2f} points {sentiment_text} than average"
+            })
+        insights['demographic_sentiment'] = demographic_insights
+
+    if 'demographic' in df.columns and 'topic' in df.columns:
+        demo_topics = df.groupby(['demographic', 'topic']).size().reset_index(name='count')
+        top_topics_by_demo = {}
+        for demo in demo_topics['demographic'].unique():
+            demo_data = demo_topics[demo_topics['demographic'] == demo]
+            top_topics = demo_data.sort_values('count', ascending=False).head(3)
+            top_topics_by_demo[demo] = top_topics.to_dict('records')
+        insights['top_topics_by_demographic'] = top_topics_by_demo
+
+    return insights
+
+
+def generate_geographic_insights_reference(sentiment_data):
+    """generate_geographic_insights before the single-pass insights engine (provinces only)"""
+    df = pd.DataFrame(sentiment_data) if isinstance(sentiment_data, list) else sentiment_data
+
+    insights = {}
+    if 'metadata' in df.columns and isinstance(df['metadata'].iloc[0], dict):
+        if 'province' not in df.columns:
+            df['province'] = df['metadata'].apply(
+                lambda x: x.get('location', {}).get('province', 'Unknown')
+                if isinstance(x, dict) and isinstance(x.get('location'), dict)
+                else 'Unknown'
+            )
+
+    if 'province' in df.columns:
+        province_sentiment = df.groupby('province')['score'].agg(['mean', 'count', 'std']).reset_index()
+        province_sentiment = province_sentiment.sort_values('count', ascending=False)
+        overall_mean = df['score'].mean()
+
+        geo_insights = []
+        for _, row in province_sentiment.iterrows():
+            if row['count'] < 10 or row['province'] == 'Unknown':
+                continue
+            diff = row['mean'] - overall_mean
+            sentiment_text = 'more positive' if diff > 0 else 'more negative'
+            geo_insights.append({
+                'province': row['province'],
+                'sentiment_mean': float(row['mean']),
+                'sample_size': int(row['count']),
+                'difference_from_overall': float(diff),
+                'insight_text': f"{row['province']} is {abs(diff):.2f} points {sentiment_text} than average"
+            })
+        insights['provincial_sentiment'] = geo_insights
+
+    if 'province' in df.columns and 'topic' in df.columns:
+        geo_topics = df.groupby(['province', 'topic']).size().reset_index(name='count')
+        top_topics_by_province = {}
+        for province in geo_topics['province'].unique():
+            if province == 'Unknown':
+                continue
+            province_data = geo_topics[geo_topics['province'] == province]
+            top_topics = province_data.sort_values('count', ascending=False).head(3)
+            top_topics_by_province[province] = top_topics.to_dict('records')
+        insights['top_topics_by_province'] = top_topics_by_province
+
+    return insights
+
+
+def same_insights(actual, expected, rtol=1e-9):
+    """
+    Whether insights match their reference
+
+    Only the reference's keys are compared (the engine adds sentiment_std and
+    district insights). Means may differ in the last bits, since the engine
+    sums per cell before rolling up. Groups or topics tied on count may come
+    in any order in the reference, so ties are compared as sets.
+    """
+    for key, expected_value in expected.items():
+        actual_value = actual.get(key)
+        if key.startswith('top_topics_by_'):
+            if set(actual_value) != set(expected_value):
+                return False
+            for group, expected_topics in expected_value.items():
+                actual_topics = actual_value[group]
+                counts = [t['count'] for t in expected_topics]
+                if [t['count'] for t in actual_topics] != counts:
+                    return False
+                # Topics tied with the last one listed may have been cut either way
+                untied = lambda topics: {t['topic'] for t in topics if t['count'] > counts[-1]}
+                if untied(actual_topics) != untied(expected_topics):
+                    return False
+        else:
+            by_group = lambda rows: sorted(rows, key=lambda r: (-r['sample_size'], str(list(r.values())[0])))
+            if len(actual_value) != len(expected_value):
+                return False
+            for a, e in zip(by_group(actual_value), by_group(expected_value)):
+                for field, value in e.items():
+                    if isinstance(value, float):
+                        if not np.isclose(a[field], value, rtol=rtol, atol=1e-12):
+                            return False
+                    elif a[field] != value:
+                        return False
+    return True
+
+
+def same_trends(actual, expected, rtol=1e-9):
+    """
+    Whether concerns or spikes match their reference
+
+    Rollup means are sums over buckets divided by counts, so they may differ
+    from pandas' in the last bits, and entries tied on confidence may then
+    come in another order; entries are matched by topic or timestamp.
+    """
+    if len(actual) != len(expected):
+        return False
+    by_key = lambda rows: sorted(rows, key=lambda r: str(r.get('topic', r.get('timestamp'))))
+    for a, e in zip(by_key(actual), by_key(expected)):
+        for field, value in e.items():
+            if isinstance(value, float):
+                if not np.isclose(a[field], value, rtol=rtol, atol=1e-12):
+                    return False
+            elif a[field] != value:
+                return False
+    return True
+
+
+def rollups(records):
+    """A throwaway RollupStore holding the records"""
+    store = RollupStore(':memory:')
+    store.add(records)
+    return store
+
+
+def check(name, fn, reference, records, same=None, prepare=None, **kwargs):
+    """
+    Run fn and its reference on the same records and require identical output
+
+    same(actual, expected) replaces the equality test for outputs that may
+    legitimately differ, e.g. in the order of ties. prepare(records) builds
+    fn's input from the records (e.g. rollups), outside the timing.
+
+    Returns:
+        (seconds for fn, seconds for reference)
+    """
+    start = time.perf_counter()
+    expected = reference(list(records), **kwargs)
+    reference_seconds = time.perf_counter() - start
+    data = prepare(list(records)) if prepare else list(records)
+    start = time.perf_counter()
+    actual = fn(data, **kwargs)
+    seconds = time.perf_counter() - start
+
+    if not (same(actual, expected) if same else actual == expected):
+        raise AssertionError(f"{name} differs from its reference on {len(records)} records")
+    return seconds, reference_seconds
+
+
+CHECKS = {
+    'detect_emerging_concerns': (sa.detect_emerging_concerns, detect_emerging_concerns_reference),
+    'generate_demographic_insights': (
+        sa.generate_demographic_insights, generate_demographic_insights_reference, same_insights
+    ),
+    'generate_geographic_insights': (
+        sa.generate_geographic_insights, generate_geographic_insights_reference, same_insights
+    ),
+    # Rollup mode against the records themselves
+    'detect_emerging_concerns_rollups': (
+        sa.detect_emerging_concerns, sa.detect_emerging_concerns, same_trends, rollups
+    ),
+    'detect_sentiment_spikes_rollups': (
+        sa.detect_sentiment_spikes, sa.detect_sentiment_spikes, same_trends, rollups
+    ),
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Check the vectorized analytics against their per-group reference versions'
+    )
+    parser.add_argument('--checks', default=','.join(CHECKS),
+                        help='Comma-separated functions to check (default: all)')
+    parser.add_argument('--seeds', type=int, nargs='+', default=DEFAULT_SEEDS)
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.5, 1.0, 2.0],
+                        help='Concern thresholds to check (lower ones find more concerns)')
+    args = parser.parse_args()
+
+    for n_rows, n_topics in DEFAULT_SIZES:
+        for seed in args.seeds:
+            # Both versions take "now" separately; keep records clear of the cutoff
+            # so the few seconds between the calls cannot change which are in.
+            # This also leaves the rollup bucket holding the cutoff with no
+            # records from before it, so rollup mode sees the same records
+            cutoff = datetime.now() - timedelta(days=7, hours=-1)
+            records = [r for r in scored_records(n_rows, seed, n_topics) if r['timestamp'] > cutoff]
+            for name in args.checks.split(','):
+                fn, reference, *extra = CHECKS[name]
+                runs = [{'threshold': t} for t in args.thresholds] \
+                    if name.startswith('detect_emerging_concerns') else [{}]
+                for kwargs in runs:
+                    seconds, reference_seconds = check(
+                        name, fn, reference, records, *extra, **kwargs
+                    )
+                    options = ''.join(f' {key} {value}' for key, value in kwargs.items())
+                    print(f"  {name:<30} {n_rows:>7} records {n_topics:>5} topics seed {seed}"
+                          f"{options}: identical, {reference_seconds / seconds:.1f}x faster")
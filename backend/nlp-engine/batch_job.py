@@ -0,0 +1,427 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import signal
+import sqlite3
+import threading
+import time
+import zlib
+
+import pandas as pd
+
+import metrics
+import sentiment_analyzer
+from fact_index import FactIndex
+from result_store import ResultWriter
+from stream_pipeline import ANALYSIS_COLUMNS, TOPIC_COLUMNS, result_columns
+from topic_model import IncrementalTopicModel
+
+# Input rows per journaled chunk: the most work a crash can cost
+DEFAULT_JOB_CHUNK_SIZE = 5000
+
+# Settings a journal is tied to; resuming with different ones is refused
+JOB_SETTINGS = (
+    'input_path', 'input_size', 'input_mtime', 'text_column', 'chunk_size', 'topics',
+    'sentiment_model', 'sentiment_backend', 'sentiment_cascade', 'facts'
+)
+
+
+def facts_digest(verified_facts):
+    """SHA-1 of the verified facts (a FactIndex or a list of fact dicts), None without any"""
+    if not verified_facts:
+        return None
+    facts = verified_facts.facts if isinstance(verified_facts, FactIndex) else verified_facts
+    return hashlib.sha1(json.dumps(facts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class JobJournal:
+    """
+    SQLite journal of a batch job's completed chunks
+
+    Each chunk's analysis results are committed in one transaction together
+    with the input rows it covers, so after a crash the journal holds exactly
+    the chunks that finished. Topic assignments (and the incremental topic
+    model's state) are committed the same way by the final topic step.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS chunks ('
+            'chunk INTEGER PRIMARY KEY, start_row INTEGER NOT NULL, n_rows INTEGER NOT NULL, '
+            'results BLOB NOT NULL, completed_at REAL NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS topics ('
+            'chunk INTEGER PRIMARY KEY, topics BLOB NOT NULL, completed_at REAL NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value BLOB NOT NULL);'
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _pack(value):
+        return zlib.compress(json.dumps(value).encode('utf-8'), 1)
+
+    @staticmethod
+    def _unpack(blob):
+        return json.loads(zlib.decompress(blob))
+
+    def check_settings(self, settings):
+        """
+        Record the job's settings, or make sure they match the recorded ones
+
+        Raises:
+            ValueError: The journal belongs to another input or configuration
+        """
+        recorded = dict(self._conn.execute('SELECT key, value FROM settings'))
+        current = {key: json.dumps(settings[key]) for key in JOB_SETTINGS}
+        if not recorded:
+            with self._conn:
+                self._conn.executemany('INSERT INTO settings VALUES (?, ?)', current.items())
+            return
+        changed = [key for key in JOB_SETTINGS if recorded.get(key) != current[key]]
+        if changed:
+            raise ValueError(
+                f"Journal {self.path} was started with different {', '.join(changed)}; "
+                f"use a new journal or restart the job"
+            )
+
+    def completed_chunks(self):
+        """Numbers of the chunks whose results are committed"""
+        return [chunk for (chunk,) in self._conn.execute('SELECT chunk FROM chunks ORDER BY chunk')]
+
+    def commit_chunk(self, chunk, start_row, results):
+        with self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)',
+                (chunk, start_row, len(results), self._pack(results), time.time())
+            )
+
+    def chunk_results(self, chunk):
+        row = self._conn.execute('SELECT results FROM chunks WHERE chunk = ?', (chunk,)).fetchone()
+        return None if row is None else self._unpack(row[0])
+
+    def topic_chunks(self):
+        """Numbers of the chunks whose topics are committed"""
+        return {chunk for (chunk,) in self._conn.execute('SELECT chunk FROM topics')}
+
+    def commit_topics(self, topics_by_chunk, state=None):
+        """
+        Commit topic assignments of one or more chunks, and optionally the
+        topic model state they leave behind, in one transaction
+        """
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO topics VALUES (?, ?, ?)',
+                [(chunk, self._pack(topics), now) for chunk, topics in topics_by_chunk.items()]
+            )
+            if state is not None:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO state VALUES (?, ?)', ('topic_model', state)
+                )
+
+    def chunk_topics(self, chunk):
+        row = self._conn.execute('SELECT topics FROM topics WHERE chunk = ?', (chunk,)).fetchone()
+        return None if row is None else self._unpack(row[0])
+
+    def state(self, key):
+        row = self._conn.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def close(self):
+        self._conn.close()
+
+
+class JobInterrupted(Exception):
+    """Raised when a stop was requested (e.g. SIGTERM); committed chunks are kept"""
+
+
+class BatchJob:
+    """
+    Resumable analyze_text_batch over a CSV file, journaled chunk by chunk
+
+    The job runs in three steps, each of which skips work the journal
+    already holds:
+
+    1. analyze: the input is read in numbered chunks of chunk_size rows;
+       each is analyzed (with duplicates collapsed, but without topics) and
+       committed to the journal with its row offset. A resumed job reads
+       past the committed chunks and continues with the next one.
+    2. topics: topics are assigned over the processed texts of every chunk.
+       With an incremental topic model each chunk is a checkpoint (its
+       topics and the model state are committed together); otherwise topics
+       are refitted over the whole corpus and committed at once, so a crash
+       there costs no inference.
+    3. export: the output file is written from the input and the journal.
+
+    SIGTERM (and Ctrl-C) stop the job after the chunk in progress.
+
+    Usage:
+        job = BatchJob('comments.csv', 'comments-job.sqlite')
+        job.run('comments-analyzed.parquet')
+    """
+
+    def __init__(self, input_path, journal_path, text_column='Comment',
+                 chunk_size=DEFAULT_JOB_CHUNK_SIZE, verified_facts=None, topic_model=None):
+        """
+        Args:
+            input_path: CSV file with one comment per row
+            journal_path: SQLite journal, created if missing and resumed otherwise
+            text_column: Name of the column holding the comment text
+            chunk_size: Input rows per journaled chunk
+            verified_facts: Optional FactIndex or list of verified facts for misinformation checks
+            topic_model: Optional IncrementalTopicModel (checkpointed per chunk);
+                None refits topics over the whole corpus
+        """
+        self.input_path = input_path
+        self.text_column = text_column
+        self.chunk_size = chunk_size
+        self.verified_facts = verified_facts
+        self.topic_model = topic_model
+        self.journal = JobJournal(journal_path)
+        self._stop = threading.Event()
+
+        stat = os.stat(input_path)
+        self.journal.check_settings({
+            'input_path': os.path.abspath(input_path),
+            'input_size': stat.st_size,
+            'input_mtime': stat.st_mtime,
+            'text_column': text_column,
+            'chunk_size': chunk_size,
+            'topics': 'incremental' if topic_model is not None else 'refit',
+            # Results of different models, backends, cascades or facts must not be mixed
+            'sentiment_model': sentiment_analyzer.SENTIMENT_MODEL_NAME,
+            'sentiment_backend': sentiment_analyzer.SENTIMENT_BACKEND,
+            'sentiment_cascade': sentiment_analyzer.SENTIMENT_CASCADE_THRESHOLD,
+            'facts': facts_digest(verified_facts),
+        })
+
+    def request_stop(self, *_):
+        """Stop after the chunk in progress (also the SIGTERM handler)"""
+        self._stop.set()
+
+    def _check_stop(self):
+        if self._stop.is_set():
+            raise JobInterrupted(f"Stopped; {len(self.journal.completed_chunks())} chunks are journaled")
+
+    def _read_chunks(self, start_chunk=0, columns=None):
+        """
+        (chunk number, DataFrame) pairs from start_chunk on
+
+        Earlier chunks are parsed and dropped rather than skipped by line
+        number, since a quoted comment may span several lines.
+        """
+        reader = pd.read_csv(self.input_path, chunksize=self.chunk_size, usecols=columns)
+        for chunk, df in enumerate(reader):
+            if chunk >= start_chunk and not df.empty:
+                yield chunk, df
+
+    def analyze(self):
+        """
+        Analyze and journal every chunk not committed yet
+
+        Returns:
+            Number of chunks analyzed by this call
+        """
+        completed = self.journal.completed_chunks()
+        # Chunks are committed in order, so everything before the next one is done
+        start_chunk = completed[-1] + 1 if completed else 0
+        if self.verified_facts and not isinstance(self.verified_facts, FactIndex):
+            self.verified_facts = sentiment_analyzer.build_fact_index(self.verified_facts)
+
+        n_analyzed = 0
+        for chunk, df in self._read_chunks(start_chunk, [self.text_column]):
+            self._check_stop()
+            start_row = chunk * self.chunk_size
+            with metrics.stage('job_chunk', items=len(df)):
+                results = sentiment_analyzer.analyze_text_batch(
+                    df[self.text_column].tolist(), self.verified_facts, topics=False
+                )
+            for result in results:
+                # Only the analyzed texts feed the topic step; duplicates need no copy
+                if result['duplicate_of'] is not None:
+                    result['duplicate_of'] += start_row
+                    del result['processed_text']
+            self.journal.commit_chunk(chunk, start_row, results)
+            n_analyzed += 1
+        return n_analyzed
+
+    def _topic_inputs(self, chunk):
+        """Processed texts of a chunk's analyzed rows, and their positions"""
+        results = self.journal.chunk_results(chunk)
+        rows = [i for i, result in enumerate(results) if result['duplicate_of'] is None]
+        return results, rows, [{'processed_text': results[i]['processed_text']} for i in rows]
+
+    def _spread_topics(self, chunk, results, rows, assigned):
+        """Topic of every row of a chunk; duplicates take their representative's"""
+        topics = [None] * len(results)
+        for i, result in zip(rows, assigned):
+            topics[i] = result.get('topic')
+        # Duplicates are collapsed within a chunk, so representatives are in the same one
+        start_row = chunk * self.chunk_size
+        for i, result in enumerate(results):
+            if result['duplicate_of'] is not None:
+                topics[i] = topics[result['duplicate_of'] - start_row]
+        return topics
+
+    def assign_topics(self):
+        """
+        Assign topics to every journaled row that has none yet
+
+        Returns:
+            Number of chunks whose topics were committed by this call
+        """
+        chunks = self.journal.completed_chunks()
+        pending = [chunk for chunk in chunks if chunk not in self.journal.topic_chunks()]
+        if not pending:
+            return 0
+
+        if self.topic_model is None:
+            # One refit over the whole corpus, committed in one transaction
+            inputs = {chunk: self._topic_inputs(chunk) for chunk in chunks}
+            corpus = [item for _, _, items in inputs.values() for item in items]
+            sentiment_analyzer.assign_topics(corpus)
+            self.journal.commit_topics({
+                chunk: self._spread_topics(chunk, results, rows, items)
+                for chunk, (results, rows, items) in inputs.items()
+            })
+            return len(chunks)
+
+        # Resume the model from the last committed chunk, not from whatever was saved later
+        state = self.journal.state('topic_model')
+        if state is not None:
+            self.topic_model = pickle.loads(state)
+        for chunk in pending:
+            self._check_stop()
+            results, rows, items = self._topic_inputs(chunk)
+            sentiment_analyzer.assign_topics(items, self.topic_model)
+            self.journal.commit_topics(
+                {chunk: self._spread_topics(chunk, results, rows, items)},
+                pickle.dumps(self.topic_model)
+            )
+        return len(pending)
+
+    def export(self, output_path):
+        """
+        Write the input rows with their analysis columns to a CSV or .parquet file
+
+        An input without rows gives a file with the header (or schema) alone.
+
+        Returns:
+            Number of rows written
+        """
+        writer = ResultWriter(output_path) if output_path.endswith('.parquet') else None
+        rows_written = 0
+        try:
+            for chunk, df in self._read_chunks():
+                results = self.journal.chunk_results(chunk)
+                if results is None:
+                    raise ValueError(f"Chunk {chunk} has not been analyzed; run the job first")
+                for result, topic in zip(results, self.journal.chunk_topics(chunk) or []):
+                    if topic is not None:
+                        result['topic'] = topic
+
+                if writer is not None:
+                    writer.write(df, results)
+                else:
+                    analysis = pd.DataFrame([result_columns(r) for r in results], index=df.index)
+                    pd.concat([df, analysis], axis=1).to_csv(
+                        output_path, mode='w' if rows_written == 0 else 'a',
+                        header=rows_written == 0, index=False
+                    )
+                rows_written += len(df)
+
+            if rows_written == 0:
+                df = pd.read_csv(self.input_path, nrows=0)
+                if writer is not None:
+                    writer.write(df, [])
+                else:
+                    columns = pd.DataFrame(columns=ANALYSIS_COLUMNS + TOPIC_COLUMNS)
+                    pd.concat([df, columns], axis=1).to_csv(output_path, index=False)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows_written
+
+    def run(self, output_path=None):
+        """
+        Run (or resume) every step, stopping cleanly on SIGTERM
+
+        Returns:
+            Dict with the chunks analyzed and topic-assigned by this run and
+            the rows exported
+
+        Raises:
+            JobInterrupted: A stop was requested; run again to resume
+        """
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                handlers[signum] = signal.signal(signum, self.request_stop)
+        try:
+            summary = {'chunks_analyzed': self.analyze(), 'topic_chunks': self.assign_topics()}
+            summary['rows_exported'] = self.export(output_path) if output_path else 0
+            return summary
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def close(self):
+        self.journal.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run or resume a checkpointed batch analysis of a CSV')
+    parser.add_argument('input', help='Input CSV file')
+    parser.add_argument('output', help='Output CSV file, or a .parquet file for the columnar result store')
+    parser.add_argument('--journal', help='SQLite job journal (default: <output>.job.sqlite)')
+    parser.add_argument('--restart', action='store_true', help='Discard the journal and start over')
+    parser.add_argument('--text-column', default='Comment')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_JOB_CHUNK_SIZE,
+                        help='Input rows per journaled chunk')
+    parser.add_argument('--facts', help='Verified facts: a saved FactIndex (.npz) or a JSON list')
+    parser.add_argument('--topic-model',
+                        help='Incremental topic model file (checkpointed per chunk, saved after the '
+                             'run); without it topics are refitted over the whole input')
+    parser.add_argument('--cache', help='SQLite result cache to reuse across runs')
+    parser.add_argument('--metrics', help='Write per-stage metrics to this Prometheus text file')
+    args = parser.parse_args()
+
+    journal_path = args.journal or f'{args.output}.job.sqlite'
+    if args.restart and os.path.exists(journal_path):
+        os.remove(journal_path)
+    if args.cache:
+        sentiment_analyzer.enable_result_cache(args.cache)
+    if args.metrics:
+        metrics.enable(metrics.PrometheusFileSink(args.metrics))
+
+    verified_facts = None
+    if args.facts:
+        if args.facts.endswith('.npz'):
+            verified_facts = FactIndex.load(args.facts)
+        else:
+            with open(args.facts) as f:
+                verified_facts = json.load(f)
+
+    topic_model = None
+    if args.topic_model:
+        topic_model = IncrementalTopicModel.load_or_create(args.topic_model)
+
+    job = BatchJob(args.input, journal_path, args.text_column, args.chunk_size,
+                   verified_facts, topic_model)
+    try:
+        summary = job.run(args.output)
+    except JobInterrupted as e:
+        print(f"{e}; run the same command again to resume")
+        raise SystemExit(1)
+    finally:
+        job.close()
+        metrics.flush()
+
+    if job.topic_model is not None:
+        job.topic_model.save(args.topic_model)
+    print(f"Analyzed {summary['chunks_analyzed']} new chunks, assigned topics to "
+          f"{summary['topic_chunks']}, wrote {summary['rows_exported']} rows to {args.output}")
@@ -0,0 +1,494 @@
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Never reach for the network: use whatever is cached, or the stand-ins below
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
+os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+import sentiment_analyzer as sa
+from dedup import find_duplicates
+from embedding_store import EmbeddingStore
+from rollup_store import RollupStore
+from trend_detector import StreamingTrendDetector
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(ENGINE_DIR, 'Newdataset.csv')
+STAND_IN_DIR = os.path.join(ENGINE_DIR, '.bench-models')
+
+# Items processed by the model-bound stages; the rest run on the full corpus
+DEFAULT_MODEL_ITEMS = 5000
+DEFAULT_TOPIC_ITEMS = 20000
+
+DISTRICT_PROVINCES = {
+    'Gasabo': 'Kigali', 'Kicukiro': 'Kigali', 'Nyarugenge': 'Kigali',
+    'Musanze': 'Northern', 'Gicumbi': 'Northern', 'Huye': 'Southern',
+    'Muhanga': 'Southern', 'Rwamagana': 'Eastern', 'Nyagatare': 'Eastern',
+    'Rubavu': 'Western', 'Rusizi': 'Western'
+}
+DEMOGRAPHICS = ['Students', 'Daily commuters', 'Moto riders', 'Traders', 'Civil servants', 'Elderly']
+SOURCES = ['twitter', 'facebook', 'news_comments', 'forum', 'survey']
+
+# Social media noise added to synthetic comments
+DECORATIONS = [
+    '', '', ' #RwandaTransport', ' @RURA_RWANDA', ' https://t.co/fare123',
+    ' #TapAndGo please fix this!', ' Kigali buses...'
+]
+
+BENCH_FACTS = [
+    "The new distance-based fare system calculates fares based on kilometers traveled.",
+    "The maximum fare increase for any single route is 50% compared to previous flat rates.",
+    "Card readers are installed and functional on all public buses in Kigali."
+]
+
+
+# --- Corpora ---------------------------------------------------------------
+
+def load_corpus(n_rows=None, seed=42):
+    """
+    Bundled dataset, or a synthetic corpus of n_rows built from it
+
+    Synthetic rows resample the bundled comments, add hashtags, mentions and
+    links, and spread them over districts and dates.
+    """
+    df = pd.read_csv(DATASET_PATH)
+    if n_rows is None:
+        return df
+
+    rng = np.random.default_rng(seed)
+    comments = df['Comment'].to_numpy()
+    decorations = np.array(DECORATIONS)
+    districts = np.array(list(DISTRICT_PROVINCES))
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 365, n_rows), unit='D')
+
+    return pd.DataFrame({
+        'Name': 'Synthetic',
+        'District': districts[rng.integers(0, len(districts), n_rows)],
+        'Sentiment': df['Sentiment'].to_numpy()[rng.integers(0, len(df), n_rows)],
+        'Comment': np.char.add(
+            comments[rng.integers(0, len(comments), n_rows)].astype(str),
+            decorations[rng.integers(0, len(decorations), n_rows)]
+        ),
+        'Date': dates.strftime('%m/%d/%Y')
+    })
+
+
+def scored_records(n_rows, seed=42, n_topics=20):
+    """Scored records shaped like the analytics functions' input, over the last week"""
+    rng = np.random.default_rng(seed)
+    now = datetime.now()
+    districts = list(DISTRICT_PROVINCES)
+    topics = [f'topic {i}' for i in range(n_topics)]
+
+    hours = rng.uniform(0, 7 * 24, n_rows)
+    topic_idx = rng.integers(0, len(topics), n_rows)
+    # Give some topics a downward drift so concerns are actually found
+    drift = np.where(topic_idx < max(3, n_topics // 7), -hours / (7 * 24), 0.0)
+    scores = np.clip(rng.normal(0.1, 0.4, n_rows) - drift, -1, 1)
+    district_idx = rng.integers(0, len(districts), n_rows)
+    demographic_idx = rng.integers(0, len(DEMOGRAPHICS), n_rows)
+    source_idx = rng.integers(0, len(SOURCES), n_rows)
+
+    records = []
+    for i in range(n_rows):
+        district = districts[district_idx[i]]
+        records.append({
+            'timestamp': now - timedelta(hours=float(hours[i])),
+            'topic': topics[topic_idx[i]],
+            'source': SOURCES[source_idx[i]],
+            'score': float(scores[i]),
+            'metadata': {
+                'demographic': DEMOGRAPHICS[demographic_idx[i]],
+                'location': {'province': DISTRICT_PROVINCES[district], 'district': district}
+            }
+        })
+    return records
+
+
+def bench_facts(n_facts):
+    """BENCH_FACTS plus templated statements, up to n_facts"""
+    facts = [{'statement': s, 'source': 'benchmark'} for s in BENCH_FACTS]
+    districts = list(DISTRICT_PROVINCES)
+    i = 0
+    while len(facts) < n_facts:
+        facts.append({
+            'statement': f"The fare from {districts[i % len(districts)]} to Nyabugogo is "
+                         f"{200 + 10 * i} RWF for {5 + i % 40} kilometers.",
+            'source': 'benchmark'
+        })
+        i += 1
+    return facts[:n_facts]
+
+
+# --- Offline stand-in models ----------------------------------------------
+
+class _IdentityLemmatizer:
+    def lemmatize(self, word, pos='n'):
+        return word
+
+
+def _stand_in_sentiment_model(texts):
+    """Tiny randomly initialised BERT with the real model's 5 labels, saved locally"""
+    from transformers import (
+        BertConfig, BertForSequenceClassification, BertTokenizerFast
+    )
+
+    model_dir = os.path.join(STAND_IN_DIR, 'sentiment')
+    if not os.path.exists(os.path.join(model_dir, 'config.json')):
+        os.makedirs(model_dir, exist_ok=True)
+        words = sorted({w for text in texts for w in re.findall(r'\w+', str(text).lower())})
+        vocab_path = os.path.join(model_dir, 'vocab.txt')
+        with open(vocab_path, 'w') as f:
+            f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + words))
+
+        tokenizer = BertTokenizerFast(vocab_path, do_lower_case=True)
+        config = BertConfig(
+            vocab_size=tokenizer.vocab_size, hidden_size=64, num_hidden_layers=2,
+            num_attention_heads=2, intermediate_size=128, num_labels=5
+        )
+        import torch
+        torch.manual_seed(0)
+        BertForSequenceClassification(config).save_pretrained(model_dir)
+        tokenizer.save_pretrained(model_dir)
+
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+    return AutoTokenizer.from_pretrained(model_dir), model
+
+
+def _stand_in_spacy(language, texts):
+    """Blank pipeline with an untrained NER and random word vectors"""
+    import spacy
+
+    nlp = spacy.blank(language)
+    nlp.add_pipe('ner').add_label('LOC')
+    nlp.initialize()
+
+    rng = np.random.default_rng(0)
+    words = sorted({w for text in texts for w in re.findall(r'\w+', str(text).lower())})
+    nlp.vocab.reset_vectors(width=50)
+    for word in words:
+        nlp.vocab.set_vector(word, rng.normal(size=50).astype(np.float32))
+    return nlp
+
+
+def install_stand_ins(texts):
+    """
+    Use cached models where available and small local stand-ins otherwise
+
+    Returns:
+        Names of the resources that were replaced by stand-ins
+    """
+    import nltk
+
+    stand_ins = []
+
+    try:
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+        tokenizer = AutoTokenizer.from_pretrained(sa.SENTIMENT_MODEL_NAME, local_files_only=True)
+        model = AutoModelForSequenceClassification.from_pretrained(
+            sa.SENTIMENT_MODEL_NAME, local_files_only=True
+        )
+        model.eval()
+        sa.set_resource('sentiment_model', (tokenizer, model))
+    except OSError:
+        sa.set_resource('sentiment_model', _stand_in_sentiment_model(texts))
+        stand_ins.append('sentiment_model')
+
+    import spacy
+    for language, model_name in sa.SPACY_MODELS.items():
+        try:
+            sa.set_resource(f'nlp_{language}', spacy.load(model_name))
+        except OSError:
+            sa.set_resource(f'nlp_{language}', _stand_in_spacy(language, texts))
+            stand_ins.append(f'nlp_{language}')
+
+    from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+    nltk_stand_ins = {
+        'lemmatizer': ('corpora/wordnet', _IdentityLemmatizer),
+        'stopwords_en': ('corpora/stopwords', lambda: set(ENGLISH_STOP_WORDS)),
+        'stopwords_fr': ('corpora/stopwords', set),
+    }
+    for name, (resource_path, make_stand_in) in nltk_stand_ins.items():
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            sa.set_resource(name, make_stand_in())
+            stand_ins.append(name)
+
+    return stand_ins
+
+
+# --- Measurement ----------------------------------------------------------
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # ru_maxrss is the lifetime peak (KB on Linux, bytes on macOS)
+        scale = 1 if platform.system() == 'Darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class PeakRssMonitor:
+    """Samples RSS in a background thread and records the peak"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def run_stage(fn, items, batch_size):
+    """
+    Call fn on consecutive batches of items, timing each call
+
+    Returns:
+        Dict with throughput, p50/p99 latency per call and peak RSS
+    """
+    latencies = []
+    with PeakRssMonitor() as monitor:
+        start = time.perf_counter()
+        for i in range(0, len(items), batch_size):
+            batch = items[i:i + batch_size]
+            t0 = time.perf_counter()
+            fn(batch)
+            latencies.append(time.perf_counter() - t0)
+        total = time.perf_counter() - start
+
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'items': len(items),
+        'batch_size': batch_size,
+        'seconds': total,
+        'throughput_per_s': len(items) / total if total > 0 else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50) * 1000),
+        'p99_ms': float(np.percentile(latencies, 99) * 1000),
+        'peak_rss_mb': monitor.peak / 2 ** 20
+    }
+
+
+# --- Stages ---------------------------------------------------------------
+
+def benchmark_corpus(df, stages=None, model_items=DEFAULT_MODEL_ITEMS,
+                     topic_items=DEFAULT_TOPIC_ITEMS, n_facts=1000):
+    """
+    Time every pipeline stage on one corpus
+
+    Per-text stages run one call per text; model-bound stages run on batches
+    of the first model_items texts; analytics run once on the whole corpus.
+
+    Returns:
+        Dict of stage name -> measurements
+    """
+    texts = df['Comment'].tolist()
+    wanted = lambda name: stages is None or name in stages
+    results = {}
+
+    def record(name, fn, items, batch_size):
+        if wanted(name):
+            results[name] = run_stage(fn, items, batch_size)
+            print(f"  {name:<32} {results[name]['throughput_per_s']:>12.1f} items/s  "
+                  f"p50 {results[name]['p50_ms']:.3f} ms  p99 {results[name]['p99_ms']:.3f} ms  "
+                  f"peak {results[name]['peak_rss_mb']:.0f} MB")
+
+    # Upstream stages feed the later ones, so compute them even if not timed
+    languages, _, processed = sa.preprocess_batch(texts)
+
+    record('detect_language', lambda batch: [sa.detect_language(t) for t in batch], texts, 1)
+    record(
+        'preprocess_text',
+        lambda batch: [sa.preprocess_text(t, l) for t, l in batch],
+        list(zip(texts, languages)), 1
+    )
+    record('preprocess_batch', sa.preprocess_batch, texts, 256)
+    record('find_duplicates', find_duplicates, texts, len(texts))
+
+    model_texts = texts[:model_items]
+    model_languages = languages[:model_items]
+    model_processed = processed[:model_items]
+
+    record('analyze_sentiment', sa.analyze_sentiment_batch, model_processed, sa.SENTIMENT_BATCH_SIZE)
+    record(
+        'extract_entities',
+        lambda batch: sa.extract_entities_batch([t for t, _ in batch], [l for _, l in batch]),
+        list(zip(model_texts, model_languages)), sa.SPACY_BATCH_SIZE
+    )
+
+    if wanted('detect_misinformation'):
+        fact_index = sa.build_fact_index(bench_facts(n_facts))
+        sentiments = sa.analyze_sentiment_batch(model_processed)
+        record(
+            'detect_misinformation',
+            lambda batch: sa.detect_misinformation_batch(
+                [t for t, _ in batch], fact_index, [s for _, s in batch]
+            ),
+            list(zip(model_texts, sentiments)), sa.STREAM_CHUNK_SIZE
+        )
+
+    if any(wanted(name) for name in ('embedding_store_append', 'embedding_search_exact', 'embedding_search_ivf')):
+        vectors = sa.embed_texts(model_texts)
+        with tempfile.TemporaryDirectory() as store_dir:
+            store = EmbeddingStore(store_dir)
+            record(
+                'embedding_store_append',
+                lambda batch: store.append(vectors[batch], batch.tolist()),
+                np.arange(len(vectors)), sa.STREAM_CHUNK_SIZE
+            )
+            store = EmbeddingStore(store_dir)
+            store.append(vectors, range(len(vectors)))
+            queries = vectors[:100]
+            record('embedding_search_exact', lambda batch: store.search(batch, exact=True), queries, 10)
+            store.build_index()
+            record('embedding_search_ivf', store.search, queries, 10)
+
+    topic_processed = processed[:topic_items]
+    record('extract_topics', sa.extract_topics, topic_processed, len(topic_processed))
+
+    analytics = {
+        'detect_emerging_concerns': sa.detect_emerging_concerns,
+        'detect_sentiment_spikes': sa.detect_sentiment_spikes,
+        'generate_demographic_insights': sa.generate_demographic_insights,
+        'generate_geographic_insights': sa.generate_geographic_insights,
+        'generate_insights': sa.generate_insights,
+    }
+    if any(wanted(name) for name in analytics):
+        records = scored_records(len(df))
+        for name, fn in analytics.items():
+            # Each call gets a fresh list; the functions build their own DataFrame
+            record(name, lambda batch, fn=fn: fn(list(batch)), records, len(records))
+
+    if wanted('trend_detector_update') or wanted('trend_detector_check'):
+        records = scored_records(len(df))
+        # Records arrive in small batches; a check reads the rolling aggregates only
+        record('trend_detector_update', StreamingTrendDetector().update, records, 100)
+        detector = StreamingTrendDetector().update(records)
+        record(
+            'trend_detector_check',
+            lambda batch: [(detector.emerging_concerns(), detector.sentiment_spikes()) for _ in batch],
+            [None] * 10, 1
+        )
+
+    if wanted('rollup_add') or wanted('rollup_query'):
+        records = scored_records(len(df))
+        # Batches are folded into the buckets; queries read the buckets only
+        record('rollup_add', RollupStore(':memory:').add, records, 1000)
+        rollups = RollupStore(':memory:')
+        rollups.add(records)
+        record(
+            'rollup_query',
+            lambda batch: [(sa.detect_emerging_concerns(rollups), sa.detect_sentiment_spikes(rollups),
+                            rollups.overview(timeframe='daily')) for _ in batch],
+            [None] * 10, 1
+        )
+
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ENGINE_DIR, text=True,
+            stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """Print throughput ratios of current vs a previous results file"""
+    previous_runs = {run['rows']: run for run in previous['runs']}
+    print(f"\nCompared with {previous['meta'].get('commit')} (>1.00 is faster):")
+    for run in current['runs']:
+        old_run = previous_runs.get(run['rows'])
+        if old_run is None:
+            continue
+        print(f"  {run['corpus']} ({run['rows']} rows)")
+        for name, stage in run['stages'].items():
+            old_stage = old_run['stages'].get(name)
+            if old_stage and old_stage['throughput_per_s'] > 0:
+                ratio = stage['throughput_per_s'] / old_stage['throughput_per_s']
+                print(f"    {name:<32} {ratio:6.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the nlp-engine stages')
+    parser.add_argument('--rows', type=int, action='append',
+                        help='Synthetic corpus size (repeatable); the bundled dataset is always run')
+    parser.add_argument('--stages', help='Comma-separated stage names to run (default: all)')
+    parser.add_argument('--model-items', type=int, default=DEFAULT_MODEL_ITEMS,
+                        help='Texts used by the model-bound stages')
+    parser.add_argument('--topic-items', type=int, default=DEFAULT_TOPIC_ITEMS,
+                        help='Texts used by extract_topics')
+    parser.add_argument('--facts', type=int, default=1000, help='Verified facts in the fact index')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--compare', help='Previous results file to compare against')
+    args = parser.parse_args()
+
+    stages = set(args.stages.split(',')) if args.stages else None
+    bundled = load_corpus()
+    stand_ins = install_stand_ins(bundled['Comment'])
+    if stand_ins:
+        print(f"Using offline stand-ins for: {', '.join(stand_ins)}")
+
+    corpora = [('Newdataset.csv', bundled)]
+    for n_rows in args.rows or []:
+        corpora.append((f'synthetic-{n_rows}', load_corpus(n_rows)))
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'stand_ins': stand_ins
+        },
+        'runs': []
+    }
+
+    for name, df in corpora:
+        print(f"{name} ({len(df)} rows)")
+        report['runs'].append({
+            'corpus': name,
+            'rows': len(df),
+            'stages': benchmark_corpus(df, stages, args.model_items, args.topic_items, args.facts)
+        })
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
@@ -0,0 +1,189 @@
+import argparse
+import glob
+import json
+import os
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from result_store import read_results
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT_DIR = os.path.join(ENGINE_DIR, '..', '..', 'frontend', 'public', 'dashboard')
+
+SENTIMENTS = ['positive', 'neutral', 'negative']
+
+# One directory of payloads per partition: (directory, cube level)
+PARTITIONS = [('districts', 'district'), ('days', 'day'), ('topics', 'topic')]
+
+# Key of each level's breakdown within a payload
+BREAKDOWN_KEYS = {'district': 'districts', 'day': 'daily', 'topic': 'topics'}
+
+
+def load_results(path, district_column='District', date_column='Date'):
+    """Columns the exporter needs from a Parquet result file or a results CSV"""
+    wanted = [
+        district_column, date_column, 'Predicted_Sentiment', 'Sentiment_Score', 'Topic_Id', 'Topic'
+    ]
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        available = set(pq.read_schema(path).names)
+        return read_results(path, columns=[c for c in wanted if c in available])
+    return pd.read_csv(path, usecols=lambda column: column in wanted)
+
+
+def build_cube(df, district_column='District', date_column='Date'):
+    """
+    Count and score sum of the results per district, day, topic and sentiment
+
+    Every payload is sliced from this cube, so the rows are grouped once
+    however many partitions are written.
+    """
+    if 'Topic_Id' in df.columns and df['Topic_Id'].notna().any():
+        topic = df['Topic_Id'].astype('Int64').astype(str).where(df['Topic_Id'].notna(), 'none')
+    elif 'Topic' in df.columns:
+        topic = df['Topic'].astype(object).fillna('none')
+    else:
+        topic = pd.Series('none', index=df.index)
+
+    days = pd.to_datetime(df[date_column], errors='coerce', format='mixed')
+    frame = pd.DataFrame({
+        'district': df[district_column].astype(object).fillna('Unknown'),
+        'day': days.dt.strftime('%Y-%m-%d').astype(object).fillna('unknown'),
+        'topic': topic,
+        'sentiment': df['Predicted_Sentiment'].astype(str).str.lower(),
+        'score': df['Sentiment_Score'].astype(float)
+    })
+    cube = frame.groupby(['district', 'day', 'topic', 'sentiment'], observed=True)['score'].agg(
+        count='size', score_sum='sum'
+    )
+
+    # Label of each topic id, for the payloads
+    labels = {}
+    if 'Topic' in df.columns:
+        labels = frame.assign(label=df['Topic'].astype(object)).dropna(subset=['label']) \
+            .drop_duplicates('topic').set_index('topic')['label'].to_dict()
+    return cube, labels
+
+
+def _mean_score(score_sum, count):
+    """Rounded mean score, or None without results (JSON has no NaN)"""
+    return round(float(score_sum / count), 4) if count else None
+
+
+def _breakdown(cube, by=None):
+    """
+    Count, mean score and count per sentiment, overall or per value of a level
+
+    Returns:
+        One summary dict, or a list of them (with the level's value) when by is set
+    """
+    if by is None:
+        grouped = cube.groupby(level='sentiment', observed=True).sum()
+        count = grouped['count'].sum()
+        return {
+            'count': int(count),
+            'mean_score': _mean_score(grouped['score_sum'].sum(), count),
+            **{s: int(grouped['count'].get(s, 0)) for s in SENTIMENTS}
+        }
+
+    grouped = cube.groupby(level=[by, 'sentiment'], observed=True).sum()
+    counts = grouped['count'].unstack('sentiment', fill_value=0).reindex(columns=SENTIMENTS, fill_value=0)
+    totals = grouped['count'].groupby(level=by).sum()
+    sums = grouped['score_sum'].groupby(level=by).sum()
+    return [
+        {by: key, 'count': int(totals[key]), 'mean_score': _mean_score(sums[key], totals[key]),
+         **{s: int(counts.at[key, s]) for s in SENTIMENTS}}
+        for key in totals.index
+    ]
+
+
+def _slug(value, used):
+    """File name for a partition value, unique within its directory"""
+    slug = re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-') or 'unknown'
+    candidate, n = slug, 1
+    while candidate in used:
+        n += 1
+        candidate = f'{slug}-{n}'
+    used.add(candidate)
+    return candidate
+
+
+def _write_json(path, payload):
+    with open(path, 'w') as f:
+        json.dump(payload, f, separators=(',', ':'), allow_nan=False)
+
+
+def export_dashboard(df, output_dir=DEFAULT_OUTPUT_DIR, district_column='District', date_column='Date'):
+    """
+    Write pre-aggregated dashboard payloads, partitioned by district, day and topic
+
+    Layout:
+        index.json              totals, the daily trend and one summary row
+                                (with its file) per district, day and topic
+        districts/<name>.json   daily trend and topics of one district
+        days/<yyyy-mm-dd>.json  districts and topics of one day
+        topics/<id>.json        daily trend and districts of one topic
+
+    The browser loads index.json and then only the partitions it shows,
+    instead of every result row. Payloads from a previous export are removed.
+
+    Args:
+        df: Results with the district, date, 'Predicted_Sentiment',
+            'Sentiment_Score' and 'Topic_Id' / 'Topic' columns
+        output_dir: Directory to write (created if missing)
+
+    Returns:
+        Number of files written
+    """
+    cube, labels = build_cube(df, district_column, date_column)
+    # What each partition is broken down by in its own payload
+    breakdowns = {'district': ['day', 'topic'], 'day': ['district', 'topic'], 'topic': ['day', 'district']}
+
+    index = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'summary': _breakdown(cube),
+        'daily': _breakdown(cube, 'day'),
+    }
+    n_files = 0
+    for directory, level in PARTITIONS:
+        path = os.path.join(output_dir, directory)
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, '*.json')):
+            os.remove(stale)
+
+        used, rows = set(), []
+        for row in _breakdown(cube, level):
+            key = row[level]
+            part = cube.xs(key, level=level, drop_level=False)
+            payload = {level: key, 'summary': _breakdown(part)}
+            for other in breakdowns[level]:
+                payload[BREAKDOWN_KEYS[other]] = _breakdown(part, other)
+            if level == 'topic':
+                payload['label'] = row['label'] = labels.get(key, key)
+
+            row['file'] = f'{directory}/{_slug(key, used)}.json'
+            _write_json(os.path.join(output_dir, row['file']), payload)
+            rows.append(row)
+            n_files += 1
+        index[directory] = rows
+
+    _write_json(os.path.join(output_dir, 'index.json'), index)
+    return n_files + 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Export partitioned dashboard payloads from analyzed results'
+    )
+    parser.add_argument('input', help='Parquet result file (or a results CSV)')
+    parser.add_argument('output_dir', nargs='?', default=DEFAULT_OUTPUT_DIR,
+                        help='Directory to write (default: frontend/public/dashboard)')
+    parser.add_argument('--district-column', default='District')
+    parser.add_argument('--date-column', default='Date')
+    args = parser.parse_args()
+
+    df = load_results(args.input, args.district_column, args.date_column)
+    n_files = export_dashboard(df, args.output_dir, args.district_column, args.date_column)
+    print(f"Wrote {n_files} dashboard files for {len(df)} results to {args.output_dir}")
@@ -0,0 +1,153 @@
+import numpy as np
+
+from result_cache import normalize_text
+
+# Texts whose estimated Jaccard similarity (over character shingles) reaches
+# this are treated as near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# Characters per shingle and MinHash permutations per text
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+
+# Texts whose signatures are computed together (bounds memory)
+SIGNATURE_BATCH_SIZE = 4096
+
+
+def dedup_key(text):
+    """Normalized form under which texts count as exact duplicates"""
+    return normalize_text(text).casefold()
+
+
+def lsh_bands(num_permutations, threshold):
+    """
+    (bands, rows) for LSH over signatures of num_permutations values
+
+    Uses the most rows per band whose S-curve midpoint, (1/bands)^(1/rows),
+    stays 0.1 below threshold: pairs near the threshold almost always share a
+    band, while clearly different texts rarely do. Candidates are checked
+    against the threshold afterwards, so this only affects speed and recall.
+    """
+    best = (num_permutations, 1)
+    for rows in range(1, num_permutations + 1):
+        bands = num_permutations // rows
+        if (1 / bands) ** (1 / rows) <= threshold - 0.1:
+            best = (bands, rows)
+    return best
+
+
+class MinHasher:
+    """
+    MinHash signatures of character shingles, computed for a batch at once
+
+    Shingles of up to 8 bytes are packed into one integer (so distinct
+    shingles never collide) and permuted with multiply-shift hashing; the
+    minimum per text is taken with np.minimum.reduceat over the whole batch.
+    """
+
+    def __init__(self, num_permutations=NUM_PERMUTATIONS, shingle_size=SHINGLE_SIZE, seed=1):
+        if not 1 <= shingle_size <= 8:
+            raise ValueError("shingle_size must be between 1 and 8 bytes")
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.multipliers = rng.integers(1, 2 ** 63, num_permutations, dtype=np.uint64) | np.uint64(1)
+        self.offsets = rng.integers(0, 2 ** 63, num_permutations, dtype=np.uint64)
+
+    def signatures(self, texts):
+        """(len(texts), num_permutations) uint32 signatures of normalized texts"""
+        k = self.shingle_size
+        encoded = [text.encode('utf-8').ljust(k) for text in texts]
+        lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.uint64)
+
+        # Every k-byte window packed into one integer
+        n_windows = len(data) - k + 1
+        shingles = np.zeros(n_windows, dtype=np.uint64)
+        for j in range(k):
+            shingles |= data[j:j + n_windows] << np.uint64(8 * j)
+
+        # Keep the windows that lie within one text
+        text_starts = np.r_[0, np.cumsum(lengths)[:-1]]
+        counts = lengths - k + 1
+        first = np.r_[0, np.cumsum(counts)[:-1]]
+        within = np.repeat(text_starts - first, counts) + np.arange(counts.sum())
+        shingles = shingles[within]
+
+        signatures = np.empty((len(texts), len(self.multipliers)), dtype=np.uint32)
+        for j, (a, b) in enumerate(zip(self.multipliers, self.offsets)):
+            permuted = (shingles * a + b) >> np.uint64(32)
+            signatures[:, j] = np.minimum.reduceat(permuted, first)
+        return signatures
+
+
+def find_duplicates(texts, threshold=NEAR_DUPLICATE_THRESHOLD, near=True,
+                    num_permutations=NUM_PERMUTATIONS, shingle_size=SHINGLE_SIZE):
+    """
+    Group exact and near-duplicate texts
+
+    Texts are first grouped by their normalized form (dedup_key). With near
+    set, the first text of each exact group is then compared with earlier
+    ones using MinHash/LSH: it joins the most similar earlier representative
+    whose estimated Jaccard similarity is at least threshold, or becomes a
+    representative itself. Every member is thus similar to its own
+    representative, and similarity does not chain across a group.
+
+    Args:
+        texts: List of texts; anything that is not a string is never grouped
+        threshold: Smallest estimated Jaccard similarity of near-duplicates
+        near: Also look for near-duplicates (False: exact duplicates only)
+
+    Returns:
+        duplicate_of: For each text, the index of the earlier text it
+        duplicates, or None for texts that are analyzed themselves
+    """
+    duplicate_of = [None] * len(texts)
+    first_by_key = {}
+    for i, text in enumerate(texts):
+        if not isinstance(text, str):
+            continue
+        key = dedup_key(text)
+        if key in first_by_key:
+            duplicate_of[i] = first_by_key[key]
+        else:
+            first_by_key[key] = i
+
+    if not near or len(first_by_key) < 2:
+        return duplicate_of
+
+    keys = list(first_by_key)
+    candidates = list(first_by_key.values())
+    hasher = MinHasher(num_permutations, shingle_size)
+    signatures = np.concatenate([
+        hasher.signatures(keys[start:start + SIGNATURE_BATCH_SIZE])
+        for start in range(0, len(keys), SIGNATURE_BATCH_SIZE)
+    ])
+
+    # One bucket key per band: its rows hashed into a single integer
+    bands, rows = lsh_bands(num_permutations, threshold)
+    mixers = np.random.default_rng(2).integers(1, 2 ** 63, rows, dtype=np.uint64)
+    band_keys = (
+        signatures[:, :bands * rows].reshape(len(keys), bands, rows).astype(np.uint64) * mixers
+    ).sum(axis=2).tolist()
+
+    buckets = [{} for _ in range(bands)]
+    representatives = {}
+    for position, i in enumerate(candidates):
+        matches = set()
+        for band, bucket_key in enumerate(band_keys[position]):
+            matches.update(buckets[band].get(bucket_key, ()))
+
+        if matches:
+            matches = sorted(matches)
+            similarity = (signatures[matches] == signatures[position]).mean(axis=1)
+            best = int(np.argmax(similarity))
+            if similarity[best] >= threshold:
+                duplicate_of[i] = representatives[matches[best]]
+                continue
+
+        representatives[position] = i
+        for band, bucket_key in enumerate(band_keys[position]):
+            buckets[band].setdefault(bucket_key, []).append(position)
+
+    # Exact duplicates of a near-duplicate point at its representative too
+    return [d if d is None or duplicate_of[d] is None else duplicate_of[d] for d in duplicate_of]
@@ -0,0 +1,328 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from fact_index import normalize_rows
+
+# Rows compared with the queries at a time by an exact search (bounds memory)
+SEARCH_BLOCK_ROWS = 65536
+
+# Rows k-means is trained on when the IVF index is built
+IVF_SAMPLE_SIZE = 100000
+
+# Inverted lists scanned per query by an approximate search
+DEFAULT_NPROBE = 8
+
+# Neighbours returned per query
+DEFAULT_TOP_K = 10
+
+# Files of a store directory
+VECTORS_FILE = 'vectors.f32'
+IDS_FILE = 'ids.jsonl'
+OFFSETS_FILE = 'ids.offsets'
+META_FILE = 'meta.json'
+CENTROIDS_FILE = 'centroids.npy'
+LISTS_FILE = 'lists.i32'
+
+
+def default_n_lists(n_rows):
+    """Inverted lists for an IVF index over n_rows vectors (about sqrt(n_rows))"""
+    return int(min(65536, max(1, round(np.sqrt(n_rows)))))
+
+
+class EmbeddingStore:
+    """
+    Append-only store of comment embeddings with nearest-neighbour search
+
+    A store is a directory holding the L2-normalized vectors as one raw
+    float32 file, read through np.memmap, and an id per row in a JSON-lines
+    sidecar (with the byte offset of each line, so an id is read without
+    scanning the file). Appending writes to the end of each file; nothing is
+    rewritten. Searches read the matrix block by block, or with an IVF index
+    (see build_index) only the rows of the lists closest to each query, so
+    the matrix never has to fit in RAM.
+
+    Usage:
+        store = EmbeddingStore('comments.embeddings')
+        analyze_text_batch(texts, embedding_store=store)
+        store.build_index()
+        store.search(embed_texts(["Bus fares are too expensive"]), k=5)
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: Store directory, created if missing
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.dim = None
+        meta_path = self._file(META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.dim = json.load(f)['dim']
+
+        self.centroids = None
+        if os.path.exists(self._file(CENTROIDS_FILE)):
+            self.centroids = np.load(self._file(CENTROIDS_FILE))
+        self._vectors = None
+        self._lists = None
+        self._truncate()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _size(self, name):
+        path = self._file(name)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    def __len__(self):
+        """Rows with both a vector and an id; a write cut short leaves the rest unread"""
+        if self.dim is None:
+            return 0
+        n_vectors = self._size(VECTORS_FILE) // (4 * self.dim)
+        n_ids = self._size(OFFSETS_FILE) // 8
+        return min(n_vectors, n_ids)
+
+    def _truncate(self):
+        """
+        Cut every file back to the rows complete in all of them
+
+        An append cut short (a crash, a full disk) can leave more ids than
+        vectors or the reverse; the next append would then pair its vectors
+        with the wrong ids. Rows missing from the IVF lists are assigned.
+        """
+        if self.dim is None:
+            return
+        n_rows = len(self)
+        ids_end = 0
+        if n_rows > 0:
+            ids_end = int(np.fromfile(
+                self._file(OFFSETS_FILE), dtype=np.int64, count=1, offset=8 * (n_rows - 1)
+            )[0])
+        for name, size in ((IDS_FILE, ids_end), (OFFSETS_FILE, 8 * n_rows),
+                           (VECTORS_FILE, 4 * self.dim * n_rows)):
+            if self._size(name) > size:
+                os.truncate(self._file(name), size)
+
+        if self.centroids is not None:
+            n_assigned = self._size(LISTS_FILE) // 4
+            if n_assigned > n_rows or self._size(LISTS_FILE) % 4:
+                os.truncate(self._file(LISTS_FILE), 4 * min(n_assigned, n_rows))
+                n_assigned = min(n_assigned, n_rows)
+            if n_assigned < n_rows:
+                with open(self._file(LISTS_FILE), 'ab') as f:
+                    f.write(self._assign(self.vectors[n_assigned:]).tobytes())
+        self._vectors = None
+        self._lists = None
+
+    @property
+    def vectors(self):
+        """(len(self), dim) read-only memmap of the stored vectors"""
+        n_rows = len(self)
+        if n_rows == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._vectors is None or len(self._vectors) != n_rows:
+            self._vectors = np.memmap(
+                self._file(VECTORS_FILE), dtype=np.float32, mode='r', shape=(n_rows, self.dim)
+            )
+        return self._vectors
+
+    def append(self, vectors, ids):
+        """
+        Add one vector per id to the end of the store
+
+        Args:
+            vectors: (n, dim) embeddings; normalized before they are written
+            ids: n JSON-serializable ids (e.g. comment ids or the texts themselves)
+        """
+        vectors = normalize_rows(vectors)
+        ids = list(ids)
+        if len(vectors) != len(ids):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(ids)} ids")
+        if len(ids) == 0:
+            return
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            with open(self._file(META_FILE), 'w') as f:
+                json.dump({'dim': self.dim}, f)
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Store holds {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+        # Ids first, so a row is only counted once its vector is complete too;
+        # whatever an earlier append left half-written is cut off first
+        self._truncate()
+        lines = [(json.dumps(row_id, ensure_ascii=False) + '\n').encode('utf-8') for row_id in ids]
+        with open(self._file(IDS_FILE), 'ab') as f:
+            start = f.tell()
+            f.write(b''.join(lines))
+        ends = start + np.cumsum([len(line) for line in lines], dtype=np.int64)
+        with open(self._file(OFFSETS_FILE), 'ab') as f:
+            f.write(ends.tobytes())
+        with open(self._file(VECTORS_FILE), 'ab') as f:
+            f.write(np.ascontiguousarray(vectors).tobytes())
+
+        # Keep the index covering every row
+        if self.centroids is not None:
+            with open(self._file(LISTS_FILE), 'ab') as f:
+                f.write(self._assign(vectors).tobytes())
+            self._lists = None
+
+    def ids(self, rows):
+        """Ids of the given rows"""
+        if len(rows) == 0:
+            return []
+        offsets = np.memmap(self._file(OFFSETS_FILE), dtype=np.int64, mode='r')
+        result = []
+        with open(self._file(IDS_FILE), 'rb') as f:
+            for row in rows:
+                start = int(offsets[row - 1]) if row > 0 else 0
+                f.seek(start)
+                result.append(json.loads(f.read(int(offsets[row]) - start)))
+        return result
+
+    def _assign(self, vectors):
+        """Nearest centroid of each vector, in blocks"""
+        lists = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS])
+            lists[start:start + len(block)] = (block @ self.centroids.T).argmax(axis=1)
+        return lists
+
+    def build_index(self, n_lists=None, sample_size=IVF_SAMPLE_SIZE, seed=0):
+        """
+        Build (or rebuild) the IVF index used by approximate searches
+
+        k-means centroids are trained on a sample of the stored vectors and
+        every row is assigned to its nearest one. Rows appended later are
+        assigned as they are written, so the index only needs rebuilding when
+        the comments have drifted far from the sample it was trained on.
+
+        Args:
+            n_lists: Number of inverted lists (default: about sqrt(len(self)))
+            sample_size: Rows the centroids are trained on
+        """
+        from sklearn.cluster import MiniBatchKMeans
+
+        vectors = self.vectors
+        if len(vectors) == 0:
+            raise ValueError("Cannot index an empty store")
+        n_lists = min(n_lists or default_n_lists(len(vectors)), len(vectors))
+
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False))
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3)
+        kmeans.fit(np.asarray(vectors[sample]))
+        self.centroids = normalize_rows(kmeans.cluster_centers_)
+
+        lists = self._assign(vectors)
+        with open(self._file(LISTS_FILE), 'wb') as f:
+            f.write(lists.tobytes())
+        np.save(self._file(CENTROIDS_FILE), self.centroids)
+        self._lists = None
+
+    def _inverted_lists(self):
+        """Rows of each list, as (rows sorted by list, start of each list)"""
+        n_rows = len(self)
+        if self._lists is None or self._lists[2] != n_rows:
+            assignments = np.fromfile(self._file(LISTS_FILE), dtype=np.int32, count=n_rows)
+            order = np.argsort(assignments, kind='stable')
+            starts = np.searchsorted(assignments[order], np.arange(len(self.centroids) + 1))
+            self._lists = (order, starts, n_rows)
+        return self._lists[:2]
+
+    def _top_k(self, similarities, rows, k, best_rows, best_sims):
+        """Merge one block's similarities into the running top k of each query"""
+        merged_sims = np.concatenate([best_sims, similarities], axis=1)
+        merged_rows = np.concatenate([best_rows, np.broadcast_to(rows, similarities.shape)], axis=1)
+        if merged_sims.shape[1] > k:
+            keep = np.argpartition(-merged_sims, k - 1, axis=1)[:, :k]
+            merged_sims = np.take_along_axis(merged_sims, keep, axis=1)
+            merged_rows = np.take_along_axis(merged_rows, keep, axis=1)
+        return merged_rows, merged_sims
+
+    def search(self, queries, k=DEFAULT_TOP_K, nprobe=DEFAULT_NPROBE, exact=False):
+        """
+        The k stored comments most similar (cosine) to each query vector
+
+        Uses the IVF index when one has been built, scanning the nprobe lists
+        whose centroids are closest to each query; otherwise, or with exact
+        set, every row is compared in blocks of SEARCH_BLOCK_ROWS.
+
+        Args:
+            queries: (n_queries, dim) embeddings, e.g. from embed_texts
+            k: Neighbours per query
+            nprobe: Lists scanned per query by an approximate search
+            exact: Compare with every row even if an index exists
+
+        Returns:
+            One list per query of {'row', 'id', 'similarity'} dicts, most similar first
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        vectors = self.vectors
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_sims = np.zeros((len(queries), 0), dtype=np.float32)
+
+        if len(vectors) == 0:
+            pass
+        elif exact or self.centroids is None:
+            for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+                block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS])
+                rows = np.arange(start, start + len(block))
+                best_rows, best_sims = self._top_k(queries @ block.T, rows, k, best_rows, best_sims)
+        else:
+            order, starts = self._inverted_lists()
+            probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+            per_query = []
+            for query, lists in zip(queries, probes):
+                rows = np.sort(np.concatenate([order[starts[j]:starts[j + 1]] for j in lists]))
+                rows_top, sims_top = self._top_k(
+                    (np.asarray(vectors[rows]) @ query)[None, :], rows, k,
+                    best_rows[:1], best_sims[:1]
+                )
+                per_query.append((rows_top[0], sims_top[0]))
+            best_rows = [rows for rows, _ in per_query]
+            best_sims = [sims for _, sims in per_query]
+
+        results = []
+        for rows, sims in zip(best_rows, best_sims):
+            ranked = np.argsort(-sims, kind='stable')
+            rows, sims = np.asarray(rows)[ranked], np.asarray(sims)[ranked]
+            results.append([
+                {'row': int(row), 'id': row_id, 'similarity': float(sim)}
+                for row, row_id, sim in zip(rows, self.ids(rows), sims)
+            ])
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Index or query a comment embedding store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = subparsers.add_parser('build-index', help='Train the IVF index of a store')
+    index_parser.add_argument('store', help='Store directory')
+    index_parser.add_argument('--lists', type=int, help='Inverted lists (default: ~sqrt(rows))')
+
+    query_parser = subparsers.add_parser('query', help='Comments most similar to some text')
+    query_parser.add_argument('store', help='Store directory')
+    query_parser.add_argument('text', nargs='+')
+    query_parser.add_argument('-k', type=int, default=DEFAULT_TOP_K)
+    query_parser.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE)
+    query_parser.add_argument('--exact', action='store_true', help='Ignore the IVF index')
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.store)
+    if args.command == 'build-index':
+        store.build_index(args.lists)
+        print(f"Indexed {len(store)} vectors into {len(store.centroids)} lists")
+    else:
+        from sentiment_analyzer import embed_texts
+
+        for text, neighbours in zip(
+            args.text, store.search(embed_texts(args.text), args.k, args.nprobe, args.exact)
+        ):
+            print(text)
+            for neighbour in neighbours:
+                print(f"  {neighbour['similarity']:.3f}  {neighbour['id']}")
@@ -0,0 +1,116 @@
+import json
+
+import numpy as np
+
+# Sentiment labels as stored in the index
+SENTIMENT_CODES = {'negative': -1, 'neutral': 0, 'positive': 1}
+
+# Texts this similar to a fact are checked for contradiction
+SIMILARITY_THRESHOLD = 0.7
+
+
+def normalize_rows(vectors):
+    """L2-normalize each row; all-zero rows (no word vectors) stay zero"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class FactIndex:
+    """
+    Verified facts with precomputed embeddings and sentiment
+
+    Fact vectors are stored as a row-normalized float32 matrix, so matching a
+    batch of texts against every fact is one matrix product. Build one with
+    sentiment_analyzer.build_fact_index(), save it once and reload it in every
+    job that checks comments for misinformation.
+    """
+
+    def __init__(self, facts, vectors, sentiments):
+        """
+        Args:
+            facts: List of fact dicts with at least a 'statement'
+            vectors: (n_facts, dim) embedding matrix
+            sentiments: Sentiment label of each fact
+        """
+        self.facts = list(facts)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.size == 0:
+            vectors = vectors.reshape(len(self.facts), 0)
+        self.vectors = normalize_rows(vectors)
+        self.sentiment_codes = np.array(
+            [SENTIMENT_CODES[s] for s in sentiments], dtype=np.int8
+        )
+
+    def __len__(self):
+        return len(self.facts)
+
+    def match(self, text_vectors, text_sentiments, texts,
+              threshold=SIMILARITY_THRESHOLD, top_k=None):
+        """
+        Find facts that each text is similar to but disagrees with
+
+        A text is flagged against a fact when their cosine similarity is above
+        threshold and one is positive while the other is negative.
+
+        Args:
+            text_vectors: (n_texts, dim) embeddings of the texts
+            text_sentiments: Sentiment label of each text, already computed
+            texts: The texts themselves, copied into the results
+            threshold: Minimum similarity to compare sentiments
+            top_k: Only consider the top_k most similar facts per text; None
+                (the default) checks every fact, as the per-fact loop did.
+                A limit is faster on large indexes but misses contradicted
+                facts above threshold beyond the top_k
+
+        Returns:
+            One list of potential misinformation dicts per text
+        """
+        results = [[] for _ in texts]
+        if len(self.facts) == 0 or len(texts) == 0:
+            return results
+
+        similarities = normalize_rows(text_vectors) @ self.vectors.T
+        text_codes = np.array([SENTIMENT_CODES[s] for s in text_sentiments], dtype=np.int8)
+
+        # Keep only the top_k most similar facts for each text
+        k = len(self.facts) if top_k is None else min(top_k, len(self.facts))
+        if k < len(self.facts):
+            candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(len(self.facts)), similarities.shape)
+        candidate_sims = np.take_along_axis(similarities, candidates, axis=1)
+
+        # Opposite polarities multiply to -1
+        contradicts = text_codes[:, None] * self.sentiment_codes[candidates] == -1
+        flagged = (candidate_sims > threshold) & contradicts
+
+        for row, col in zip(*np.nonzero(flagged)):
+            similarity = float(candidate_sims[row, col])
+            results[row].append({
+                'text': texts[row],
+                'contradicted_fact': self.facts[candidates[row, col]]['statement'],
+                'similarity': similarity,
+                'confidence': 0.7 * similarity
+            })
+
+        for flags in results:
+            flags.sort(key=lambda x: x['similarity'], reverse=True)
+
+        return results
+
+    def save(self, path):
+        """Save the index to a .npz file"""
+        codes_to_labels = {code: label for label, code in SENTIMENT_CODES.items()}
+        np.savez_compressed(
+            path,
+            facts=np.array(json.dumps(self.facts)),
+            vectors=self.vectors,
+            sentiments=np.array([codes_to_labels[int(c)] for c in self.sentiment_codes])
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load an index saved with save()"""
+        with np.load(path, allow_pickle=False) as data:
+            return cls(json.loads(str(data['facts'])), data['vectors'], list(data['sentiments']))
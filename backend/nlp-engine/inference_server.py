@@ -0,0 +1,418 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+import metrics
+import sentiment_analyzer
+from sentiment_backends import BACKENDS, DEFAULT_ONNX_PATH
+from rollup_store import RollupStore
+from sentiment_cascade import DEFAULT_CASCADE_PATH
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Micro-batching: a batch is run as soon as it has MAX_BATCH_SIZE texts or its
+# first text has waited MAX_WAIT_MS
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 5.0
+
+# Texts waiting for the model before new requests are turned away with a 503
+MAX_QUEUE = 1024
+
+# Largest request body accepted, and most texts in one request
+MAX_BODY_BYTES = 1 << 20
+MAX_TEXTS_PER_REQUEST = 256
+
+# Seconds between two checks of whether the client of a request in progress is still connected
+DISCONNECT_POLL = 0.05
+
+# Resources needed to score a text, loaded before the server starts listening
+SERVER_RESOURCES = [
+    'language_identifier', 'stopwords_en', 'stopwords_fr', 'stopwords_rw',
+    'lemmatizer', 'sentiment_backend'
+]
+
+_REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'
+}
+
+
+class Overloaded(Exception):
+    """Raised when the queue is full; the client should back off and retry"""
+
+
+def score_texts(texts):
+    """Language and sentiment of each text, as returned by the server"""
+    languages, confidences, processed_texts = sentiment_analyzer.preprocess_batch(texts)
+    sentiments = sentiment_analyzer.analyze_sentiment_batch(processed_texts)
+    return [
+        {'language': language, 'language_confidence': confidence, 'sentiment': sentiment}
+        for language, confidence, sentiment in zip(languages, confidences, sentiments)
+    ]
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches for one model instance
+
+    Requests are queued and a single consumer takes up to max_batch_size of
+    them, waiting at most max_wait_ms after the first one for others to
+    arrive. Batches run one at a time on a dedicated thread, so the event loop
+    keeps accepting requests while the model works and the model is never
+    called concurrently. When max_queue texts are already waiting, submit()
+    raises Overloaded instead of letting latency grow without bound.
+    """
+
+    def __init__(self, process_batch=score_texts, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+        self._queue = None
+        self._consumer = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+        self.stats = {'requests': 0, 'rejected': 0, 'batches': 0, 'items': 0, 'errors': 0}
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._consumer = asyncio.get_running_loop().create_task(self._consume())
+
+    async def stop(self):
+        if self._consumer is not None:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, texts):
+        """Score texts as part of the next batches, returning their results in order"""
+        if self.queue_depth + len(texts) > self.max_queue:
+            self.stats['rejected'] += 1
+            metrics.count('inference_rejected')
+            raise Overloaded()
+
+        self.stats['requests'] += 1
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future))
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # Requests whose client went away need no result
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            try:
+                with metrics.stage('inference_batch', items=len(texts)):
+                    results = await loop.run_in_executor(self._executor, self.process_batch, texts)
+            except Exception as e:
+                self.stats['errors'] += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.stats['batches'] += 1
+            self.stats['items'] += len(texts)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+async def _disconnected(reader, writer):
+    """
+    Return once the client has closed (or reset) its end of the connection
+
+    Polls rather than reads, so a request the client already pipelined stays
+    in the buffer; a client that only shuts down its sending side counts as gone.
+    """
+    while not (reader.at_eof() or writer.transport.is_closing()):
+        await asyncio.sleep(DISCONNECT_POLL)
+
+
+class InferenceServer:
+    """
+    Minimal asyncio HTTP/1.1 server in front of a MicroBatcher
+
+    Endpoints:
+        POST /v1/sentiment  {"text": "..."} -> result, or {"texts": [...]} -> {"results": [...]}
+        GET  /health        queue depth, batch counters and configuration
+
+    With a RollupStore, trend queries are answered from its buckets:
+        GET  /v1/overview?timeframe=&startDate=&endDate=  the dashboard's sentiment overview
+        GET  /v1/trends?window_days=                      emerging concerns and sentiment spikes
+
+    Connections are kept alive, so a client with a keep-alive agent pays for
+    the TCP (or Unix socket) handshake once.
+    """
+
+    def __init__(self, batcher, rollups=None):
+        self.batcher = batcher
+        self.rollups = rollups
+        self.started = time.time()
+        self._routes = {
+            ('POST', '/v1/sentiment'): self._sentiment,
+            ('GET', '/health'): self._health,
+        }
+        if rollups is not None:
+            self._routes[('GET', '/v1/overview')] = self._overview
+            self._routes[('GET', '/v1/trends')] = self._trends
+
+    async def _sentiment(self, body, query):
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': 'Body must be JSON'}
+        if not isinstance(payload, dict):
+            return 400, {'error': 'Body must be a JSON object'}
+
+        if isinstance(payload.get('text'), str):
+            results = await self.batcher.submit([payload['text']])
+            return 200, results[0]
+
+        texts = payload.get('texts')
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            return 400, {'error': "Expected 'text' (string) or 'texts' (list of strings)"}
+        if len(texts) > MAX_TEXTS_PER_REQUEST:
+            return 413, {'error': f'At most {MAX_TEXTS_PER_REQUEST} texts per request'}
+        return 200, {'results': await self.batcher.submit(texts)}
+
+    async def _overview(self, body, query):
+        try:
+            overview = await asyncio.get_running_loop().run_in_executor(
+                None, self.rollups.overview,
+                query.get('startDate'), query.get('endDate'), query.get('timeframe', 'monthly')
+            )
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        return 200, overview
+
+    async def _trends(self, body, query):
+        try:
+            window_days = int(query.get('window_days', 7))
+        except ValueError:
+            return 400, {'error': 'window_days must be an integer'}
+
+        # SQLite and pandas work off the event loop
+        def trends():
+            spikes = sentiment_analyzer.detect_sentiment_spikes(self.rollups, window_days)
+            return {
+                'emerging_concerns': sentiment_analyzer.detect_emerging_concerns(self.rollups, window_days),
+                'sentiment_spikes': [{**spike, 'timestamp': spike['timestamp'].isoformat()} for spike in spikes],
+            }
+        return 200, await asyncio.get_running_loop().run_in_executor(None, trends)
+
+    async def _health(self, body, query):
+        batcher = self.batcher
+        return 200, {
+            'status': 'ok',
+            'uptime_s': round(time.time() - self.started, 1),
+            'backend': sentiment_analyzer.SENTIMENT_BACKEND,
+            'cascade_threshold': sentiment_analyzer.SENTIMENT_CASCADE_THRESHOLD,
+            'rollups': self.rollups.path if self.rollups is not None else None,
+            'queue_depth': batcher.queue_depth,
+            'max_queue': batcher.max_queue,
+            'max_batch_size': batcher.max_batch_size,
+            'max_wait_ms': batcher.max_wait * 1000.0,
+            **batcher.stats
+        }
+
+    async def _dispatch(self, method, path, body):
+        path, _, query = path.partition('?')
+        handler = self._routes.get((method, path))
+        if handler is None:
+            known_path = any(p == path for _, p in self._routes)
+            return (405, {'error': 'Method not allowed'}) if known_path else (404, {'error': 'Not found'})
+        try:
+            return await handler(body, dict(parse_qsl(query)))
+        except Overloaded:
+            return 503, {'error': 'Inference queue is full, retry later'}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until the client closes it"""
+        dispatch = None
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = headers.get('content-length') or '0'
+                keep_alive = False
+                if not (length.isascii() and length.isdigit()):
+                    # Without a valid length the body cannot be skipped, so the connection ends here
+                    status, payload = 400, {'error': 'Invalid Content-Length'}
+                elif int(length) > MAX_BODY_BYTES:
+                    status, payload = 413, {'error': 'Request body too large'}
+                else:
+                    body = await reader.readexactly(int(length)) if int(length) else b''
+                    # A client that disconnects while its texts are queued
+                    # cancels them, so the batcher skips them
+                    dispatch = asyncio.ensure_future(self._dispatch(method, path, body))
+                    disconnect = asyncio.ensure_future(_disconnected(reader, writer))
+                    await asyncio.wait([dispatch, disconnect], return_when=asyncio.FIRST_COMPLETED)
+                    disconnect.cancel()
+                    if not dispatch.done():
+                        break
+                    status, payload = dispatch.result()
+                    connection = headers.get('connection', '').lower()
+                    keep_alive = connection != 'close' and (version != 'HTTP/1.0' or connection == 'keep-alive')
+
+                data = json.dumps(payload).encode('utf-8')
+                head = [
+                    f'HTTP/1.1 {status} {_REASONS[status]}',
+                    'Content-Type: application/json',
+                    f'Content-Length: {len(data)}',
+                    'Connection: ' + ('keep-alive' if keep_alive else 'close'),
+                ]
+                if status == 503:
+                    head.append('Retry-After: 1')
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if dispatch is not None:
+                dispatch.cancel()
+            writer.close()
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, batcher=None, rollups=None):
+    """
+    Run the inference server until cancelled
+
+    Args:
+        host, port: TCP address to listen on (ignored when unix_socket is set)
+        unix_socket: Path of a Unix socket to listen on instead
+        batcher: MicroBatcher to use (defaults to one with the module settings)
+        rollups: Optional RollupStore to serve /v1/overview and /v1/trends from
+    """
+    batcher = batcher or MicroBatcher()
+    batcher.start()
+    server = InferenceServer(batcher, rollups)
+
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+        listener = await asyncio.start_unix_server(server.handle, path=unix_socket)
+        print(f"Inference server listening on {unix_socket}")
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+        print(f"Inference server listening on http://{host}:{port}")
+
+    # Shut down cleanly when the service manager stops us
+    loop = asyncio.get_running_loop()
+    current = asyncio.current_task()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, current.cancel)
+
+    try:
+        async with listener:
+            await listener.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await batcher.stop()
+        if unix_socket and os.path.exists(unix_socket):
+            os.unlink(unix_socket)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Micro-batching sentiment inference server')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--unix-socket', help='Listen on this Unix socket instead of TCP')
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS,
+                        help='Longest a text waits for others to join its batch')
+    parser.add_argument('--max-queue', type=int, default=MAX_QUEUE,
+                        help='Queued texts before requests are rejected with 503')
+    parser.add_argument('--sentiment-backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--onnx-model', default=DEFAULT_ONNX_PATH)
+    parser.add_argument('--sentiment-cascade', type=float, metavar='THRESHOLD',
+                        help='Linear model first, transformer below THRESHOLD confidence')
+    parser.add_argument('--cascade-model', default=DEFAULT_CASCADE_PATH)
+    parser.add_argument('--torch-threads', type=int, help='Torch intra-op threads')
+    parser.add_argument('--cache', help='SQLite result cache shared with the batch jobs')
+    parser.add_argument('--metrics', help='Write metrics to this Prometheus text file')
+    parser.add_argument('--rollups', help='Serve /v1/overview and /v1/trends from this rollup SQLite file')
+    args = parser.parse_args()
+
+    if args.torch_threads:
+        import torch
+        torch.set_num_threads(args.torch_threads)
+    sentiment_analyzer.use_sentiment_backend(args.sentiment_backend, args.onnx_model)
+    sentiment_analyzer.use_sentiment_cascade(args.sentiment_cascade, args.cascade_model)
+    if args.cache:
+        sentiment_analyzer.enable_result_cache(args.cache)
+    if args.metrics:
+        metrics.enable(metrics.PrometheusFileSink(args.metrics))
+
+    # Load every model before accepting the first request
+    resources = SERVER_RESOURCES
+    if args.sentiment_cascade is not None:
+        resources = resources + ['sentiment_cascade']
+    sentiment_analyzer.warmup(resources)
+
+    try:
+        asyncio.run(serve(
+            args.host, args.port, args.unix_socket,
+            MicroBatcher(score_texts, args.max_batch_size, args.max_wait_ms, args.max_queue),
+            RollupStore(args.rollups) if args.rollups else None
+        ))
+    finally:
+        metrics.flush()
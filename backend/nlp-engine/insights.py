@@ -0,0 +1,250 @@
+import numpy as np
+import pandas as pd
+
+# Dimensions insights can be broken down by: (label in the results, value
+# used when a record has no such metadata, path of the value in 'metadata')
+DIMENSIONS = {
+    'demographic': ('demographic', 'Unspecified', ('demographic',)),
+    'province': ('provincial', 'Unknown', ('location', 'province')),
+    'district': ('district', 'Unknown', ('location', 'district')),
+}
+
+# Groups left out of the insights (the location of the record was not known)
+EXCLUDED_GROUPS = {'province': {'Unknown'}, 'district': {'Unknown'}}
+
+# Groups with fewer scored records get no sentiment insight
+MIN_SAMPLE_SIZE = 10
+
+# Most discussed topics listed per group
+TOP_K_TOPICS = 3
+
+
+def _fields(sentiment_data):
+    """Names of the columns, or of the keys found in any of the records"""
+    if isinstance(sentiment_data, pd.DataFrame):
+        return set(sentiment_data.columns)
+    return set().union(*sentiment_data)
+
+
+def _column(sentiment_data, fields, name):
+    """
+    One field of every record, or None if no record has it
+
+    A DataFrame's own column is returned as is (not copied); records give a list.
+    """
+    if name not in fields:
+        return None
+    if isinstance(sentiment_data, pd.DataFrame):
+        return sentiment_data[name]
+    return [record.get(name) for record in sentiment_data]
+
+
+def _flatten_metadata(metadata, dimensions):
+    """
+    Values of each dimension from nested metadata dicts
+
+    Every level of nesting is read once and shared, so province and district
+    take a single pass over the records' 'location' dicts.
+    """
+    levels = {(): list(metadata)}
+    flattened = {}
+    for dimension in dimensions:
+        _, missing, path = DIMENSIONS[dimension]
+        for depth in range(1, len(path) + 1):
+            if path[:depth] not in levels:
+                key = path[depth - 1]
+                levels[path[:depth]] = [
+                    value.get(key) if isinstance(value, dict) else None
+                    for value in levels[path[:depth - 1]]
+                ]
+        flattened[dimension] = [missing if value is None else value for value in levels[path]]
+    return flattened
+
+
+def _dimension_values(sentiment_data, fields, dimensions):
+    """Values of each dimension: its own column if present, otherwise flattened from 'metadata'"""
+    values = {}
+    for dimension in dimensions:
+        column = _column(sentiment_data, fields, dimension)
+        if column is not None:
+            values[dimension] = column
+
+    from_metadata = [d for d in dimensions if d not in values]
+    metadata = _column(sentiment_data, fields, 'metadata') if from_metadata else None
+    if metadata is not None and isinstance(next(iter(metadata)), dict):
+        values.update(_flatten_metadata(metadata, from_metadata))
+    return {dimension: values[dimension] for dimension in dimensions if dimension in values}
+
+
+def _topic_values(sentiment_data, fields):
+    """Topic of each record; topics assigned by assign_topics are dicts and their label is used"""
+    topics = _column(sentiment_data, fields, 'topic')
+    if topics is None:
+        return None
+    first = next((topic for topic in topics if topic is not None and topic == topic), None)
+    if isinstance(first, dict):
+        topics = [topic.get('label') if isinstance(topic, dict) else None for topic in topics]
+    return topics
+
+
+def _group_by_cells(keys):
+    """
+    Cell index of each row for the combination of several factorized keys
+
+    Args:
+        keys: List of (codes, n_labels) with codes of -1 for missing values
+
+    Returns:
+        (cell of each row, (n_cells, len(keys)) codes of each cell)
+    """
+    combined = np.zeros(len(keys[0][0]), dtype=np.int64)
+    for codes, n_labels in keys:
+        combined = combined * (n_labels + 1) + (codes + 1)
+    cells, _ = pd.factorize(combined)
+
+    # Codes of a cell are those of any of its rows; take the first one
+    first_row = np.empty(cells.max() + 1, dtype=np.int64)
+    first_row[cells[::-1]] = np.arange(len(cells) - 1, -1, -1)
+    return cells, np.column_stack([codes[first_row] for codes, _ in keys])
+
+
+def _group_stats(groups, n_groups, cell_count, cell_sum, cell_mean, cell_m2):
+    """
+    Mean, count and sample std per group from per-cell aggregates
+
+    Cell variances are combined with the parallel variance formula, so no
+    row is read again.
+    """
+    count = np.bincount(groups, cell_count, minlength=n_groups)
+    total = np.bincount(groups, cell_sum, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / count
+        spread = np.where(cell_count > 0, cell_count * (cell_mean - mean[groups]) ** 2, 0.0)
+        m2 = np.bincount(groups, cell_m2 + spread, minlength=n_groups)
+        std = np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
+    return mean, count, std
+
+
+def _top_topics(groups, topics, sizes, n_topics, top_k):
+    """
+    The top_k (group, topic, count) per group by number of records
+
+    Ties are broken by topic, in label order.
+    """
+    pairs, pair_keys = pd.factorize(groups.astype(np.int64) * n_topics + topics)
+    pair_sizes = np.bincount(pairs, sizes)
+    pair_groups, pair_topics = pair_keys // n_topics, pair_keys % n_topics
+
+    order = np.lexsort((pair_topics, -pair_sizes, pair_groups))
+    pair_groups, pair_topics, pair_sizes = pair_groups[order], pair_topics[order], pair_sizes[order]
+    group_starts = np.flatnonzero(np.r_[True, pair_groups[1:] != pair_groups[:-1]])
+    rank = np.arange(len(order)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(order)]))
+    keep = rank < top_k
+    return pair_groups[keep], pair_topics[keep], pair_sizes[keep].astype(np.int64)
+
+
+def generate_insights(sentiment_data, dimensions=tuple(DIMENSIONS),
+                      top_k=TOP_K_TOPICS, min_sample_size=MIN_SAMPLE_SIZE):
+    """
+    Sentiment and most discussed topics per demographic, province and district
+
+    Dimensions are taken from columns of the same name, or else from each
+    record's 'metadata' ({'demographic': ..., 'location': {'province': ...,
+    'district': ...}}), flattened once. Records are grouped once by the
+    combination of every dimension and topic; per-dimension mean, count and
+    std and the top topics are rolled up from those cells. The input is
+    neither copied nor modified.
+
+    Args:
+        sentiment_data: DataFrame or list of dicts with 'score' and optionally
+            'topic', 'metadata' or the dimension columns themselves
+        dimensions: Which of 'demographic', 'province' and 'district' to analyze
+        top_k: Topics listed per group
+        min_sample_size: Smallest group given a sentiment insight
+
+    Returns:
+        Dictionary with '<label>_sentiment' and 'top_topics_by_<dimension>'
+        for each dimension found in the data, e.g. 'demographic_sentiment'
+        and 'top_topics_by_demographic', like generate_demographic_insights
+    """
+    if len(sentiment_data) == 0:
+        return {}
+
+    fields = _fields(sentiment_data)
+    scores = np.asarray(_column(sentiment_data, fields, 'score'), dtype=float)
+    factorized = {
+        dimension: pd.factorize(np.asarray(values, dtype=object), sort=True)
+        for dimension, values in _dimension_values(sentiment_data, fields, dimensions).items()
+    }
+    topics = _topic_values(sentiment_data, fields)
+    if topics is not None:
+        topic_codes, topic_labels = pd.factorize(np.asarray(topics, dtype=object), sort=True)
+    if not factorized:
+        return {}
+
+    # The single grouped pass over the records
+    keys = [(codes, len(labels)) for codes, labels in factorized.values()]
+    if topics is not None:
+        keys.append((topic_codes, len(topic_labels)))
+    cells, cell_codes = _group_by_cells(keys)
+    n_cells = len(cell_codes)
+
+    scored = ~np.isnan(scores)
+    cell_size = np.bincount(cells, minlength=n_cells)
+    cell_count = np.bincount(cells, scored, minlength=n_cells)
+    cell_sum = np.bincount(cells, np.where(scored, scores, 0.0), minlength=n_cells)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cell_mean = cell_sum / cell_count
+    deviation = np.where(scored, scores - cell_mean[cells], 0.0)
+    cell_m2 = np.bincount(cells, deviation * deviation, minlength=n_cells)
+
+    overall_mean = scores[scored].mean() if scored.any() else np.nan
+
+    insights = {}
+    for column, (dimension, (_, labels)) in enumerate(factorized.items()):
+        label, _, _ = DIMENSIONS[dimension]
+        excluded = EXCLUDED_GROUPS.get(dimension, set())
+        verb = 'are' if dimension == 'demographic' else 'is'
+
+        in_group = cell_codes[:, column] >= 0
+        groups = cell_codes[in_group, column]
+        mean, count, std = _group_stats(
+            groups, len(labels), cell_count[in_group], cell_sum[in_group],
+            cell_mean[in_group], cell_m2[in_group]
+        )
+
+        # Largest groups first
+        group_insights = []
+        for group in np.argsort(-count, kind='stable'):
+            name = labels[group]
+            if count[group] < min_sample_size or name in excluded:
+                continue
+            diff = mean[group] - overall_mean
+            sentiment_text = 'more positive' if diff > 0 else 'more negative'
+            group_insights.append({
+                dimension: name,
+                'sentiment_mean': float(mean[group]),
+                'sentiment_std': float(std[group]),
+                'sample_size': int(count[group]),
+                'difference_from_overall': float(diff),
+                'insight_text': f"{name} {verb} {abs(diff):.2f} points {sentiment_text} than average"
+            })
+        insights[f'{label}_sentiment'] = group_insights
+
+        if topics is not None:
+            with_topic = in_group & (cell_codes[:, -1] >= 0)
+            top_groups, top_topics, top_counts = _top_topics(
+                cell_codes[with_topic, column], cell_codes[with_topic, -1],
+                cell_size[with_topic], len(topic_labels), top_k
+            )
+            top_topics_by_group = {}
+            for group, topic, n in zip(top_groups, top_topics, top_counts):
+                name = labels[group]
+                if name in excluded:
+                    continue
+                top_topics_by_group.setdefault(name, []).append(
+                    {dimension: name, 'topic': topic_labels[topic], 'count': int(n)}
+                )
+            insights[f'top_topics_by_{dimension}'] = top_topics_by_group
+
+    return insights
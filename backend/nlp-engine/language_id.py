@@ -0,0 +1,199 @@
+import os
+import re
+
+import numpy as np
+
+# Shipped word lists (<language>_words.txt) and stop words (<language>_stopwords.txt)
+LANGUAGE_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'language_data')
+
+# Character n-gram lengths used in the profiles
+NGRAM_RANGE = (1, 3)
+
+# Returned for texts without a single letter (with confidence 0.0) and for
+# texts no language reaches MIN_CONFIDENCE on
+DEFAULT_LANGUAGE = 'en'
+MIN_CONFIDENCE = 0.9
+
+# Additive smoothing for n-grams a language's profile has not seen
+SMOOTHING = 1e-4
+
+# Distinct words whose n-gram ids are memoized per identifier
+WORD_CACHE_SIZE = 100000
+
+# Runs of letters; digits, underscores and apostrophes split words
+_LETTERS_PATTERN = re.compile(r'[^\W\d_]+')
+
+
+def read_word_list(path):
+    """Words in a data file, one per line, ignoring blank lines and # comments"""
+    words = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                words.append(line.lower())
+    # Keep the first (most frequent) occurrence of each word
+    return list(dict.fromkeys(words))
+
+
+def load_stopwords(language, data_dir=LANGUAGE_DATA_DIR):
+    """Shipped stop word set for a language"""
+    return set(read_word_list(os.path.join(data_dir, f'{language}_stopwords.txt')))
+
+
+def char_ngrams(word, ngram_range=NGRAM_RANGE):
+    """Character n-grams of a word padded with spaces, e.g. ' ku', 'ku '"""
+    padded = f' {word} '
+    n_min, n_max = ngram_range
+    return [
+        padded[i:i + n]
+        for n in range(n_min, n_max + 1)
+        for i in range(len(padded) - n + 1)
+        if padded[i:i + n] != ' '
+    ]
+
+
+class LanguageIdentifier:
+    """
+    Character n-gram language identification
+
+    Each language has a profile of character n-gram log-probabilities, stored
+    as one (n_ngrams, n_languages) matrix. A batch of texts is scored by
+    looking up the ids of all its n-grams at once and summing their rows per
+    text with np.bincount, i.e. a multinomial naive Bayes classifier; the
+    confidence is the posterior probability of the chosen language.
+
+    Usage:
+        identifier = LanguageIdentifier.load()
+        languages, confidences = identifier.predict(texts)
+    """
+
+    def __init__(self, profiles, ngram_range=NGRAM_RANGE, smoothing=SMOOTHING):
+        """
+        Args:
+            profiles: Dict of language -> {ngram: weight}
+            ngram_range: (min, max) n-gram length the profiles were built with
+            smoothing: Weight added to every n-gram of every language
+        """
+        self.languages = sorted(profiles)
+        self.ngram_range = ngram_range
+        self.vocabulary = {}
+        for language in self.languages:
+            for ngram in profiles[language]:
+                self.vocabulary.setdefault(ngram, len(self.vocabulary))
+
+        weights = np.full((len(self.vocabulary), len(self.languages)), smoothing)
+        for j, language in enumerate(self.languages):
+            for ngram, weight in profiles[language].items():
+                weights[self.vocabulary[ngram], j] += weight
+        self.log_probs = np.log(weights / weights.sum(axis=0)).astype(np.float32)
+        self._word_ids = {}
+
+    @classmethod
+    def from_word_lists(cls, word_lists, ngram_range=NGRAM_RANGE, **kwargs):
+        """
+        Build profiles from lists of frequent words, most frequent first
+
+        Word frequencies are approximated with Zipf's law (weight 1 / rank).
+        """
+        profiles = {}
+        for language, words in word_lists.items():
+            counts = {}
+            for rank, word in enumerate(words, start=1):
+                for ngram in char_ngrams(word, ngram_range):
+                    counts[ngram] = counts.get(ngram, 0.0) + 1.0 / rank
+            total = sum(counts.values())
+            profiles[language] = {ngram: count / total for ngram, count in counts.items()}
+        return cls(profiles, ngram_range, **kwargs)
+
+    @classmethod
+    def load(cls, data_dir=LANGUAGE_DATA_DIR, **kwargs):
+        """Identifier for every language with a <language>_words.txt in data_dir"""
+        word_lists = {}
+        for filename in sorted(os.listdir(data_dir)):
+            if filename.endswith('_words.txt'):
+                language = filename[:-len('_words.txt')]
+                word_lists[language] = read_word_list(os.path.join(data_dir, filename))
+        return cls.from_word_lists(word_lists, **kwargs)
+
+    def _ids_of_word(self, word):
+        """Vocabulary ids of a word's known n-grams (memoized)"""
+        ids = self._word_ids.get(word)
+        if ids is None:
+            if len(self._word_ids) >= WORD_CACHE_SIZE:
+                self._word_ids.clear()
+            ids = [
+                self.vocabulary[ngram]
+                for ngram in char_ngrams(word, self.ngram_range)
+                if ngram in self.vocabulary
+            ]
+            self._word_ids[word] = ids
+        return ids
+
+    def _ngram_ids(self, texts):
+        """Row and vocabulary id of every known n-gram in the texts"""
+        rows = []
+        ids = []
+        for row, text in enumerate(texts):
+            if not isinstance(text, str):
+                continue
+            n_ids = len(ids)
+            for word in _LETTERS_PATTERN.findall(text.lower()):
+                ids.extend(self._ids_of_word(word))
+            rows.extend([row] * (len(ids) - n_ids))
+        return np.array(rows, dtype=np.intp), np.array(ids, dtype=np.intp)
+
+    def predict_proba(self, texts):
+        """
+        Posterior probability of each language
+
+        Returns:
+            (n_texts, n_languages) array, columns in the order of self.languages;
+            rows of texts without any known n-gram are all zero
+        """
+        n_texts = len(texts)
+        rows, ids = self._ngram_ids(texts)
+
+        # Sum the log-probabilities of each text's n-grams, one language at a time
+        gram_log_probs = self.log_probs[ids]
+        log_likelihood = np.stack([
+            np.bincount(rows, weights=gram_log_probs[:, j], minlength=n_texts)
+            for j in range(len(self.languages))
+        ], axis=1)
+
+        log_likelihood -= log_likelihood.max(axis=1, keepdims=True)
+        probs = np.exp(log_likelihood)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        scored = np.bincount(rows, minlength=n_texts) > 0
+        probs[~scored] = 0.0
+        return probs
+
+    def predict(self, texts, min_confidence=MIN_CONFIDENCE):
+        """
+        Most likely language of each text
+
+        Args:
+            texts: List of texts
+            min_confidence: Below this, fall back to DEFAULT_LANGUAGE (short
+                texts such as "ok" are often ambiguous)
+
+        Returns:
+            (languages, confidences) lists, the confidence being the posterior
+            probability of the returned language (0.0 for texts without letters)
+        """
+        if len(texts) == 0:
+            return [], []
+
+        probs = self.predict_proba(texts)
+        chosen = probs.argmax(axis=1)
+        confident = probs[np.arange(len(texts)), chosen] >= min_confidence
+        if DEFAULT_LANGUAGE in self.languages:
+            chosen[~confident] = self.languages.index(DEFAULT_LANGUAGE)
+        confidences = probs[np.arange(len(texts)), chosen]
+
+        languages = [
+            self.languages[j] if is_confident else DEFAULT_LANGUAGE
+            for j, is_confident in zip(chosen, confident)
+        ]
+        return languages, confidences.tolist()
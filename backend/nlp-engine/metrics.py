@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import threading
+import time
+
+# Active sinks; an empty tuple means instrumentation is off
+_sinks = ()
+
+
+def enable(*sinks):
+    """Turn instrumentation on, sending events to the given sinks"""
+    global _sinks
+    _sinks = tuple(sinks)
+
+
+def disable():
+    """Turn instrumentation off (flushing the current sinks)"""
+    global _sinks
+    sinks, _sinks = _sinks, ()
+    for sink in sinks:
+        sink.flush()
+
+
+def enabled():
+    return bool(_sinks)
+
+
+def flush():
+    for sink in _sinks:
+        sink.flush()
+
+
+def _emit(event):
+    for sink in _sinks:
+        sink.emit(event)
+
+
+class _NoopStage:
+    """Returned by stage() when instrumentation is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add(self, **fields):
+        pass
+
+
+_NOOP_STAGE = _NoopStage()
+
+
+class _Stage:
+    """Times a block and emits a 'stage' event when it ends"""
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def add(self, **fields):
+        """Attach more fields once they are known (e.g. batch sizes)"""
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _emit({
+            'event': 'stage',
+            'stage': self.name,
+            'seconds': time.perf_counter() - self.start,
+            'error': exc_type is not None,
+            **self.fields
+        })
+        return False
+
+
+def stage(name, **fields):
+    """
+    Time a pipeline stage
+
+    Numeric fields (items, batch_size, ...) are summed by the sinks, string
+    fields become labels. When instrumentation is off this returns a shared
+    no-op context manager, so the cost is one function call.
+
+    Usage:
+        with metrics.stage('sentiment', items=len(texts)) as s:
+            ...
+            s.add(batches=n_batches)
+    """
+    if not _sinks:
+        return _NOOP_STAGE
+    return _Stage(name, fields)
+
+
+def count(name, value=1, **labels):
+    """Add value to a counter, e.g. cache hits"""
+    if not _sinks:
+        return
+    _emit({'event': 'counter', 'name': name, 'value': value, **labels})
+
+
+# --- Sinks ----------------------------------------------------------------
+
+class LogSink:
+    """Writes every event as one JSON log line"""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('nlp_engine.metrics')
+        self.level = level
+
+    def emit(self, event):
+        self.logger.log(self.level, json.dumps(event, default=str))
+
+    def flush(self):
+        pass
+
+
+class CallbackSink:
+    """Passes every event dict to a function"""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, event):
+        self.callback(event)
+
+    def flush(self):
+        pass
+
+
+def _labels(pairs):
+    escaped = (
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in pairs
+    )
+    return '{' + ','.join(escaped) + '}' if pairs else ''
+
+
+class PrometheusFileSink:
+    """
+    Aggregates events and dumps them in the Prometheus text format
+
+    Suitable for the node exporter's textfile collector. The file is rewritten
+    atomically on flush() and at most every write_interval seconds while events
+    come in.
+    """
+
+    def __init__(self, path, prefix='nlp_engine', write_interval=10.0):
+        self.path = path
+        self.prefix = prefix
+        self.write_interval = write_interval
+        self._totals = {}
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+
+    def emit(self, event):
+        event = dict(event)
+        kind = event.pop('event')
+
+        with self._lock:
+            if kind == 'stage':
+                name = event.pop('stage')
+                seconds = event.pop('seconds')
+                error = event.pop('error')
+                numbers = {k: v for k, v in event.items() if isinstance(v, (int, float))}
+                labels = (('stage', name),) + tuple(
+                    sorted((k, v) for k, v in event.items() if k not in numbers)
+                )
+                self._add('stage_seconds_total', labels, seconds)
+                self._add('stage_calls_total', labels, 1)
+                if error:
+                    self._add('stage_errors_total', labels, 1)
+                for field, value in numbers.items():
+                    self._add(f'stage_{field}_total', labels, value)
+            else:
+                name = event.pop('name')
+                value = event.pop('value')
+                self._add(f'{name}_total', tuple(sorted(event.items())), value)
+
+            due = time.monotonic() - self._last_write >= self.write_interval
+
+        if due:
+            self.flush()
+
+    def _add(self, metric, labels, value):
+        key = (metric, labels)
+        self._totals[key] = self._totals.get(key, 0) + value
+
+    def render(self):
+        """Current totals in the Prometheus text exposition format"""
+        lines = []
+        seen = set()
+        with self._lock:
+            for (metric, labels), value in sorted(self._totals.items()):
+                full_name = f'{self.prefix}_{metric}'
+                if full_name not in seen:
+                    lines.append(f'# TYPE {full_name} counter')
+                    seen.add(full_name)
+                lines.append(f'{full_name}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        text = self.render()
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, self.path)
+        self._last_write = time.monotonic()
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+
+DEFAULT_CACHE_PATH = 'analysis-cache.sqlite'
+DEFAULT_MAX_ENTRIES = 500000
+EVICTION_LOW_WATER = 0.9
+
+
+def normalize_text(text):
+    """Normalize text for cache lookups (unicode form and whitespace only)"""
+    return unicodedata.normalize('NFC', ' '.join(text.split()))
+
+
+class ResultCache:
+    """
+    Persistent, size-bounded LRU cache for analysis results
+
+    Entries are keyed on a hash of the normalized text, a namespace (the kind of
+    result stored) and a version string that should change whenever the model or
+    the pipeline changes, so stale results are never served. Values are stored
+    as JSON in a SQLite table; when the table grows past max_entries the least
+    recently used rows are evicted.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, version='', max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS results ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)')
+        self._conn.commit()
+        # Upper bound on the row count, so eviction only counts rows when needed
+        (self._n_entries,) = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()
+
+    def key(self, namespace, text):
+        """Content address of a text's result in the given namespace"""
+        payload = '\0'.join([namespace, self.version, normalize_text(text)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_many(self, namespace, texts):
+        """
+        Look up cached results for several texts
+
+        Returns:
+            Dict mapping the index of each text found in the cache to its result
+        """
+        keys = [self.key(namespace, text) for text in texts]
+        found = {}
+
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f'SELECT key, value FROM results WHERE key IN ({placeholders})', batch
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    'UPDATE results SET last_used = ? WHERE key = ?',
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+        results = {}
+        for i, key in enumerate(keys):
+            if key in found:
+                results[i] = json.loads(found[key])
+        self.hits += len(results)
+        self.misses += len(keys) - len(results)
+
+        return results
+
+    def put_many(self, namespace, texts, results):
+        """Store results for several texts, evicting old entries if needed"""
+        now = time.time()
+        rows = [
+            (self.key(namespace, text), json.dumps(result), now)
+            for text, result in zip(texts, results)
+        ]
+
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO results (key, value, last_used) VALUES (?, ?, ?)', rows
+            )
+            self._n_entries += len(rows)
+            if self._n_entries > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def get(self, namespace, text):
+        """Cached result for a single text, or None"""
+        return self.get_many(namespace, [text]).get(0)
+
+    def put(self, namespace, text, result):
+        """Store the result for a single text"""
+        self.put_many(namespace, [text], [result])
+
+    def _evict(self):
+        """Drop least recently used rows once the table is over max_entries"""
+        (n_entries,) = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()
+        if n_entries > self.max_entries:
+            # Evict down to 90% so the next eviction is not due straight away
+            excess = n_entries - int(self.max_entries * EVICTION_LOW_WATER)
+            self._conn.execute(
+                'DELETE FROM results WHERE key IN ('
+                'SELECT key FROM results ORDER BY last_used LIMIT ?)', (excess,)
+            )
+            n_entries -= excess
+        self._n_entries = n_entries
+
+    def stats(self):
+        """Hit/miss counts since this cache was opened"""
+        lookups = self.hits + self.misses
+        with self._lock:
+            (n_entries,) = self._conn.execute('SELECT COUNT(*) FROM results').fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': n_entries
+        }
+
+    def clear(self):
+        """Remove every cached result"""
+        with self._lock:
+            self._conn.execute('DELETE FROM results')
+            self._conn.commit()
+            self._n_entries = 0
+
+    def close(self):
+        self._conn.close()
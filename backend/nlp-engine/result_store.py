@@ -0,0 +1,195 @@
+import argparse
+import ast
+
+import pandas as pd
+
+# Rows converted at a time by convert_csv
+CSV_CHUNK_SIZE = 50000
+
+# Parquet compression codec for result files
+COMPRESSION = 'zstd'
+
+
+def analysis_schema():
+    """
+    Arrow schema of the analysis columns added to every input row
+
+    Labels are dictionary-encoded and scores are float32, so a column of a
+    million results takes a few MB; entities and misinformation flags are
+    lists of structs rather than Python reprs in text cells.
+    """
+    import pyarrow as pa
+
+    label = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('Language', label),
+        ('Language_Confidence', pa.float32()),
+        ('Predicted_Sentiment', label),
+        ('Sentiment_Score', pa.float32()),
+        ('Sentiment_Confidence', pa.float32()),
+        ('Topic_Id', pa.int32()),
+        ('Topic', label),
+        ('Entities', pa.list_(pa.struct([('text', pa.string()), ('label', pa.string())]))),
+        ('Misinformation', pa.list_(pa.struct([
+            ('contradicted_fact', pa.string()),
+            ('similarity', pa.float32()),
+            ('confidence', pa.float32())
+        ]))),
+    ])
+
+
+def analysis_columns(results):
+    """Analysis columns of analyze_text_stream results, as plain Python lists"""
+    topics = [result.get('topic') or {} for result in results]
+    return {
+        'Language': [result['language'] for result in results],
+        'Language_Confidence': [result.get('language_confidence') for result in results],
+        'Predicted_Sentiment': [result['sentiment']['sentiment'] for result in results],
+        'Sentiment_Score': [result['sentiment']['score'] for result in results],
+        'Sentiment_Confidence': [result['sentiment'].get('confidence') for result in results],
+        'Topic_Id': [topic.get('id') for topic in topics],
+        'Topic': [topic.get('label') for topic in topics],
+        'Entities': [result.get('entities') or [] for result in results],
+        'Misinformation': [result.get('potential_misinformation') or [] for result in results],
+    }
+
+
+def results_table(rows, results):
+    """
+    Arrow table of input rows followed by their analysis columns
+
+    Args:
+        rows: DataFrame of the input rows (e.g. one CSV chunk)
+        results: analyze_text_stream results, one per row
+    """
+    import pyarrow as pa
+
+    # Text columns stay strings even in a chunk where they are all empty
+    input_table = pa.Table.from_pandas(rows, preserve_index=False)
+    for i, field in enumerate(input_table.schema):
+        if pa.types.is_null(field.type):
+            input_table = input_table.set_column(i, field.name, input_table.column(i).cast(pa.string()))
+
+    schema = analysis_schema()
+    columns = analysis_columns(results)
+    for field in schema:
+        value_type = field.type.value_type if pa.types.is_dictionary(field.type) else field.type
+        array = pa.array(columns[field.name], type=value_type)
+        if pa.types.is_dictionary(field.type):
+            array = array.dictionary_encode()
+        input_table = input_table.append_column(field, array)
+    return input_table
+
+
+class ResultWriter:
+    """
+    Appends analyzed rows to a Parquet file, one row group per write
+
+    The schema is fixed by the first write; later chunks are cast to it.
+
+    Usage:
+        with ResultWriter('results.parquet') as writer:
+            for chunk in pd.read_csv('comments.csv', chunksize=5000):
+                writer.write(chunk, list(analyze_text_stream(chunk['Comment'])))
+    """
+
+    def __init__(self, path, compression=COMPRESSION):
+        self.path = path
+        self.compression = compression
+        self.rows_written = 0
+        self._writer = None
+
+    def write(self, rows, results):
+        import pyarrow.parquet as pq
+
+        table = results_table(rows, results)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema, compression=self.compression)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+        self.rows_written += len(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_results(path, columns=None, filters=None):
+    """
+    Load a result file written by ResultWriter as a DataFrame
+
+    Args:
+        path: Parquet result file
+        columns: Only read these columns (the others are never decoded)
+        filters: pyarrow filters, e.g. [('District', '=', 'Gasabo')]
+    """
+    import pyarrow.parquet as pq
+
+    return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+
+
+def _parse_repr(value):
+    """A list written into a CSV cell as its Python repr, e.g. "[{'text': ...}]" """
+    if not isinstance(value, str) or not value:
+        return []
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return []
+
+
+def convert_csv(csv_path, parquet_path, chunk_size=CSV_CHUNK_SIZE):
+    """
+    Convert a results CSV written by stream_pipeline.py (or main.py) to Parquet
+
+    Analysis columns missing from the CSV, and empty cells, are written as
+    nulls. Entities and Misinformation cells are parsed from their Python reprs.
+
+    Returns:
+        Number of rows written
+    """
+    analysis = [field.name for field in analysis_schema()]
+    with ResultWriter(parquet_path) as writer:
+        for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+            results = []
+            for row in chunk.to_dict('records'):
+                # Empty cells come back as NaN; results hold None there
+                row = {column: None if pd.isna(value) else value for column, value in row.items()}
+                topic_id = row.get('Topic_Id')
+                results.append({
+                    'language': row.get('Language', 'en'),
+                    'language_confidence': row.get('Language_Confidence'),
+                    'sentiment': {
+                        'sentiment': row.get('Predicted_Sentiment'),
+                        'score': row.get('Sentiment_Score'),
+                        'confidence': row.get('Sentiment_Confidence')
+                    },
+                    'topic': {
+                        'id': None if topic_id is None else int(topic_id),
+                        'label': row.get('Topic')
+                    },
+                    'entities': _parse_repr(row.get('Entities')),
+                    'potential_misinformation': _parse_repr(row.get('Misinformation'))
+                })
+            rows = chunk.drop(columns=[c for c in analysis if c in chunk.columns])
+            writer.write(rows, results)
+        return writer.rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert a results CSV to the Parquet result store')
+    parser.add_argument('input', help='Results CSV (e.g. New-dataset-with-sentiment.csv)')
+    parser.add_argument('output', help='Parquet file to write')
+    parser.add_argument('--chunk-size', type=int, default=CSV_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    n_rows = convert_csv(args.input, args.output, args.chunk_size)
+    print(f"Wrote {n_rows} rows to {args.output}")
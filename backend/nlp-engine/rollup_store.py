@@ -0,0 +1,395 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ROLLUP_PATH = 'sentiment-rollups.sqlite'
+
+NS_PER_HOUR = 3600 * 10 ** 9
+
+# Columns every bucket is kept per; records without one are stored under ''
+DIMENSIONS = ('topic', 'source', 'district', 'language')
+
+# Bucket tables and how many hours one bucket spans
+GRANULARITIES = {'hour': 1, 'day': 24}
+
+# Records are counted as positive above POSITIVE_SCORE and negative below
+# -POSITIVE_SCORE, like the dashboard's overview does
+POSITIVE_SCORE = 0.2
+
+SENTIMENTS = ('positive', 'neutral', 'negative')
+
+# Aggregates kept per bucket; all of them add up across buckets
+AGGREGATES = ('count', 'score_sum', 'score_sq_sum') + SENTIMENTS
+
+# Period labels of the overview timeframes (the same formats as the Node route)
+TIMEFRAME_FORMATS = {'daily': '%Y-%m-%d', 'weekly': '%Y-W%U', 'monthly': '%Y-%m'}
+
+
+def _dimension(sentiment_data, name):
+    """
+    One dimension as strings, '' where missing
+
+    Topics assigned by assign_topics give their label; without a 'district'
+    column, the district is read from metadata['location'] like the insights do.
+    """
+    if name in sentiment_data:
+        values = [
+            value.get('label') if isinstance(value, dict) else value
+            for value in sentiment_data[name]
+        ]
+    elif name == 'district' and 'metadata' in sentiment_data:
+        values = [
+            value['location'].get('district')
+            if isinstance(value, dict) and isinstance(value.get('location'), dict) else None
+            for value in sentiment_data['metadata']
+        ]
+    else:
+        return np.full(len(sentiment_data), '', dtype=object)
+    return np.array(['' if value is None or value != value else str(value) for value in values],
+                    dtype=object)
+
+
+class RollupStore:
+    """
+    Hourly and daily sentiment aggregates in a SQLite file
+
+    Each bucket holds the count, score sum, sum of squared scores and
+    positive/neutral/negative counts of the records of one hour (or day) and
+    one combination of topic, source, district and language. All of these
+    add up, so any coarser series (per topic, per day, overall...) is a SUM
+    over buckets, and a mean and std follow from count, sum and sum of
+    squares. Trend queries then cost as many rows as there are buckets,
+    however many comments were scored. Buckets are aligned to whole hours
+    and days of the (naive) timestamps.
+
+    Records added with keys are counted once: the keys are kept, and a
+    record whose key is already in the store is skipped, so re-ingesting a
+    file (or re-running the pipeline over it) changes nothing.
+
+    Usage:
+        rollups = RollupStore('sentiment-rollups.sqlite')
+        rollups.add(scored_records, keys=comment_ids)
+        detect_emerging_concerns(rollups)
+        rollups.overview(timeframe='daily')
+    """
+
+    def __init__(self, path=DEFAULT_ROLLUP_PATH):
+        """
+        Args:
+            path: SQLite file, created if missing (':memory:' for a throwaway store)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        key = ', '.join(f'{dim} TEXT NOT NULL' for dim in DIMENSIONS)
+        values = ', '.join(
+            f'{name} {"REAL" if name.startswith("score") else "INTEGER"} NOT NULL' for name in AGGREGATES
+        )
+        for granularity in GRANULARITIES:
+            self._conn.execute(
+                f'CREATE TABLE IF NOT EXISTS rollup_{granularity} (bucket INTEGER NOT NULL, {key}, '
+                f'{values}, PRIMARY KEY (bucket, {", ".join(DIMENSIONS)}))'
+            )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS rollup_keys (key TEXT PRIMARY KEY) WITHOUT ROWID'
+        )
+        self._conn.commit()
+
+    def add(self, sentiment_data, keys=None):
+        """
+        Fold scored records into their hourly and daily buckets
+
+        Args:
+            sentiment_data: DataFrame or list of dicts with 'timestamp' and
+                'score', and optionally the DIMENSIONS columns; records
+                without a timestamp or score are skipped
+            keys: Optional key per record (e.g. a comment id, see
+                record_keys); records whose key was added before are
+                skipped. Without keys every record is counted.
+
+        Returns:
+            Number of records added
+        """
+        if not isinstance(sentiment_data, pd.DataFrame):
+            sentiment_data = pd.DataFrame(list(sentiment_data))
+        if keys is not None:
+            keys = [str(key) for key in keys]
+            if len(keys) != len(sentiment_data):
+                raise ValueError(f"Got {len(keys)} keys for {len(sentiment_data)} records")
+        if sentiment_data.empty:
+            return 0
+
+        timestamps = pd.to_datetime(sentiment_data['timestamp'], errors='coerce', format='mixed')
+        scores = pd.to_numeric(sentiment_data['score'], errors='coerce').to_numpy(dtype=float)
+        valid = timestamps.notna().to_numpy() & ~np.isnan(scores)
+        labels = np.where(scores > POSITIVE_SCORE, 'positive',
+                          np.where(scores < -POSITIVE_SCORE, 'negative', 'neutral'))
+
+        frame = pd.DataFrame({
+            'bucket': timestamps.to_numpy(dtype='datetime64[ns]').view(np.int64) // NS_PER_HOUR,
+            **{dim: _dimension(sentiment_data, dim) for dim in DIMENSIONS},
+            'count': 1,
+            'score_sum': scores,
+            'score_sq_sum': scores * scores,
+            **{sentiment: (labels == sentiment).astype(np.int64) for sentiment in SENTIMENTS},
+        })
+
+        columns = ['bucket', *DIMENSIONS, *AGGREGATES]
+        updates = ', '.join(f'{name} = {name} + excluded.{name}' for name in AGGREGATES)
+        # The keys and the buckets they count towards are committed together
+        with self._lock, self._conn:
+            if keys is not None:
+                # First record of each key; repeats within the batch are skipped too
+                first = {}
+                for i in np.flatnonzero(valid):
+                    first.setdefault(keys[i], int(i))
+                distinct, positions = list(first), list(first.values())
+                # Keys go to SQLite as one JSON array per statement, not one call per record
+                new = [i for (i,) in self._conn.execute(
+                    'SELECT key FROM json_each(?) WHERE value NOT IN (SELECT key FROM rollup_keys)',
+                    (json.dumps(distinct),)
+                )]
+                self._conn.execute(
+                    'INSERT INTO rollup_keys (key) SELECT value FROM json_each(?)',
+                    (json.dumps([distinct[i] for i in new]),)
+                )
+                valid = np.zeros(len(valid), dtype=bool)
+                valid[[positions[i] for i in new]] = True
+
+            hourly = frame[valid].groupby(['bucket', *DIMENSIONS], sort=False).sum().reset_index()
+            daily = hourly.assign(bucket=hourly['bucket'] // 24) \
+                .groupby(['bucket', *DIMENSIONS], sort=False).sum().reset_index()
+            for granularity, buckets in (('hour', hourly), ('day', daily)):
+                self._conn.executemany(
+                    f'INSERT INTO rollup_{granularity} ({", ".join(columns)}) '
+                    f'VALUES ({", ".join("?" * len(columns))}) '
+                    f'ON CONFLICT DO UPDATE SET {updates}',
+                    buckets[columns].itertuples(index=False, name=None)
+                )
+        return int(valid.sum())
+
+    def series(self, granularity='day', by=(), start=None, end=None, **filters):
+        """
+        Aggregates per bucket (and per value of the by dimensions)
+
+        Args:
+            granularity: 'hour' or 'day'
+            by: Dimensions to keep apart; the others are summed over
+            start, end: Only buckets overlapping [start, end] (timestamps)
+            filters: Only buckets with these dimension values, e.g. district='Gasabo'
+
+        Returns:
+            DataFrame with 'timestamp' (bucket start), the by columns, the
+            AGGREGATES and their 'mean' and sample 'std', sorted by the by
+            columns and then time
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {list(GRANULARITIES)}")
+        unknown = set(by) | set(filters)
+        unknown -= set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unknown dimensions {sorted(unknown)}, expected some of {DIMENSIONS}")
+
+        ns_per_bucket = GRANULARITIES[granularity] * NS_PER_HOUR
+        conditions, params = [], []
+        if start is not None:
+            conditions.append('bucket >= ?')
+            params.append(pd.Timestamp(start).value // ns_per_bucket)
+        if end is not None:
+            conditions.append('bucket <= ?')
+            params.append(pd.Timestamp(end).value // ns_per_bucket)
+        for dim, value in filters.items():
+            conditions.append(f'{dim} = ?')
+            params.append(value)
+
+        keys = [*by, 'bucket']
+        query = (
+            f'SELECT {", ".join(keys)}, {", ".join(f"SUM({name})" for name in AGGREGATES)} '
+            f'FROM rollup_{granularity}'
+            + (f' WHERE {" AND ".join(conditions)}' if conditions else '')
+            + f' GROUP BY {", ".join(keys)} ORDER BY {", ".join(keys)}'
+        )
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+
+        df = pd.DataFrame(rows, columns=[*keys, *AGGREGATES])
+        df.insert(len(by), 'timestamp', pd.to_datetime(df.pop('bucket').astype(np.int64) * ns_per_bucket))
+        count = df['count'].to_numpy(dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            df['mean'] = df['score_sum'] / count
+            variance = (df['score_sq_sum'] - df['score_sum'] * df['mean']) / (count - 1)
+        df['std'] = np.sqrt(variance.clip(lower=0)).where(count > 1)
+        return df
+
+    def topic_daily_sentiment(self, cutoff):
+        """Daily mean and count per topic from the day containing cutoff on, as detect_emerging_concerns groups them"""
+        df = self.series('day', by=('topic',), start=cutoff)
+        return df[df['topic'] != ''][['topic', 'timestamp', 'mean', 'count']].reset_index(drop=True)
+
+    def hourly_sentiment(self, cutoff):
+        """
+        Hourly mean, count and std from the hour containing cutoff on, as
+        detect_sentiment_spikes groups them: every hour between the first and
+        the last non-empty one, empty hours included
+        """
+        df = self.series('hour', start=cutoff)
+        if df.empty:
+            return df[['timestamp', 'mean', 'count', 'std']]
+        hours = pd.date_range(df['timestamp'].iloc[0], df['timestamp'].iloc[-1], freq='h')
+        df = df.set_index('timestamp').reindex(hours)
+        df['count'] = df['count'].fillna(0).astype(np.int64)
+        return df.rename_axis('timestamp')[['mean', 'count', 'std']].reset_index()
+
+    def overview(self, start=None, end=None, timeframe='monthly'):
+        """
+        The dashboard's sentiment overview, computed from the daily buckets
+
+        Same response as GET /api/sentiment/overview: overall counts and
+        percentages, one data point per day, week or month, and the trend of
+        the mean score against the preceding period of the same length.
+
+        Args:
+            start, end: First and last day included (default: the last 30 days)
+            timeframe: 'daily', 'weekly' or 'monthly'
+        """
+        if timeframe not in TIMEFRAME_FORMATS:
+            timeframe = 'monthly'
+        end = pd.Timestamp.now() if end is None else pd.Timestamp(end)
+        start = end - pd.Timedelta(days=30) if start is None else pd.Timestamp(start)
+        start, end = start.normalize(), end.normalize()
+        period_days = (end - start).days if end > start else 30
+
+        daily = self.series('day', start=start, end=end)
+
+        def summary(df):
+            total = int(df['count'].sum())
+            counts = {sentiment: int(df[sentiment].sum()) for sentiment in SENTIMENTS}
+            return {
+                **counts,
+                'total': total,
+                **{f'{sentiment}Percent': 100.0 * counts[sentiment] / total for sentiment in SENTIMENTS},
+            }
+
+        trends = []
+        if not daily.empty:
+            periods = daily['timestamp'].dt.strftime(TIMEFRAME_FORMATS[timeframe])
+            for period, df in daily.groupby(periods, sort=True):
+                trends.append({'date': period, **summary(df)})
+
+        overall = None
+        if daily['count'].sum() > 0:
+            overall = {**summary(daily), 'avgScore': float(daily['score_sum'].sum() / daily['count'].sum())}
+
+        previous = self.series(
+            'day', start=start - pd.Timedelta(days=period_days), end=start - pd.Timedelta(days=1)
+        )
+        trend, trend_percentage = 0.0, 0.0
+        if overall is not None and previous['count'].sum() > 0:
+            previous_avg = float(previous['score_sum'].sum() / previous['count'].sum())
+            trend = overall['avgScore'] - previous_avg
+            trend_percentage = abs(trend / abs(previous_avg)) * 100 if previous_avg else 0.0
+
+        return {
+            'overallSentiment': overall,
+            'trend': trend,
+            'trendDirection': 'positive' if trend > 0 else 'negative' if trend < 0 else 'stable',
+            'trendPercentage': trend_percentage,
+            'timeframe': timeframe,
+            'sentimentTrends': trends,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+def record_keys(input_path, rows, ids=None):
+    """
+    Rollup keys of rows read from an input file
+
+    Comment ids, when the file has them, are used as is, so a comment is
+    counted once whatever file it comes from; otherwise the key is the
+    file's absolute path and the row number.
+
+    Args:
+        input_path: The file the rows come from
+        rows: Row number of each row in the file
+        ids: Optional comment id of each row
+    """
+    if ids is not None:
+        return [str(row_id) for row_id in ids]
+    path = os.path.abspath(input_path)
+    return [f'{path}:{row}' for row in rows]
+
+
+def results_records(df, date_column='Date', district_column='District', source_column='Source'):
+    """
+    Scored records from a results table (stream_pipeline / batch_job output)
+
+    Args:
+        df: DataFrame with the date column, 'Sentiment_Score' and optionally
+            'Topic', 'Language' and the district and source columns
+    """
+    if date_column not in df.columns:
+        raise ValueError(f"No {date_column!r} column to date the records by")
+    columns = {
+        'timestamp': date_column, 'score': 'Sentiment_Score', 'topic': 'Topic',
+        'source': source_column, 'district': district_column, 'language': 'Language',
+    }
+    return pd.DataFrame({
+        name: df[column].astype(object) if name in DIMENSIONS else df[column]
+        for name, column in columns.items() if column in df.columns
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build or query the sentiment rollup store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add', help='Fold a results file into the rollups')
+    add_parser.add_argument('input', help='Parquet result file or results CSV')
+    add_parser.add_argument('--date-column', default='Date')
+    add_parser.add_argument('--district-column', default='District')
+    add_parser.add_argument('--source-column', default='Source')
+    add_parser.add_argument('--id-column',
+                            help='Column of comment ids the records are counted once by '
+                                 '(default: row number)')
+
+    overview_parser = subparsers.add_parser('overview', help='Print the dashboard overview')
+    overview_parser.add_argument('--start')
+    overview_parser.add_argument('--end')
+    overview_parser.add_argument('--timeframe', choices=list(TIMEFRAME_FORMATS), default='monthly')
+
+    trends_parser = subparsers.add_parser('trends', help='Print emerging concerns and sentiment spikes')
+    trends_parser.add_argument('--window-days', type=int, default=7)
+
+    for subparser in (add_parser, overview_parser, trends_parser):
+        subparser.add_argument('--rollups', default=DEFAULT_ROLLUP_PATH, help='Rollup SQLite file')
+    args = parser.parse_args()
+
+    rollups = RollupStore(args.rollups)
+    if args.command == 'add':
+        if args.input.endswith('.parquet'):
+            df = pd.read_parquet(args.input)
+        else:
+            df = pd.read_csv(args.input)
+        keys = record_keys(args.input, df.index, df[args.id_column] if args.id_column else None)
+        n_records = rollups.add(
+            results_records(df, args.date_column, args.district_column, args.source_column), keys
+        )
+        print(f"Added {n_records} new records from {args.input} to {args.rollups}")
+    elif args.command == 'overview':
+        print(json.dumps(rollups.overview(args.start, args.end, args.timeframe), indent=2))
+    else:
+        import sentiment_analyzer
+
+        report = {
+            'emerging_concerns': sentiment_analyzer.detect_emerging_concerns(rollups, args.window_days),
+            'sentiment_spikes': sentiment_analyzer.detect_sentiment_spikes(rollups, args.window_days),
+        }
+        print(json.dumps(report, indent=2, default=str))
+    rollups.close()
@@ -1,78 +1,368 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.decomposition import NMF
-from sklearn.metrics import silhouette_score
-from sklearn.cluster import KMeans
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-import torch
+import copy
 import re
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import PorterStemmer, WordNetLemmatizer
-import spacy
-from textblob import TextBlob
+import threading
+from functools import lru_cache
+from itertools import islice
+import metrics
+from result_cache import ResultCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from rollup_store import RollupStore
+from dedup import NEAR_DUPLICATE_THRESHOLD, find_duplicates
+from fact_index import FactIndex
+from insights import generate_insights
+from language_id import LanguageIdentifier, load_stopwords
+from sentiment_backends import DEFAULT_ONNX_PATH, load_backend
+from sentiment_cascade import DEFAULT_CASCADE_PATH, DEFAULT_THRESHOLD, load_or_train
+from topic_model import SILHOUETTE_SAMPLE_SIZE
 # import kinyarwanda_nlp  # Custom module for Kinyarwanda language processing
 
-# Download required NLTK data
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
-# Add this at the beginning of your script with the other downloads
-nltk.download('punkt_tab')
-
-# Load models for multiple languages
-nlp_en = spacy.load("en_core_web_md")
-nlp_fr = spacy.load("fr_core_news_md")
-# nlp_rw = kinyarwanda_nlp.load()  # Custom model for Kinyarwanda
-
-# Load pre-trained sentiment models
-# tokenizer = AutoTokenizer.from_pretrained("Davlan/afro-xlmr-base-sentiment")
-# model = AutoModelForSequenceClassification.from_pretrained("Davlan/afro-xlmr-base-sentiment")
-tokenizer = AutoTokenizer.from_pretrained("nlptown/bert-base-multilingual-uncased-sentiment")
-model = AutoModelForSequenceClassification.from_pretrained("nlptown/bert-base-multilingual-uncased-sentiment")
-
-
-# Initialize preprocessing tools
-ps = PorterStemmer()
-lemmatizer = WordNetLemmatizer()
-stop_words_en = set(stopwords.words('english'))
-stop_words_fr = set(stopwords.words('french'))
-# stop_words_rw = set(kinyarwanda_nlp.STOP_WORDS)  # Custom stop words for Kinyarwanda
-
-def preprocess_text(text, language='en'):
-    """Preprocess text data based on language"""
+# Heavy libraries (torch, transformers, spaCy, NLTK, scikit-learn) are imported
+# inside the loaders and functions that need them, so importing this module is
+# fast and touches no network. Models are loaded on first use.
+
+# Load pre-trained sentiment models (see use_sentiment_model())
+# SENTIMENT_MODEL_NAME = "Davlan/afro-xlmr-base-sentiment"
+SENTIMENT_MODEL_NAME = "nlptown/bert-base-multilingual-uncased-sentiment"
+
+# Inference backend for the sentiment model: 'torch' (fp32), 'int8' (dynamic
+# quantization) or 'onnx' (ONNX Runtime); see use_sentiment_backend()
+SENTIMENT_BACKEND = 'torch'
+SENTIMENT_ONNX_PATH = DEFAULT_ONNX_PATH
+
+# Confidence-gated cascade, off while the threshold is None: a TF-IDF + linear
+# model scores every text and only texts it is less confident about than the
+# threshold go to the transformer; see use_sentiment_cascade()
+SENTIMENT_CASCADE_THRESHOLD = None
+SENTIMENT_CASCADE_PATH = DEFAULT_CASCADE_PATH
+
+# spaCy pipelines per language
+SPACY_MODELS = {
+    'en': "en_core_web_md",
+    'fr': "fr_core_news_md",
+    # 'rw': kinyarwanda_nlp  # Custom model for Kinyarwanda
+}
+
+# Bump whenever preprocessing or the result format changes, so that
+# results cached by an older pipeline are not served
+PIPELINE_VERSION = 3
+
+# Batching limits for transformer inference
+SENTIMENT_BATCH_SIZE = 32
+SENTIMENT_MAX_BATCH_TOKENS = 8192
+
+# Longer texts are scored as overlapping windows of at most SENTIMENT_MAX_LENGTH
+# tokens (capped by the model's own limit), sharing SENTIMENT_WINDOW_STRIDE tokens
+SENTIMENT_MAX_LENGTH = 512
+SENTIMENT_WINDOW_STRIDE = 128
+
+# Batching for spaCy entity extraction (n_process > 1 forks extra workers)
+SPACY_BATCH_SIZE = 64
+SPACY_N_PROCESS = 1
+
+# Number of texts analyze_text_stream holds in memory at once
+STREAM_CHUNK_SIZE = 256
+
+# URLs, mentions, hashtags and punctuation, stripped in a single pass
+_STRIP_PATTERN = re.compile(r'http\S+|@\w+|#\w+|[^\w\s]')
+
+# Contractions NLTK's word_tokenize splits even once apostrophes are removed
+_TREEBANK_SPLITS = {
+    'cannot': ('can', 'not'), 'gimme': ('gim', 'me'), 'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'), 'lemme': ('lem', 'me'), 'wanna': ('wan', 'na')
+}
+_TREEBANK_PATTERN = re.compile(r'\b(?:' + '|'.join(_TREEBANK_SPLITS) + r')\b')
+
+# Distinct words whose lemma is memoized
+LEMMA_CACHE_SIZE = 100000
+
+# Persistent result cache, off unless enable_result_cache() is called
+result_cache = None
+
+# Loaded resources by name, and the functions that load them
+_resources = {}
+_loaders = {}
+_resources_lock = threading.RLock()
+
+def register_loader(name, loader):
+    """Register (or replace) the zero-argument function that loads a resource"""
+    with _resources_lock:
+        _loaders[name] = loader
+        _resources.pop(name, None)
+
+def set_resource(name, value):
+    """Provide an already-loaded resource, e.g. a model shared by a parent process"""
+    with _resources_lock:
+        _resources[name] = value
+
+def get_resource(name):
+    """Return a resource, loading it on first use"""
+    try:
+        return _resources[name]
+    except KeyError:
+        pass
+    
+    with _resources_lock:
+        if name not in _resources:
+            if name not in _loaders:
+                raise KeyError(f"No loader registered for resource '{name}'")
+            with metrics.stage('model_load', resource=name):
+                _resources[name] = _loaders[name]()
+        return _resources[name]
+
+def warmup(names=None):
+    """
+    Load resources up front instead of on first use
+    
+    Args:
+        names: Resource names to load (defaults to every registered resource)
+    """
+    for name in names if names is not None else list(_loaders):
+        get_resource(name)
+
+def _nltk_data(resource_path, package):
+    """Make sure an NLTK data package is available, downloading only if missing"""
+    import nltk
+    try:
+        nltk.data.find(resource_path)
+    except LookupError:
+        nltk.download(package, quiet=True)
+
+def _load_lemmatizer():
+    from nltk.stem import WordNetLemmatizer
+    _nltk_data('corpora/wordnet', 'wordnet')
+    return WordNetLemmatizer()
+
+def _stopwords_loader(language_name):
+    def load():
+        from nltk.corpus import stopwords
+        _nltk_data('corpora/stopwords', 'stopwords')
+        return set(stopwords.words(language_name))
+    return load
+
+def _spacy_loader(model_name):
+    def load():
+        import spacy
+        return spacy.load(model_name)
+    return load
+
+def _load_sentiment_model():
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL_NAME)
+    model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL_NAME)
+    model.eval()
+    return tokenizer, model
+
+register_loader('lemmatizer', _load_lemmatizer)
+register_loader('stopwords_en', _stopwords_loader('english'))
+register_loader('stopwords_fr', _stopwords_loader('french'))
+register_loader('stopwords_rw', lambda: load_stopwords('rw'))
+register_loader('language_identifier', LanguageIdentifier.load)
+for _language, _model_name in SPACY_MODELS.items():
+    register_loader(f'nlp_{_language}', _spacy_loader(_model_name))
+register_loader('sentiment_model', _load_sentiment_model)
+
+def _load_sentiment_backend():
+    tokenizer, model = get_sentiment_model()
+    return tokenizer, load_backend(SENTIMENT_BACKEND, tokenizer, model, SENTIMENT_ONNX_PATH)
+
+register_loader('sentiment_backend', _load_sentiment_backend)
+
+# Registered only while the cascade is on (see use_sentiment_cascade), so
+# warmup() never trains or loads the linear tier for nothing
+def _load_sentiment_cascade():
+    return load_or_train(SENTIMENT_CASCADE_PATH)
+
+def get_nlp(language):
+    """spaCy pipeline for a language, or None if we have no model for it"""
+    name = f'nlp_{language}'
+    if name not in _loaders and name not in _resources:
+        return None
+    return get_resource(name)
+
+def get_stopwords(language):
+    """Stop word set for a language (empty if we have none)"""
+    name = f'stopwords_{language}'
+    if name not in _loaders and name not in _resources:
+        return set()
+    return get_resource(name)
+
+def get_sentiment_model():
+    """(tokenizer, model) pair of the fp32 PyTorch sentiment model"""
+    return get_resource('sentiment_model')
+
+def get_sentiment_backend():
+    """(tokenizer, backend) pair used for sentiment inference"""
+    return get_resource('sentiment_backend')
+
+def use_sentiment_model(name):
+    """
+    Choose the sentiment model to load
+    
+    Args:
+        name: Hugging Face model id or local directory of a 5-class
+            (1-5 stars) sequence classification model
+    """
+    global SENTIMENT_MODEL_NAME
+    SENTIMENT_MODEL_NAME = name
+    # Drops the loaded model and the backend built from it
+    register_loader('sentiment_model', _load_sentiment_model)
+    register_loader('sentiment_backend', _load_sentiment_backend)
+    _reopen_result_cache()
+
+def use_sentiment_backend(name, onnx_path=None):
+    """
+    Choose how the sentiment model is run
+    
+    Args:
+        name: 'torch' (fp32 PyTorch), 'int8' (dynamic int8 quantization of the
+            PyTorch model) or 'onnx' (ONNX Runtime session)
+        onnx_path: Exported ONNX model; exported from the PyTorch model on
+            first use if the file does not exist
+    
+    Labels map to sentiments the same way for every backend. Run
+    sentiment_parity.py to compare accuracy and speed before switching.
+    """
+    global SENTIMENT_BACKEND, SENTIMENT_ONNX_PATH
+    SENTIMENT_BACKEND = name
+    if onnx_path is not None:
+        SENTIMENT_ONNX_PATH = onnx_path
+    # Drops the loaded backend so the next call builds the new one
+    register_loader('sentiment_backend', _load_sentiment_backend)
+    
+    # Backends score slightly differently, so they do not share cached results
+    _reopen_result_cache()
+
+def use_sentiment_cascade(threshold=DEFAULT_THRESHOLD, model_path=None):
+    """
+    Turn the confidence-gated cascade on (or off with threshold=None)
+    
+    A TF-IDF + logistic regression model trained on the labelled dataset
+    scores every text; texts whose top class probability is below threshold
+    are escalated to the transformer. Sentiment dicts then carry a 'tier' of
+    'linear' or 'transformer'. Run `python sentiment_cascade.py report` to
+    pick a threshold and `python sentiment_cascade.py train` to retrain.
+    
+    Args:
+        threshold: Smallest linear-model confidence accepted without escalation
+        model_path: Saved linear model; trained on Newdataset.csv and saved
+            there on first use if the file does not exist
+    """
+    global SENTIMENT_CASCADE_THRESHOLD, SENTIMENT_CASCADE_PATH
+    SENTIMENT_CASCADE_THRESHOLD = threshold
+    if model_path is not None:
+        SENTIMENT_CASCADE_PATH = model_path
+    if threshold is not None:
+        register_loader('sentiment_cascade', _load_sentiment_cascade)
+    else:
+        with _resources_lock:
+            _loaders.pop('sentiment_cascade', None)
+            _resources.pop('sentiment_cascade', None)
+    _reopen_result_cache()
+
+def _reopen_result_cache():
+    """Re-create an enabled result cache so its version matches the current settings"""
+    if result_cache is not None:
+        path, max_entries = result_cache.path, result_cache.max_entries
+        disable_result_cache()
+        enable_result_cache(path, max_entries)
+
+def enable_result_cache(path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Turn on the persistent result cache
+    
+    Repeated texts (retweets, copy-pasted complaints...) are then served from the
+    cache by analyze_sentiment, analyze_sentiment_batch and analyze_text_batch.
+    
+    Returns:
+        The ResultCache, whose stats() reports hit/miss counts
+    """
+    global result_cache
+    version = f"{SENTIMENT_MODEL_NAME}:{SENTIMENT_BACKEND}:{PIPELINE_VERSION}"
+    if SENTIMENT_CASCADE_THRESHOLD is not None:
+        version += f":cascade{SENTIMENT_CASCADE_THRESHOLD}"
+    result_cache = ResultCache(path, version, max_entries)
+    return result_cache
+
+def _count_cache_lookups(namespace, lookups, hits):
+    """Report cache hits/misses to the instrumentation sinks"""
+    metrics.count('cache_hits', int(hits), namespace=namespace)
+    metrics.count('cache_misses', lookups - int(hits), namespace=namespace)
+
+def disable_result_cache():
+    """Turn off the result cache"""
+    global result_cache
+    if result_cache is not None:
+        result_cache.close()
+    result_cache = None
+
+def tokenize_text(text):
+    """
+    Strip URLs, mentions, hashtags and punctuation and split into lowercase words
+    
+    One precompiled regex pass plus str.split, giving the same tokens as the
+    old four re.sub calls followed by NLTK's word_tokenize (the only difference
+    is when a mention or hashtag runs straight into a URL).
+    """
     if not isinstance(text, str):
-        return ""
+        return []
+    
+    text = _STRIP_PATTERN.sub('', text).lower()
+    tokens = text.split()
+    
+    # word_tokenize splits a few contractions even without their punctuation
+    if _TREEBANK_PATTERN.search(text):
+        tokens = [piece for token in tokens for piece in _TREEBANK_SPLITS.get(token, (token,))]
+    
+    return tokens
+
+@lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def _lemmatize(token):
+    return get_resource('lemmatizer').lemmatize(token)
+
+def preprocess_text(text, language='en', tokens=None):
+    """Preprocess text data based on language
     
-    # Remove URLs, mentions, hashtags, and special characters
-    text = re.sub(r'http\S+', '', text)
-    text = re.sub(r'@\w+', '', text)
-    text = re.sub(r'#\w+', '', text)
-    text = re.sub(r'[^\w\s]', '', text)
+    Args:
+        text: Raw text
+        language: Language of the text
+        tokens: Output of tokenize_text(text), if already computed
+    """
+    if not isinstance(text, str):
+        return ""
     
-    # Convert to lowercase
-    text = text.lower()
+    if tokens is None:
+        tokens = tokenize_text(text)
     
-    # Tokenize based on language
+    stop_words = get_stopwords(language)
     if language == 'en':
-        tokens = word_tokenize(text)
-        stop_words = stop_words_en
-        tokens = [lemmatizer.lemmatize(token) for token in tokens if token not in stop_words]
-    elif language == 'fr':
-        tokens = word_tokenize(text)
-        stop_words = stop_words_fr
+        tokens = [_lemmatize(token) for token in tokens if token not in stop_words]
+    else:
+        # French, Kinyarwanda (and languages without a lemmatizer) only drop stop words
         tokens = [token for token in tokens if token not in stop_words]
-    # elif language == 'rw':
-    #     tokens = kinyarwanda_nlp.tokenize(text)
-    #     stop_words = stop_words_rw
-    #     tokens = [token for token in tokens if token not in stop_words]
     
     return ' '.join(tokens)
 
+def preprocess_batch(texts):
+    """
+    Identify the language of and preprocess many texts
+    
+    Each text is tokenized once and the tokens are shared by language
+    identification (one vectorized call for the whole batch) and preprocessing.
+    
+    Returns:
+        (languages, language_confidences, processed_texts) lists in the same
+        order as texts
+    """
+    tokens_per_text = [tokenize_text(text) for text in texts]
+    languages, confidences = identify_languages([' '.join(tokens) for tokens in tokens_per_text])
+    processed_texts = [
+        preprocess_text(text, language, tokens)
+        for text, language, tokens in zip(texts, languages, tokens_per_text)
+    ]
+    
+    return languages, confidences, processed_texts
+
 # def detect_language(text):
 #     """Detect language of the text"""
 #     if not isinstance(text, str) or len(text.strip()) == 0:
@@ -92,29 +382,31 @@ def preprocess_text(text, language='en'):
 #         return 'fr'
 #     else:
 #         return 'en'
-def detect_language(text):
-    """Detect language of the text"""
-    if not isinstance(text, str) or len(text.strip()) == 0:
-        return 'en'  # Default to English
+def identify_languages(texts):
+    """
+    Identify the language of many texts with character n-gram profiles
     
-    # Simple language detection based on common words
-    text_lower = text.lower()
+    Returns:
+        (languages, confidences) lists; 'en', 'fr' or 'rw' for each text, with
+        texts that are too short or ambiguous to tell falling back to 'en'
+    """
+    return get_resource('language_identifier').predict(texts)
+
+def detect_language(text, tokens=None):
+    """Detect language of the text
     
-    # Simple word splitting instead of sophisticated tokenization
-    words = set(re.findall(r'\b\w+\b', text_lower))
+    Args:
+        text: Raw text
+        tokens: Output of tokenize_text(text), if already computed
+    """
+    if not isinstance(text, str) or len(text.strip()) == 0:
+        return 'en'  # Default to English
     
-    en_count = len(words.intersection(stop_words_en))
-    fr_count = len(words.intersection(stop_words_fr))
-    # rw_count line commented out in your code
-    # rw_count = len(words.intersection(stop_words_rw))
+    if tokens is not None:
+        text = ' '.join(tokens)
     
-    # Since rw_count is commented out, this comparison won't work
-    # if rw_count > en_count and rw_count > fr_count:
-    #     return 'rw'
-    if fr_count > en_count:
-        return 'fr'
-    else:
-        return 'en'
+    languages, _ = identify_languages([text])
+    return languages[0]
 
 # def analyze_sentiment(text, language='en'):
 #     """Analyze sentiment of text using appropriate model based on language"""
@@ -147,17 +439,8 @@ def detect_language(text):
 #         'confidence': float(score)
 #     }
 
-def analyze_sentiment(text, language='en'):
-    """Analyze sentiment of text using appropriate model based on language"""
-    if not isinstance(text, str) or len(text.strip()) == 0:
-        return {'sentiment': 'neutral', 'score': 0.0}
-    
-    # For multilingual sentiment, use transformer model
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-    with torch.no_grad():
-        outputs = model(**inputs)
-        scores = torch.softmax(outputs.logits, dim=1).numpy()[0]
-    
+def _scores_to_sentiment(scores):
+    """Map the model's class probabilities to our sentiment dict"""
     # Get sentiment label and score
     sentiment_id = scores.argmax()
     
@@ -180,6 +463,159 @@ def analyze_sentiment(text, language='en'):
         'confidence': float(scores[sentiment_id])
     }
 
+def analyze_sentiment(text, language='en'):
+    """Analyze sentiment of text using appropriate model based on language"""
+    if not isinstance(text, str) or len(text.strip()) == 0:
+        return {'sentiment': 'neutral', 'score': 0.0}
+    
+    # For multilingual sentiment, use transformer model
+    return analyze_sentiment_batch([text])[0]
+
+def _length_sorted_batches(lengths, batch_size, max_batch_tokens):
+    """Group item indices into batches of similar token length
+    
+    Items are sorted by length so each padded batch wastes as little as possible.
+    A batch is closed when it reaches batch_size items or when padding every item
+    to the longest one would exceed max_batch_tokens.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    
+    batches = []
+    batch = []
+    for i in order:
+        # Sorted ascending, so the new item is the longest in the batch
+        padded_tokens = (len(batch) + 1) * lengths[i]
+        if batch and (len(batch) >= batch_size or padded_tokens > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        batches.append(batch)
+    
+    return batches
+
+def analyze_sentiment_batch(texts, batch_size=SENTIMENT_BATCH_SIZE,
+                            max_batch_tokens=SENTIMENT_MAX_BATCH_TOKENS,
+                            max_length=SENTIMENT_MAX_LENGTH,
+                            window_stride=SENTIMENT_WINDOW_STRIDE):
+    """
+    Analyze sentiment of many texts with batched transformer inference
+    
+    Inputs are bucketed by token length and each batch is padded only to its
+    own longest item, so short posts never pay for long ones. A text longer
+    than max_length is not truncated: it is split into overlapping windows and
+    the class probabilities of its windows are averaged, weighted by length.
+    
+    Args:
+        texts: List of texts to score
+        batch_size: Maximum number of windows per forward pass
+        max_batch_tokens: Maximum padded tokens (items x longest item) per forward pass
+        max_length: Maximum tokens per window
+        window_stride: Tokens shared by consecutive windows of a long text
+            (at most half a window's text tokens, so every window moves forward)
+    
+    Returns:
+        List of sentiment dicts, in the same order as texts
+    """
+    results = [None] * len(texts)
+    
+    # Empty texts get the same neutral result as analyze_sentiment
+    valid_idx = []
+    for i, text in enumerate(texts):
+        if not isinstance(text, str) or len(text.strip()) == 0:
+            results[i] = {'sentiment': 'neutral', 'score': 0.0}
+        else:
+            valid_idx.append(i)
+    
+    # Serve repeated texts from the cache, only score the misses
+    if result_cache is not None and valid_idx:
+        cached = result_cache.get_many('sentiment', [texts[i] for i in valid_idx])
+        _count_cache_lookups('sentiment', len(valid_idx), len(cached))
+        for j, sentiment in cached.items():
+            results[valid_idx[j]] = sentiment
+        valid_idx = [i for j, i in enumerate(valid_idx) if j not in cached]
+    
+    # Cascade: the linear model keeps the texts it is confident about and
+    # escalates the rest to the transformer
+    cascade = SENTIMENT_CASCADE_THRESHOLD is not None
+    if cascade and valid_idx:
+        with metrics.stage('sentiment_linear', items=len(valid_idx)):
+            linear = get_resource('sentiment_cascade').predict([texts[i] for i in valid_idx])
+        escalated = []
+        for i, sentiment in zip(valid_idx, linear):
+            if sentiment['confidence'] >= SENTIMENT_CASCADE_THRESHOLD:
+                results[i] = sentiment
+            else:
+                escalated.append(i)
+        metrics.count('sentiment_escalated', len(escalated))
+        metrics.count('sentiment_linear_decided', len(valid_idx) - len(escalated))
+        
+        if result_cache is not None:
+            decided = [i for i in valid_idx if results[i] is not None]
+            result_cache.put_many(
+                'sentiment', [texts[i] for i in decided], [results[i] for i in decided]
+            )
+        valid_idx = escalated
+    
+    if not valid_idx:
+        return results
+    
+    tokenizer, backend = get_sentiment_backend()
+    
+    max_length = min(max_length, tokenizer.model_max_length)
+    # The tokenizer rejects a stride that leaves no room for new tokens
+    window_stride = min(window_stride, (max_length - tokenizer.num_special_tokens_to_add()) // 2)
+    
+    # Tokenize once without padding, splitting long texts into windows; each
+    # window remembers which text it came from
+    encodings = tokenizer(
+        [texts[i] for i in valid_idx], truncation=True, max_length=max_length,
+        stride=window_stride, return_overflowing_tokens=True
+    )
+    window_text = np.asarray(encodings.pop('overflow_to_sample_mapping'))
+    lengths = [len(ids) for ids in encodings['input_ids']]
+    window_scores = [None] * len(lengths)
+    
+    # Pad each batch of similar-length windows to its own longest item
+    for batch in _length_sorted_batches(lengths, batch_size, max_batch_tokens):
+        with metrics.stage('sentiment_forward', items=len(batch), batches=1,
+                           backend=backend.name) as forward:
+            features = tokenizer.pad(
+                [{key: encodings[key][j] for key in encodings.keys()} for j in batch],
+                return_tensors="np"
+            )
+            forward.add(padded_tokens=int(features['input_ids'].size))
+            scores = backend.predict_proba(features)
+        
+        for j, row in zip(batch, scores):
+            window_scores[j] = row
+    
+    # Texts that fit in one window keep their scores as they are; long texts
+    # average theirs, weighted by window length
+    window_scores = np.stack(window_scores)
+    n_windows = np.bincount(window_text, minlength=len(valid_idx))
+    text_scores = window_scores[np.searchsorted(window_text, np.arange(len(valid_idx)))]
+    long_texts = np.flatnonzero(n_windows > 1)
+    if len(long_texts):
+        metrics.count('sentiment_windowed_texts', len(long_texts))
+        weights = np.asarray(lengths, dtype=np.float64)
+        totals = np.zeros((len(valid_idx), window_scores.shape[1]))
+        np.add.at(totals, window_text, window_scores * weights[:, None])
+        totals /= np.bincount(window_text, weights=weights, minlength=len(valid_idx))[:, None]
+        text_scores[long_texts] = totals[long_texts]
+    
+    for j, row in enumerate(text_scores):
+        results[valid_idx[j]] = _scores_to_sentiment(row)
+        if cascade:
+            results[valid_idx[j]]['tier'] = 'transformer'
+    
+    if result_cache is not None:
+        result_cache.put_many(
+            'sentiment', [texts[i] for i in valid_idx], [results[i] for i in valid_idx]
+        )
+    
+    return results
+
 # def extract_topics(texts, n_topics=5):
 #     """Extract main topics from a corpus of texts using NMF"""
 #     # Create TF-IDF representation
@@ -227,6 +663,11 @@ def analyze_sentiment(text, language='en'):
 
 def extract_topics(texts, n_topics=5):
     """Extract main topics from a corpus of texts using NMF"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.decomposition import NMF
+    from sklearn.metrics import silhouette_score
+    from sklearn.cluster import KMeans
+    
     # Check if we have enough texts for clustering
     if len(texts) < 2:
         return {
@@ -264,7 +705,11 @@ def extract_topics(texts, n_topics=5):
                 silhouette_scores.append(0)
                 continue
                 
-            score = silhouette_score(tfidf, kmeans.labels_)
+            # Large corpora are scored on a sample instead of all pairwise distances
+            sample_size = None
+            if tfidf.shape[0] > SILHOUETTE_SAMPLE_SIZE:
+                sample_size = SILHOUETTE_SAMPLE_SIZE
+            score = silhouette_score(tfidf, kmeans.labels_, sample_size=sample_size, random_state=42)
             silhouette_scores.append(score)
         
         if silhouette_scores:
@@ -302,145 +747,453 @@ def extract_topics(texts, n_topics=5):
         'document_topics': doc_topic_assignments.tolist()
     }
 
-def detect_misinformation(text, verified_facts):
-    """Detect potential misinformation by comparing with verified facts"""
+def embed_texts(texts, language='en'):
+    """
+    Document vectors (mean of spaCy word vectors) for a list of texts
+    
+    Only the tokenizer runs; no pipeline component is needed for vectors.
+    """
+    nlp = get_nlp(language)
+    docs = nlp.pipe(texts, batch_size=SPACY_BATCH_SIZE, disable=nlp.pipe_names)
+    vectors = [doc.vector for doc in docs]
+    if not vectors:
+        return np.zeros((0, nlp.vocab.vectors_length), dtype=np.float32)
+    return np.vstack(vectors).astype(np.float32)
+
+def build_fact_index(verified_facts):
+    """
+    Embed and sentiment-score verified facts once
+    
+    Args:
+        verified_facts: List of dicts with a 'statement' (and usually a 'source')
+    
+    Returns:
+        FactIndex, which can be saved and reloaded for later runs
+    """
+    statements = [fact['statement'] for fact in verified_facts]
+    sentiments = analyze_sentiment_batch(statements)
+    return FactIndex(
+        verified_facts,
+        embed_texts(statements),
+        [sentiment['sentiment'] for sentiment in sentiments]
+    )
+
+def _as_fact_index(verified_facts):
+    """Accept either a FactIndex or a plain list of verified facts"""
+    if isinstance(verified_facts, FactIndex):
+        return verified_facts
+    return build_fact_index(verified_facts)
+
+def detect_misinformation(text, verified_facts, sentiment=None):
+    """
+    Detect potential misinformation by comparing with verified facts
+    
+    Args:
+        text: Text to check
+        verified_facts: FactIndex, or a list of verified fact dicts
+        sentiment: Sentiment dict already computed for text, if any
+    
+    Returns:
+        List of potential misinformation dicts
+    """
     # Simplified version - in production, use more sophisticated models
-    potential_misinformation = []
+    fact_index = _as_fact_index(verified_facts)
+    if sentiment is None:
+        sentiment = analyze_sentiment(text)
     
-    # Process the text
-    doc = nlp_en(text)
+    return detect_misinformation_batch([text], fact_index, [sentiment])[0]
+
+def detect_misinformation_batch(texts, fact_index, sentiments, text_vectors=None):
+    """
+    Check a batch of texts against a FactIndex with one similarity matrix product
     
-    for fact in verified_facts:
-        fact_doc = nlp_en(fact['statement'])
-        similarity = doc.similarity(fact_doc)
-        
-        # If text is similar to a verified fact but contradicts it
-        if similarity > 0.7:
-            sentiment = analyze_sentiment(text)
-            fact_sentiment = analyze_sentiment(fact['statement'])
-            
-            # If sentiments are opposite, flag as potential misinformation
-            if (sentiment['sentiment'] == 'positive' and fact_sentiment['sentiment'] == 'negative') or \
-               (sentiment['sentiment'] == 'negative' and fact_sentiment['sentiment'] == 'positive'):
-                potential_misinformation.append({
-                    'text': text,
-                    'contradicted_fact': fact['statement'],
-                    'similarity': similarity,
-                    'confidence': 0.7 * similarity
-                })
+    A text is flagged when it is similar to a verified fact (> 0.7) but has the
+    opposite sentiment.
+    
+    Args:
+        texts: List of texts
+        fact_index: FactIndex of verified facts
+        sentiments: Sentiment dict already computed for each text
+        text_vectors: embed_texts(texts), if already computed
     
-    return potential_misinformation
+    Returns:
+        One list of potential misinformation dicts per text
+    """
+    if len(fact_index) == 0:
+        return [[] for _ in texts]
+    
+    return fact_index.match(
+        embed_texts(texts) if text_vectors is None else text_vectors,
+        [sentiment['sentiment'] for sentiment in sentiments],
+        texts
+    )
 
-def analyze_text_batch(texts, verified_facts=None):
-    """Process a batch of texts for the sentiment dashboard"""
-    results = []
+def _ner_disabled_components(nlp):
+    """Pipeline components that NER does not depend on"""
+    needed = {'ner'}
     
-    for text in texts:
-        language = detect_language(text)
-        processed_text = preprocess_text(text, language)
-        sentiment_analysis = analyze_sentiment(processed_text, language)
-        
-        # Extract entities
-        if language == 'en':
-            doc = nlp_en(text)
-        elif language == 'fr':
-            doc = nlp_fr(text)
-        # elif language == 'rw':
-        #     doc = nlp_rw(text)
-        
-        entities = [
-            {'text': ent.text, 'label': ent.label_}
-            for ent in doc.ents
-        ]
-        
-        # Detect misinformation if verified facts are provided
-        misinformation = []
-        if verified_facts:
-            misinformation = detect_misinformation(text, verified_facts)
+    # Shared embedding layers are only needed if the NER component listens to them
+    for name in ('tok2vec', 'transformer'):
+        if name in nlp.pipe_names:
+            if 'ner' in getattr(nlp.get_pipe(name), 'listening_components', []):
+                needed.add(name)
+    
+    return [name for name in nlp.pipe_names if name not in needed]
+
+def extract_entities_batch(texts, languages, batch_size=SPACY_BATCH_SIZE,
+                           n_process=SPACY_N_PROCESS):
+    """
+    Extract named entities for many texts with spaCy's nlp.pipe
+    
+    Texts are grouped by language and each group is streamed through its
+    pipeline with the tagger, parser, lemmatizer etc. disabled.
+    
+    Args:
+        texts: List of texts
+        languages: Detected language of each text
+        batch_size: Number of texts per spaCy batch
+        n_process: Number of processes spaCy uses for each group
+    
+    Returns:
+        List of entity lists ({'text', 'label'} dicts), in the same order as texts
+    """
+    entities = [[] for _ in texts]
+    
+    # Missing values such as NaN cells have no entities
+    by_language = {}
+    for i, (text, language) in enumerate(zip(texts, languages)):
+        if isinstance(text, str):
+            by_language.setdefault(language, []).append(i)
+    
+    for language, indices in by_language.items():
+        # Languages without a spaCy model (e.g. Kinyarwanda) get no entities
+        # rather than being run through another language's model
+        nlp = get_nlp(language)
+        if nlp is None:
+            metrics.count('entities_skipped', len(indices), language=language)
+            continue
         
-        results.append({
-            'original_text': text,
+        docs = nlp.pipe(
+            (texts[i] for i in indices),
+            batch_size=batch_size,
+            n_process=n_process,
+            disable=_ner_disabled_components(nlp)
+        )
+        for i, doc in zip(indices, docs):
+            entities[i] = [
+                {'text': ent.text, 'label': ent.label_}
+                for ent in doc.ents
+            ]
+    
+    return entities
+
+def _analyze_texts(texts):
+    """Language, preprocessing, sentiment and entities for each text"""
+    records = []
+    n_texts = len(texts)
+    
+    with metrics.stage('preprocess', items=n_texts):
+        languages, language_confidences, processed_texts = preprocess_batch(texts)
+    
+    # Score all texts together so the model runs on padded mini-batches
+    with metrics.stage('sentiment', items=n_texts):
+        sentiments = analyze_sentiment_batch(processed_texts)
+    
+    # Extract entities
+    with metrics.stage('entities', items=n_texts):
+        entities_per_text = extract_entities_batch(texts, languages)
+    
+    for language, language_confidence, processed_text, sentiment_analysis, entities in zip(
+        languages, language_confidences, processed_texts, sentiments, entities_per_text
+    ):
+        records.append({
             'processed_text': processed_text,
             'language': language,
+            'language_confidence': language_confidence,
             'sentiment': sentiment_analysis,
-            'entities': entities,
-            'potential_misinformation': misinformation
+            'entities': entities
         })
     
-    # Extract topics across all texts
-    if len(texts) > 5:  # Need sufficient corpus size for meaningful topic extraction
-        topics = extract_topics([r['processed_text'] for r in results])
+    return records
+
+def _analyze_chunk(texts, verified_facts=None, embedding_store=None, ids=None):
+    """Analyze one chunk of texts, without corpus-level topic extraction"""
+    records = [None] * len(texts)
+    
+    # Reuse cached analyses of texts we have seen before
+    if result_cache is not None:
+        text_idx = [i for i, text in enumerate(texts) if isinstance(text, str)]
+        cached = result_cache.get_many('record', [texts[i] for i in text_idx])
+        _count_cache_lookups('record', len(text_idx), len(cached))
+        for j, record in cached.items():
+            records[text_idx[j]] = record
+    
+    pending = [i for i, record in enumerate(records) if record is None]
+    if pending:
+        for i, record in zip(pending, _analyze_texts([texts[i] for i in pending])):
+            records[i] = record
         
-        # Add topic assignments to each result
-        for i, result in enumerate(results):
-            result['topic'] = {
-                'id': topics['document_topics'][i],
-                'label': topics['topics'][topics['document_topics'][i]]['label']
-            }
+        if result_cache is not None:
+            stored = [i for i in pending if isinstance(texts[i], str)]
+            result_cache.put_many(
+                'record', [texts[i] for i in stored], [records[i] for i in stored]
+            )
+    
+    # The misinformation check and the embedding store share one set of vectors
+    text_idx = [i for i, text in enumerate(texts) if isinstance(text, str)]
+    vectors = None
+    if verified_facts or embedding_store is not None:
+        with metrics.stage('embed', items=len(text_idx)):
+            vectors = embed_texts([texts[i] for i in text_idx])
+    
+    if embedding_store is not None:
+        with metrics.stage('embedding_store', items=len(text_idx)):
+            embedding_store.append(
+                vectors, [texts[i] if ids is None else ids[i] for i in text_idx]
+            )
+    
+    # Detect misinformation if verified facts are provided, reusing the sentiment
+    # computed above for each text
+    misinformation = [[] for _ in texts]
+    if verified_facts:
+        fact_index = _as_fact_index(verified_facts)
+        with metrics.stage('misinformation', items=len(text_idx)):
+            flags = detect_misinformation_batch(
+                [texts[i] for i in text_idx],
+                fact_index,
+                [records[i]['sentiment'] for i in text_idx],
+                vectors
+            )
+        for i, text_flags in zip(text_idx, flags):
+            misinformation[i] = text_flags
+    
+    results = []
+    for text, record, text_flags in zip(texts, records, misinformation):
+        results.append({
+            'original_text': text,
+            **record,
+            'potential_misinformation': text_flags
+        })
+    
+    return results
+
+def analyze_text_stream(texts, verified_facts=None, chunk_size=STREAM_CHUNK_SIZE,
+                        embedding_store=None, ids=None):
+    """
+    Lazily analyze an iterable of texts, yielding one result per text
+    
+    Only chunk_size texts are held in memory at a time, so this works on inputs
+    of any size. Topics are a corpus-level result and are not assigned here;
+    use analyze_text_batch when the whole corpus fits in memory.
+    
+    Args:
+        texts: Any iterable of texts (list, generator, DataFrame column...)
+        verified_facts: Optional FactIndex or list of verified facts for misinformation checks
+        chunk_size: Number of texts analyzed together
+        embedding_store: Optional EmbeddingStore; the vector of every text
+            (other than missing ones) is appended to it chunk by chunk
+        ids: Iterable of an id per text for the embedding store (default: the text)
+    
+    Yields:
+        Result dicts in the same order as texts
+    """
+    # Embed and score the verified facts once, not once per chunk
+    if verified_facts:
+        verified_facts = _as_fact_index(verified_facts)
+    
+    iterator = iter(texts)
+    id_iterator = None if ids is None else iter(ids)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        chunk_ids = None if id_iterator is None else list(islice(id_iterator, len(chunk)))
+        with metrics.stage('analyze_chunk', items=len(chunk)):
+            results = _analyze_chunk(chunk, verified_facts, embedding_store, chunk_ids)
+        yield from results
+
+def assign_topics(results, topic_model=None):
+    """
+    Extract topics across all results and add a 'topic' to each one
+    
+    Args:
+        results: Results from analyze_text_stream
+        topic_model: Optional IncrementalTopicModel; it is updated with these
+            results and keeps topic ids stable across runs. Without it topics
+            are extracted from scratch for this corpus.
+    """
+    processed_texts = [r['processed_text'] for r in results]
+    
+    if topic_model is not None:
+        with metrics.stage('topics', items=len(results), mode='incremental'):
+            topics = topic_model.update(processed_texts)
+    elif len(results) > 5:  # Need sufficient corpus size for meaningful topic extraction
+        with metrics.stage('topics', items=len(results), mode='refit'):
+            topics = extract_topics(processed_texts)
+    else:
+        return results
+    
+    # Add topic assignments to each result
+    for i, result in enumerate(results):
+        result['topic'] = {
+            'id': topics['document_topics'][i],
+            'label': topics['topics'][topics['document_topics'][i]]['label']
+        }
     
     return results
 
+def analyze_text_batch(texts, verified_facts=None, topic_model=None, dedup=True,
+                       near_duplicate_threshold=NEAR_DUPLICATE_THRESHOLD,
+                       embedding_store=None, ids=None, topics=True):
+    """
+    Process a batch of texts for the sentiment dashboard
+    
+    Exact duplicates (after normalization) and, unless near_duplicate_threshold
+    is None, near-duplicates such as retweets are collapsed first: each group
+    is analyzed once and every member gets a copy of its representative's
+    result (nested values included, so rows can be edited independently),
+    with its own 'original_text' and a 'duplicate_of' index (None for the
+    text that was analyzed).
+    
+    Args:
+        texts: List of texts
+        verified_facts: Optional FactIndex or list of verified facts for misinformation checks
+        topic_model: Optional IncrementalTopicModel (see assign_topics)
+        dedup: Collapse duplicates before analysis
+        near_duplicate_threshold: Estimated Jaccard similarity at which texts
+            are near-duplicates (see dedup.find_duplicates)
+        embedding_store: Optional EmbeddingStore the analyzed texts' vectors
+            are appended to (one per group of duplicates, under the id of the
+            text that was analyzed)
+        ids: List of an id per text for the embedding store (default: the text)
+        topics: Assign topics across the batch; False leaves that to the
+            caller, e.g. a final step over several batches (see batch_job.py)
+    """
+    texts = list(texts)
+    duplicate_of = collapse_duplicates(texts, dedup, near_duplicate_threshold)
+    unique = [i for i, representative in enumerate(duplicate_of) if representative is None]
+    
+    # Analyze and extract topics across the distinct texts only
+    results = list(analyze_text_stream(
+        [texts[i] for i in unique], verified_facts,
+        embedding_store=embedding_store, ids=None if ids is None else [ids[i] for i in unique]
+    ))
+    if topics:
+        results = assign_topics(results, topic_model)
+    return expand_duplicates(texts, duplicate_of, results)
+
+def collapse_duplicates(texts, dedup=True, near_duplicate_threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Index of the text each text duplicates, None for the texts to analyze
+    
+    See analyze_text_batch for the arguments.
+    """
+    if dedup:
+        with metrics.stage('dedup', items=len(texts)):
+            duplicate_of = find_duplicates(
+                texts, near_duplicate_threshold or 1.0, near=near_duplicate_threshold is not None
+            )
+    else:
+        duplicate_of = [None] * len(texts)
+    metrics.count('duplicates_collapsed', sum(representative is not None for representative in duplicate_of))
+    return duplicate_of
+
+def expand_duplicates(texts, duplicate_of, results):
+    """
+    One result per text from the results of the texts that were analyzed
+    
+    Args:
+        texts: All texts
+        duplicate_of: As returned by collapse_duplicates
+        results: Results of the texts whose duplicate_of is None, in order
+    """
+    results = dict(zip([i for i, representative in enumerate(duplicate_of) if representative is None], results))
+    return [
+        {**results[i], 'duplicate_of': None} if representative is None
+        else {**copy.deepcopy(results[representative]), 'original_text': text, 'duplicate_of': representative}
+        for i, (text, representative) in enumerate(zip(texts, duplicate_of))
+    ]
+
 def detect_emerging_concerns(sentiment_data, time_window_days=7, threshold=2.0):
     """
     Detect emerging concerns based on sentiment trends
     
     Args:
-        sentiment_data: DataFrame with 'timestamp', 'topic', 'score'
+        sentiment_data: DataFrame with 'timestamp', 'topic', 'score', or a
+            RollupStore whose daily buckets are read instead of the records
+            (the whole day containing the cutoff is then counted)
         time_window_days: Number of days to consider for trend detection
         threshold: Standard deviation threshold for concern detection
     
     Returns:
         List of emerging concerns
     """
-    # Convert to DataFrame if list of dicts
-    if isinstance(sentiment_data, list):
-        df = pd.DataFrame(sentiment_data)
-    else:
-        df = sentiment_data
-    
-    # Ensure timestamp is datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Filter to recent data
     recent_cutoff = pd.Timestamp.now() - pd.Timedelta(days=time_window_days)
-    recent_data = df[df['timestamp'] >= recent_cutoff]
-    
-    # Group by topic and day
-    daily_topic_sentiment = recent_data.groupby([
-        'topic', pd.Grouper(key='timestamp', freq='D')
-    ])['score'].agg(['mean', 'count']).reset_index()
-    
-    emerging_concerns = []
     
-    # Analyze each topic with sufficient data
-    topics = daily_topic_sentiment['topic'].unique()
-    for topic in topics:
-        topic_data = daily_topic_sentiment[daily_topic_sentiment['topic'] == topic]
+    if isinstance(sentiment_data, RollupStore):
+        daily_topic_sentiment = sentiment_data.topic_daily_sentiment(recent_cutoff)
+    else:
+        # Convert to DataFrame if list of dicts
+        if isinstance(sentiment_data, list):
+            df = pd.DataFrame(sentiment_data)
+        else:
+            df = sentiment_data
         
-        # Skip topics with too few data points
-        if len(topic_data) < 3 or topic_data['count'].sum() < 10:
-            continue
+        # Ensure timestamp is datetime
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
         
-        # Check for negative trend
-        topic_data = topic_data.sort_values('timestamp')
-        sentiment_values = topic_data['mean'].values
+        # Filter to recent data
+        recent_data = df[df['timestamp'] >= recent_cutoff]
         
-        # Simple trend detection
-        if len(sentiment_values) >= 3:
-            # Moving average
-            ma = np.convolve(sentiment_values, np.ones(3)/3, mode='valid')
-            
-            # Check for declining sentiment
-            if len(ma) >= 2 and ma[-1] < ma[0] - threshold * np.std(sentiment_values):
-                # This topic has significantly declining sentiment
-                emerging_concerns.append({
-                    'topic': topic,
-                    'sentiment_start': float(ma[0]),
-                    'sentiment_end': float(ma[-1]),
-                    'change': float(ma[-1] - ma[0]),
-                    'message_volume': int(topic_data['count'].sum()),
-                    'confidence': min(1.0, abs(ma[-1] - ma[0]) / (np.std(sentiment_values) + 1e-5))
-                })
+        # Group by topic and day
+        daily_topic_sentiment = recent_data.groupby([
+            'topic', pd.Grouper(key='timestamp', freq='D')
+        ])['score'].agg(['mean', 'count']).reset_index()
+    
+    if daily_topic_sentiment.empty:
+        return []
+    
+    # Rows are sorted by topic, then day, so each topic is one contiguous segment
+    topic_values = daily_topic_sentiment['topic'].to_numpy()
+    means = daily_topic_sentiment['mean'].to_numpy()
+    counts = daily_topic_sentiment['count'].to_numpy()
+    codes, _ = pd.factorize(topic_values)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    lengths = np.diff(np.r_[starts, len(codes)])
+    volumes = np.add.reduceat(counts, starts)
+    
+    # Topics need enough days and messages, and at least two 3-day moving averages
+    candidates = np.flatnonzero((lengths >= 4) & (volumes >= 10))
+    if len(candidates) == 0:
+        return []
+    starts, lengths, volumes = starts[candidates], lengths[candidates], volumes[candidates]
+    
+    # Per-topic std, one row-wise call per distinct number of days. Each row is
+    # reduced exactly like np.std on that topic alone, so results are identical
+    std = np.empty(len(candidates))
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        std[rows] = np.std(means[starts[rows, None] + np.arange(length)], axis=1)
+    
+    # First and last 3-day moving averages, summed in np.convolve's order
+    weight = 1 / 3
+    ends = starts + lengths
+    ma_start = means[starts] * weight + means[starts + 1] * weight + means[starts + 2] * weight
+    ma_end = means[ends - 3] * weight + means[ends - 2] * weight + means[ends - 1] * weight
+    
+    # Topics with significantly declining sentiment
+    declining = np.flatnonzero(ma_end < ma_start - threshold * std)
+    emerging_concerns = [
+        {
+            'topic': topic_values[starts[i]],
+            'sentiment_start': float(ma_start[i]),
+            'sentiment_end': float(ma_end[i]),
+            'change': float(ma_end[i] - ma_start[i]),
+            'message_volume': int(volumes[i]),
+            'confidence': min(1.0, abs(ma_end[i] - ma_start[i]) / (std[i] + 1e-5))
+        }
+        for i in declining
+    ]
     
     # Sort by confidence
     emerging_concerns.sort(key=lambda x: x['confidence'], reverse=True)
@@ -452,30 +1205,36 @@ def detect_sentiment_spikes(sentiment_data, time_window_days=7, threshold=3.0):
     Detect sudden spikes in negative sentiment
     
     Args:
-        sentiment_data: DataFrame with 'timestamp', 'source', 'score'
+        sentiment_data: DataFrame with 'timestamp', 'source', 'score', or a
+            RollupStore whose hourly buckets are read instead of the records
+            (the whole hour containing the cutoff is then counted)
         time_window_days: Number of days to consider for spike detection
         threshold: Standard deviation threshold for spike detection
     
     Returns:
         List of sentiment spikes
     """
-    # Convert to DataFrame if list of dicts
-    if isinstance(sentiment_data, list):
-        df = pd.DataFrame(sentiment_data)
-    else:
-        df = sentiment_data
-    
-    # Ensure timestamp is datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Filter to recent data
     recent_cutoff = pd.Timestamp.now() - pd.Timedelta(days=time_window_days)
-    recent_data = df[df['timestamp'] >= recent_cutoff]
     
-    # Group by day
-    daily_sentiment = recent_data.groupby(
-        pd.Grouper(key='timestamp', freq='H')
-    )['score'].agg(['mean', 'count', 'std']).reset_index()
+    if isinstance(sentiment_data, RollupStore):
+        daily_sentiment = sentiment_data.hourly_sentiment(recent_cutoff)
+    else:
+        # Convert to DataFrame if list of dicts
+        if isinstance(sentiment_data, list):
+            df = pd.DataFrame(sentiment_data)
+        else:
+            df = sentiment_data
+        
+        # Ensure timestamp is datetime
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        
+        # Filter to recent data
+        recent_data = df[df['timestamp'] >= recent_cutoff]
+        
+        # Group by hour
+        daily_sentiment = recent_data.groupby(
+            pd.Grouper(key='timestamp', freq=pd.offsets.Hour())
+        )['score'].agg(['mean', 'count', 'std']).reset_index()
     
     # Calculate baseline mean and std from first 80% of time window
     baseline_end_idx = int(len(daily_sentiment) * 0.8)
@@ -517,70 +1276,7 @@ def generate_demographic_insights(sentiment_data):
     Returns:
         Dictionary of demographic insights
     """
-    # Convert to DataFrame if list of dicts
-    if isinstance(sentiment_data, list):
-        df = pd.DataFrame(sentiment_data)
-    else:
-        df = sentiment_data
-    
-    insights = {}
-    
-    # Get demographic categories
-    if 'metadata' in df.columns and isinstance(df['metadata'].iloc[0], dict):
-        # Extract demographic from metadata
-        if 'demographic' not in df.columns:
-            df['demographic'] = df['metadata'].apply(
-                lambda x: x.get('demographic', 'Unspecified') if isinstance(x, dict) else 'Unspecified'
-            )
-    
-    # Analyze sentiment by demographic
-    if 'demographic' in df.columns:
-        demo_sentiment = df.groupby('demographic')['score'].agg(
-            ['mean', 'count', 'std']
-        ).reset_index()
-        
-        # Sort by count (sample size)
-        demo_sentiment = demo_sentiment.sort_values('count', ascending=False)
-        
-        # Calculate overall mean for comparison
-        overall_mean = df['score'].mean()
-        
-        # Generate insights
-        demographic_insights = []
-        for _, row in demo_sentiment.iterrows():
-            if row['count'] < 10:  # Skip groups with small sample size
-                continue
-                
-            # Compare to overall mean
-            diff = row['mean'] - overall_mean
-            sentiment_text = 'more positive' if diff > 0 else 'more negative'
-            
-            insight = {
-                'demographic': row['demographic'],
-                'sentiment_mean': float(row['mean']),
-                'sample_size': int(row['count']),
-                'difference_from_overall': float(diff),
-                'insight_text': f"{row['demographic']} are {abs(diff):.2f} points {sentiment_text} than average"
-            }
-            demographic_insights.append(insight)
-        
-        insights['demographic_sentiment'] = demographic_insights
-    
-    # Analyze most discussed topics by demographic
-    if 'demographic' in df.columns and 'topic' in df.columns:
-        # Group by demographic and topic
-        demo_topics = df.groupby(['demographic', 'topic']).size().reset_index(name='count')
-        
-        # Get top topics for each demographic
-        top_topics_by_demo = {}
-        for demo in demo_topics['demographic'].unique():
-            demo_data = demo_topics[demo_topics['demographic'] == demo]
-            top_topics = demo_data.sort_values('count', ascending=False).head(3)
-            top_topics_by_demo[demo] = top_topics.to_dict('records')
-        
-        insights['top_topics_by_demographic'] = top_topics_by_demo
-    
-    return insights
+    return generate_insights(sentiment_data, dimensions=('demographic',))
 
 def generate_geographic_insights(sentiment_data):
     """
@@ -590,83 +1286,9 @@ def generate_geographic_insights(sentiment_data):
         sentiment_data: DataFrame with location and sentiment info
         
     Returns:
-        Dictionary of geographic insights
+        Dictionary of provincial and district insights
     """
-    # Convert to DataFrame if list of dicts
-    if isinstance(sentiment_data, list):
-        df = pd.DataFrame(sentiment_data)
-    else:
-        df = sentiment_data
-    
-    insights = {}
-    
-    # Get location information
-    if 'metadata' in df.columns and isinstance(df['metadata'].iloc[0], dict):
-        # Extract location from metadata
-        if 'province' not in df.columns:
-            df['province'] = df['metadata'].apply(
-                lambda x: x.get('location', {}).get('province', 'Unknown') 
-                if isinstance(x, dict) and isinstance(x.get('location'), dict) 
-                else 'Unknown'
-            )
-        if 'district' not in df.columns:
-            df['district'] = df['metadata'].apply(
-                lambda x: x.get('location', {}).get('district', 'Unknown') 
-                if isinstance(x, dict) and isinstance(x.get('location'), dict) 
-                else 'Unknown'
-            )
-    
-    # Analyze sentiment by province
-    if 'province' in df.columns:
-        province_sentiment = df.groupby('province')['score'].agg(
-            ['mean', 'count', 'std']
-        ).reset_index()
-        
-        # Sort by count (sample size)
-        province_sentiment = province_sentiment.sort_values('count', ascending=False)
-        
-        # Calculate overall mean for comparison
-        overall_mean = df['score'].mean()
-        
-        # Generate insights
-        geo_insights = []
-        for _, row in province_sentiment.iterrows():
-            if row['count'] < 10 or row['province'] == 'Unknown':  # Skip groups with small sample size
-                continue
-                
-            # Compare to overall mean
-            diff = row['mean'] - overall_mean
-            sentiment_text = 'more positive' if diff > 0 else 'more negative'
-            
-            insight = {
-                'province': row['province'],
-                'sentiment_mean': float(row['mean']),
-                'sample_size': int(row['count']),
-                'difference_from_overall': float(diff),
-                'insight_text': f"{row['province']} is {abs(diff):.2f} points {sentiment_text} than average"
-            }
-            geo_insights.append(insight)
-        
-        insights['provincial_sentiment'] = geo_insights
-    
-    # Analyze most discussed topics by province
-    if 'province' in df.columns and 'topic' in df.columns:
-        # Group by province and topic
-        geo_topics = df.groupby(['province', 'topic']).size().reset_index(name='count')
-        
-        # Get top topics for each province
-        top_topics_by_province = {}
-        for province in geo_topics['province'].unique():
-            if province == 'Unknown':
-                continue
-                
-            province_data = geo_topics[geo_topics['province'] == province]
-            top_topics = province_data.sort_values('count', ascending=False).head(3)
-            top_topics_by_province[province] = top_topics.to_dict('records')
-        
-        insights['top_topics_by_province'] = top_topics_by_province
-    
-    return insights
+    return generate_insights(sentiment_data, dimensions=('province', 'district'))
 
 def generate_policy_recommendations(sentiment_analysis_results):
     """Generate policy recommendations based on sentiment analysis"""
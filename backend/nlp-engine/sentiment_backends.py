@@ -0,0 +1,144 @@
+import os
+
+import numpy as np
+
+# Backends selectable with sentiment_analyzer.use_sentiment_backend()
+BACKENDS = ('torch', 'int8', 'onnx')
+
+# Where the exported ONNX model is written and read by default
+DEFAULT_ONNX_PATH = 'sentiment-model.onnx'
+
+
+def softmax(logits):
+    """Row-wise softmax of a (n, n_classes) array"""
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class TorchBackend:
+    """Runs a PyTorch sequence classification model (fp32 or quantized)"""
+
+    def __init__(self, model, name='torch'):
+        self.model = model
+        self.name = name
+
+    def predict_proba(self, features):
+        """
+        Class probabilities for a padded batch
+
+        Args:
+            features: Dict of (batch, sequence) int arrays from tokenizer.pad,
+                e.g. input_ids and attention_mask
+
+        Returns:
+            (batch, n_classes) float array
+        """
+        import torch
+        inputs = {key: torch.as_tensor(value) for key, value in features.items()}
+        with torch.no_grad():
+            logits = self.model(**inputs).logits
+        return torch.softmax(logits, dim=1).numpy()
+
+
+def quantize_dynamic(model):
+    """
+    Dynamic int8 quantization of a model's Linear layers
+
+    Weights are stored as int8 and activations are quantized on the fly, which
+    roughly halves CPU inference time for BERT-sized models. The fp32 model is
+    left untouched.
+    """
+    import torch
+    quantized = torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return TorchBackend(quantized, name='int8')
+
+
+class OnnxBackend:
+    """Runs a sequence classification model exported to ONNX with ONNX Runtime"""
+
+    name = 'onnx'
+
+    def __init__(self, session):
+        self.session = session
+        self.input_names = [node.name for node in session.get_inputs()]
+
+    def predict_proba(self, features):
+        """Same as TorchBackend.predict_proba"""
+        inputs = {
+            name: np.asarray(features[name], dtype=np.int64)
+            for name in self.input_names
+        }
+        logits = self.session.run(None, inputs)[0]
+        return softmax(logits)
+
+    @staticmethod
+    def export(model, tokenizer, path=DEFAULT_ONNX_PATH):
+        """
+        Export a PyTorch model to ONNX with dynamic batch and sequence axes
+
+        The model's label order is kept, so the exported model's outputs map to
+        sentiments exactly like the original's.
+        """
+        import torch
+        from torch.export import Dim
+
+        # Two texts of different lengths, so neither axis gets specialized
+        example = tokenizer(
+            ["a short example", "a somewhat longer example sentence to pad"],
+            padding=True, return_tensors='pt'
+        )
+        batch, sequence = Dim('batch'), Dim('sequence')
+        torch.onnx.export(
+            model,
+            args=(),
+            kwargs=dict(example),
+            f=path,
+            input_names=list(example.keys()),
+            output_names=['logits'],
+            dynamic_shapes={name: {0: batch, 1: sequence} for name in example.keys()},
+            dynamo=True
+        )
+
+    @classmethod
+    def load(cls, path=DEFAULT_ONNX_PATH, n_threads=None):
+        """
+        Open an exported model
+
+        Args:
+            path: .onnx file written by export()
+            n_threads: Intra-op threads (defaults to ONNX Runtime's choice)
+        """
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if n_threads:
+            options.intra_op_num_threads = n_threads
+        session = onnxruntime.InferenceSession(
+            path, options, providers=['CPUExecutionProvider']
+        )
+        return cls(session)
+
+
+def load_backend(name, tokenizer, model, onnx_path=DEFAULT_ONNX_PATH):
+    """
+    Build an inference backend for an already-loaded model
+
+    Args:
+        name: 'torch' (fp32), 'int8' (dynamic quantization) or 'onnx'
+        tokenizer: The model's tokenizer (used to export the ONNX model)
+        model: The fp32 PyTorch model, or None for 'onnx' when onnx_path exists
+        onnx_path: Exported model; it is exported from model if missing
+    """
+    if name == 'torch':
+        return TorchBackend(model)
+    if name == 'int8':
+        return quantize_dynamic(model)
+    if name == 'onnx':
+        if not os.path.exists(onnx_path):
+            OnnxBackend.export(model, tokenizer, onnx_path)
+        return OnnxBackend.load(onnx_path)
+    raise ValueError(f"Unknown sentiment backend '{name}', expected one of {BACKENDS}")
@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(ENGINE_DIR, 'Newdataset.csv')
+
+# Where the trained first-stage model is written and read by default
+DEFAULT_CASCADE_PATH = 'sentiment-cascade.pkl'
+
+# Texts the linear model is less sure about than this go to the transformer
+DEFAULT_THRESHOLD = 0.8
+
+# Thresholds compared by the report
+REPORT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9, 0.95]
+
+LABELS = ('negative', 'neutral', 'positive')
+
+
+class LinearSentimentModel:
+    """
+    TF-IDF + logistic regression sentiment classifier, the cascade's first tier
+
+    Character n-grams (within word boundaries) cope with the three
+    languages, misspellings and hashtags without a tokenizer, and a linear
+    model scores thousands of texts in milliseconds. Its output has the same
+    format as the transformer's, plus 'tier': 'linear'.
+
+    Usage:
+        model = LinearSentimentModel().fit(processed_texts, labels)
+        sentiments = model.predict(processed_texts)
+        model.save('sentiment-cascade.pkl')
+    """
+
+    def __init__(self, ngram_range=(2, 5), C=4.0, max_features=200000):
+        """
+        Args:
+            ngram_range: Character n-gram lengths
+            C: Inverse regularization strength of the logistic regression
+            max_features: Largest vocabulary kept
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+
+        self.pipeline = make_pipeline(
+            TfidfVectorizer(
+                analyzer='char_wb', ngram_range=ngram_range, sublinear_tf=True,
+                max_features=max_features
+            ),
+            LogisticRegression(C=C, max_iter=1000, class_weight='balanced')
+        )
+        self.n_trained = 0
+
+    def fit(self, texts, labels):
+        """Train on texts and their labels (any case of Positive / Neutral / Negative)"""
+        labels = [str(label).strip().lower() for label in labels]
+        unknown = set(labels) - set(LABELS)
+        if unknown:
+            raise ValueError(f"Unknown sentiment labels {sorted(unknown)}, expected {LABELS}")
+        self.pipeline.fit(texts, labels)
+        self.n_trained = len(texts)
+        return self
+
+    def predict_proba(self, texts):
+        """(len(texts), 3) probabilities, columns in LABELS order"""
+        probabilities = self.pipeline.predict_proba(texts)
+        classes = list(self.pipeline.classes_)
+        ordered = np.zeros((len(texts), len(LABELS)))
+        for j, label in enumerate(LABELS):
+            if label in classes:
+                ordered[:, j] = probabilities[:, classes.index(label)]
+        return ordered
+
+    def predict(self, texts):
+        """Sentiment dicts ('sentiment', 'score', 'confidence', 'tier') for texts"""
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        results = []
+        for label_id, row in zip(best, probabilities):
+            sentiment = LABELS[label_id]
+            confidence = float(row[label_id])
+            score = {'negative': -confidence, 'neutral': 0.0, 'positive': confidence}[sentiment]
+            results.append({
+                'sentiment': sentiment,
+                'score': score,
+                'confidence': confidence,
+                'tier': 'linear'
+            })
+        return results
+
+    def save(self, path):
+        # The fitted pipeline only, so files written by the CLI (where this
+        # class lives in __main__) load anywhere. Written to a temporary file
+        # first, so a process loading path never reads a partial pickle
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'pipeline': self.pipeline, 'n_trained': self.n_trained}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        model = cls.__new__(cls)
+        model.pipeline = state['pipeline']
+        model.n_trained = state['n_trained']
+        return model
+
+
+def load_labelled(path=DATASET_PATH, text_column='Comment', label_column='Sentiment'):
+    """Preprocessed texts and lowercase labels of a labelled CSV"""
+    import sentiment_analyzer as sa
+
+    df = pd.read_csv(path).dropna(subset=[text_column, label_column])
+    _, _, processed = sa.preprocess_batch(df[text_column].tolist())
+    labels = df[label_column].str.strip().str.lower().to_numpy()
+    return df[text_column].tolist(), processed, labels
+
+
+def train(path=DATASET_PATH, text_column='Comment', label_column='Sentiment', **model_args):
+    """
+    Train the first tier on a labelled CSV
+
+    Texts are preprocessed exactly like the pipeline does before scoring, so
+    the model sees what analyze_sentiment_batch is given.
+    """
+    _, processed, labels = load_labelled(path, text_column, label_column)
+    return LinearSentimentModel(**model_args).fit(processed, labels)
+
+
+def load_or_train(path=DEFAULT_CASCADE_PATH):
+    """Load the saved first tier, training it on the bundled dataset if path does not exist"""
+    if os.path.exists(path):
+        return LinearSentimentModel.load(path)
+    model = train()
+    model.save(path)
+    return model
+
+
+def cascade_report(path=DATASET_PATH, text_column='Comment', label_column='Sentiment',
+                   thresholds=REPORT_THRESHOLDS, n_splits=5):
+    """
+    Escalation rate and accuracy of the cascade at several thresholds
+
+    The linear tier is scored out of fold (GroupKFold, with duplicates of a
+    text always in the same fold), so its confidence is the one it would
+    have on unseen comments. The transformer scores every text once; at each
+    threshold, texts below it take the transformer's label.
+
+    Returns:
+        Dict with 'linear' and 'transformer' accuracies and one row per threshold
+    """
+    import sentiment_analyzer as sa
+    from dedup import dedup_key
+    from sklearn.model_selection import GroupKFold
+
+    texts, processed, labels = load_labelled(path, text_column, label_column)
+    groups = pd.factorize(np.array([dedup_key(text) for text in texts], dtype=object))[0]
+    n_splits = min(n_splits, len(set(groups)))
+
+    probabilities = np.zeros((len(texts), len(LABELS)))
+    for train_idx, test_idx in GroupKFold(n_splits=n_splits).split(processed, labels, groups):
+        model = LinearSentimentModel().fit([processed[i] for i in train_idx], labels[train_idx])
+        probabilities[test_idx] = model.predict_proba([processed[i] for i in test_idx])
+    linear_labels = np.array(LABELS)[probabilities.argmax(axis=1)]
+    confidence = probabilities.max(axis=1)
+
+    # The transformer alone, without the cascade or cached results
+    threshold, cache = sa.SENTIMENT_CASCADE_THRESHOLD, sa.result_cache
+    sa.SENTIMENT_CASCADE_THRESHOLD, sa.result_cache = None, None
+    try:
+        transformer_labels = np.array([s['sentiment'] for s in sa.analyze_sentiment_batch(processed)])
+    finally:
+        sa.SENTIMENT_CASCADE_THRESHOLD, sa.result_cache = threshold, cache
+
+    report = {
+        'items': len(texts),
+        'linear_accuracy': float((linear_labels == labels).mean()),
+        'transformer_accuracy': float((transformer_labels == labels).mean()),
+        'thresholds': []
+    }
+    for threshold in thresholds:
+        decided = confidence >= threshold
+        cascade_labels = np.where(decided, linear_labels, transformer_labels)
+        report['thresholds'].append({
+            'threshold': threshold,
+            'escalation_rate': float(1 - decided.mean()),
+            'accuracy': float((cascade_labels == labels).mean()),
+            'linear_tier_accuracy': float((linear_labels[decided] == labels[decided]).mean())
+            if decided.any() else None,
+            'agreement_with_transformer': float((cascade_labels == transformer_labels).mean())
+        })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Train or evaluate the sentiment cascade')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = subparsers.add_parser('train', help='Retrain the linear first tier')
+    train_parser.add_argument('--output', default=DEFAULT_CASCADE_PATH)
+
+    report_parser = subparsers.add_parser(
+        'report', help='Escalation rate and accuracy against the labels per threshold'
+    )
+    report_parser.add_argument('--thresholds', type=float, nargs='+', default=REPORT_THRESHOLDS)
+    report_parser.add_argument('--folds', type=int, default=5)
+    report_parser.add_argument('--output', help='Also write the report to this JSON file')
+
+    for subparser in (train_parser, report_parser):
+        subparser.add_argument('--data', default=DATASET_PATH, help='Labelled CSV')
+        subparser.add_argument('--text-column', default='Comment')
+        subparser.add_argument('--label-column', default='Sentiment',
+                               help='Human label column (Positive / Neutral / Negative)')
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        model = train(args.data, args.text_column, args.label_column)
+        model.save(args.output)
+        print(f"Trained on {model.n_trained} labelled texts from {args.data}, saved to {args.output}")
+    else:
+        report = cascade_report(
+            args.data, args.text_column, args.label_column, args.thresholds, args.folds
+        )
+        print(f"{report['items']} labelled texts from {args.data}")
+        print(f"  linear only: {report['linear_accuracy']:.3f} accuracy, "
+              f"transformer only: {report['transformer_accuracy']:.3f} accuracy")
+        print(f"  {'threshold':>9} {'escalated':>10} {'accuracy':>9} {'linear acc':>11} {'agreement':>10}")
+        for row in report['thresholds']:
+            linear_accuracy = row['linear_tier_accuracy']
+            print(f"  {row['threshold']:>9.2f} {row['escalation_rate']:>10.1%} {row['accuracy']:>9.3f} "
+                  f"{'-' if linear_accuracy is None else f'{linear_accuracy:.3f}':>11} "
+                  f"{row['agreement_with_transformer']:>10.3f}")
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
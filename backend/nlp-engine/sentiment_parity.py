@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import sentiment_analyzer as sa
+from sentiment_backends import BACKENDS, DEFAULT_ONNX_PATH
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(ENGINE_DIR, 'Newdataset.csv')
+
+# Timed passes over the dataset per backend (the fastest one is reported)
+DEFAULT_REPEATS = 3
+
+
+def score_backend(name, texts, onnx_path=DEFAULT_ONNX_PATH, repeats=DEFAULT_REPEATS):
+    """
+    Run one backend over texts the way the pipeline does
+
+    Returns:
+        (sentiment dicts, best seconds per pass)
+    """
+    sa.use_sentiment_backend(name, onnx_path)
+    # Load (and for ONNX, export) outside the timed passes
+    sa.get_sentiment_backend()
+
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        sentiments = sa.analyze_sentiment_batch(texts)
+        best = min(best, time.perf_counter() - start)
+    return sentiments, best
+
+
+def parity_report(df, backends=BACKENDS, text_column='Comment', label_column='Sentiment',
+                  onnx_path=DEFAULT_ONNX_PATH, repeats=DEFAULT_REPEATS):
+    """
+    Compare sentiment backends against the fp32 model and the human labels
+
+    Every backend scores the preprocessed texts; 'accuracy' is against the
+    human label column, 'agreement' and 'mean_abs_score_diff' are against the
+    fp32 'torch' backend, which is always run as the reference.
+
+    Returns:
+        Dict of backend name -> metrics
+    """
+    texts = df[text_column].tolist()
+    labels = df[label_column].str.strip().str.lower().to_numpy()
+    _, _, processed = sa.preprocess_batch(texts)
+
+    # The cache would hand every backend the first backend's results
+    sa.disable_result_cache()
+
+    reference, _ = score_backend('torch', processed, onnx_path, repeats=1)
+    reference_labels = np.array([s['sentiment'] for s in reference])
+    reference_scores = np.array([s['score'] for s in reference])
+
+    report = {}
+    for name in ['torch'] + [b for b in backends if b != 'torch']:
+        sentiments, seconds = score_backend(name, processed, onnx_path, repeats)
+        predicted = np.array([s['sentiment'] for s in sentiments])
+        scores = np.array([s['score'] for s in sentiments])
+        report[name] = {
+            'items': len(processed),
+            'seconds': seconds,
+            'throughput_per_s': len(processed) / seconds if seconds > 0 else float('inf'),
+            'accuracy': float((predicted == labels).mean()),
+            'agreement': float((predicted == reference_labels).mean()),
+            'mean_abs_score_diff': float(np.abs(scores - reference_scores).mean())
+        }
+
+    sa.use_sentiment_backend('torch')
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Accuracy/speed parity of the sentiment backends on a labelled CSV'
+    )
+    parser.add_argument('--data', default=DATASET_PATH, help='Labelled CSV')
+    parser.add_argument('--text-column', default='Comment')
+    parser.add_argument('--label-column', default='Sentiment',
+                        help='Human label column (Positive / Neutral / Negative)')
+    parser.add_argument('--backends', default=','.join(BACKENDS),
+                        help='Comma-separated backends to compare with fp32')
+    parser.add_argument('--onnx-model', default=DEFAULT_ONNX_PATH,
+                        help='Exported ONNX model (created if missing)')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    parser.add_argument('--output', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.data).dropna(subset=[args.text_column, args.label_column])
+    report = parity_report(
+        df, args.backends.split(','), args.text_column, args.label_column,
+        args.onnx_model, args.repeats
+    )
+
+    print(f"{len(df)} labelled texts from {args.data}")
+    print(f"  {'backend':<8} {'items/s':>10} {'speedup':>8} {'accuracy':>9} "
+          f"{'agreement':>10} {'score diff':>11}")
+    for name, row in report.items():
+        speedup = row['throughput_per_s'] / report['torch']['throughput_per_s']
+        print(f"  {name:<8} {row['throughput_per_s']:>10.1f} {speedup:>7.2f}x "
+              f"{row['accuracy']:>9.3f} {row['agreement']:>10.3f} "
+              f"{row['mean_abs_score_diff']:>11.4f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,249 @@
+import argparse
+import json
+
+import pandas as pd
+
+import metrics
+import sentiment_analyzer
+from sentiment_analyzer import (
+    analyze_text_stream, assign_topics, build_fact_index, embed_texts, STREAM_CHUNK_SIZE
+)
+from embedding_store import EmbeddingStore
+from fact_index import FactIndex
+from result_store import ResultWriter
+from rollup_store import RollupStore, record_keys, results_records
+from sentiment_backends import BACKENDS, DEFAULT_ONNX_PATH
+from sentiment_cascade import DEFAULT_CASCADE_PATH
+from topic_model import IncrementalTopicModel
+from worker_pool import AnalysisPool
+
+# Rows read from the input CSV at a time
+CSV_CHUNK_SIZE = 5000
+
+# Analysis columns added to each CSV row (see result_columns), and the topic
+# columns added when topics are assigned
+ANALYSIS_COLUMNS = [
+    'Language', 'Language_Confidence', 'Predicted_Sentiment', 'Sentiment_Score',
+    'Sentiment_Confidence', 'Entities'
+]
+TOPIC_COLUMNS = ['Topic_Id', 'Topic']
+
+
+def result_columns(result):
+    """Flatten one analyze_text_stream result into output CSV columns"""
+    columns = {
+        'Language': result['language'],
+        'Language_Confidence': result['language_confidence'],
+        'Predicted_Sentiment': result['sentiment']['sentiment'],
+        'Sentiment_Score': result['sentiment']['score'],
+        'Sentiment_Confidence': result['sentiment'].get('confidence'),
+        'Entities': result['entities']
+    }
+    if 'topic' in result:
+        columns['Topic_Id'] = result['topic']['id']
+        columns['Topic'] = result['topic']['label']
+    return columns
+
+
+def analyze_csv(input_path, output_path, text_column='Comment',
+                csv_chunk_size=CSV_CHUNK_SIZE, chunk_size=STREAM_CHUNK_SIZE,
+                verified_facts=None, pool=None, topic_model=None,
+                embedding_store=None, id_column=None, rollups=None,
+                date_column='Date', district_column='District', source_column='Source'):
+    """
+    Analyze a CSV file chunk by chunk and append results to the output file
+
+    Every input row produces exactly one output row with the original columns
+    plus the analysis columns, so no merge on the comment text is needed and
+    memory use is bounded by csv_chunk_size regardless of the file size.
+    Output paths ending in .parquet are written with a ResultWriter (typed
+    columns, entities as lists of structs); anything else is written as CSV.
+
+    Args:
+        input_path: CSV file with one comment per row
+        output_path: CSV or .parquet file to write (overwritten)
+        text_column: Name of the column holding the comment text
+        csv_chunk_size: Number of rows read from the input at a time
+        chunk_size: Number of texts analyzed together
+        verified_facts: Optional FactIndex or list of verified facts for misinformation checks
+        pool: Optional AnalysisPool to analyze each chunk on several processes
+        topic_model: Optional IncrementalTopicModel, updated with each chunk to
+            add stable Topic_Id/Topic columns
+        embedding_store: Optional EmbeddingStore the comments' vectors are appended to
+        id_column: Column whose values identify the comments in the embedding
+            store and the rollups (default: the row number in the input file)
+        rollups: Optional RollupStore the scored rows are added to, dated by
+            date_column and broken down by district_column and source_column
+            (when the input has them); rows are keyed by id_column (or row
+            number), so processing the same file again does not count them twice
+
+    An input with a header but no rows still gets an output file with every
+    column (or the full Parquet schema) and no rows.
+
+    Returns:
+        Number of rows written
+    """
+    rows_written = 0
+    written = False
+    columns = ANALYSIS_COLUMNS + (TOPIC_COLUMNS if topic_model is not None else [])
+
+    # Embed and score the verified facts once for the whole file
+    if verified_facts and not isinstance(verified_facts, FactIndex):
+        verified_facts = build_fact_index(verified_facts)
+
+    writer = ResultWriter(output_path) if output_path.endswith('.parquet') else None
+
+    try:
+        for chunk in pd.read_csv(input_path, chunksize=csv_chunk_size):
+            ids = None
+            if embedding_store is not None:
+                ids = (chunk[id_column] if id_column else chunk.index).tolist()
+
+            if pool is not None:
+                results = pool.stream(chunk[text_column], verified_facts)
+                if embedding_store is not None:
+                    # Workers do not return vectors; embed in this process
+                    texts = chunk[text_column].tolist()
+                    valid = [i for i, text in enumerate(texts) if isinstance(text, str)]
+                    embedding_store.append(
+                        embed_texts([texts[i] for i in valid]), [ids[i] for i in valid]
+                    )
+            else:
+                results = analyze_text_stream(
+                    chunk[text_column], verified_facts, chunk_size, embedding_store, ids
+                )
+
+            results = list(results)
+            if topic_model is not None:
+                results = assign_topics(results, topic_model)
+
+            output = None
+            if writer is None or rollups is not None:
+                analysis = pd.DataFrame(
+                    [result_columns(result) for result in results], index=chunk.index, columns=columns
+                )
+                output = pd.concat([chunk, analysis], axis=1)
+            if rollups is not None:
+                rollups.add(
+                    results_records(output, date_column, district_column, source_column),
+                    record_keys(input_path, chunk.index, chunk[id_column] if id_column else None)
+                )
+
+            written = True
+            if writer is not None:
+                writer.write(chunk, results)
+                rows_written += len(chunk)
+                continue
+
+            # Write the header with the first chunk, then append
+            output.to_csv(
+                output_path,
+                mode='w' if rows_written == 0 else 'a',
+                header=rows_written == 0,
+                index=False
+            )
+            rows_written += len(output)
+
+        if not written:
+            # No chunk at all: write the header (or schema) alone
+            chunk = pd.read_csv(input_path, nrows=0)
+            if writer is not None:
+                writer.write(chunk, [])
+            else:
+                pd.concat([chunk, pd.DataFrame(columns=columns)], axis=1).to_csv(output_path, index=False)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return rows_written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Stream a comments CSV through the sentiment pipeline')
+    parser.add_argument('input', help='Input CSV file')
+    parser.add_argument('output', help='Output CSV file, or a .parquet file for the columnar result store')
+    parser.add_argument('--text-column', default='Comment')
+    parser.add_argument('--csv-chunk-size', type=int, default=CSV_CHUNK_SIZE)
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument('--facts', help='Verified facts: a saved FactIndex (.npz) or a JSON list')
+    parser.add_argument('--topic-model', help='Incremental topic model file, created if missing and saved after the run')
+    parser.add_argument('--cache', help='SQLite result cache to reuse across runs')
+    parser.add_argument('--metrics', help='Write per-stage metrics to this Prometheus text file')
+    parser.add_argument('--workers', type=int, default=1, help='Worker processes (1 = in-process)')
+    parser.add_argument('--torch-threads', type=int, help='Torch intra-op threads per worker')
+    parser.add_argument('--shared-weights', action='store_true',
+                        help='Load the models once and share their weights with the workers')
+    parser.add_argument('--sentiment-backend', choices=BACKENDS, default='torch',
+                        help='Run the sentiment model in fp32 PyTorch, int8 or ONNX Runtime')
+    parser.add_argument('--onnx-model', default=DEFAULT_ONNX_PATH,
+                        help='Exported ONNX model for --sentiment-backend onnx (created if missing)')
+    parser.add_argument('--sentiment-cascade', type=float, metavar='THRESHOLD',
+                        help='Score with the linear model first and escalate texts it is '
+                             'less confident about than THRESHOLD to the transformer')
+    parser.add_argument('--cascade-model', default=DEFAULT_CASCADE_PATH,
+                        help='Linear model for --sentiment-cascade (trained if missing)')
+    parser.add_argument('--embedding-store',
+                        help='Append comment vectors to this embedding store directory')
+    parser.add_argument('--id-column',
+                        help='Column identifying comments in the embedding store and rollups (default: row number)')
+    parser.add_argument('--rollups', help='Add the scored rows to this hourly/daily rollup SQLite file')
+    parser.add_argument('--date-column', default='Date', help='Column dating the rows for --rollups')
+    parser.add_argument('--district-column', default='District')
+    parser.add_argument('--source-column', default='Source')
+    args = parser.parse_args()
+
+    sentiment_analyzer.use_sentiment_backend(args.sentiment_backend, args.onnx_model)
+    sentiment_analyzer.use_sentiment_cascade(args.sentiment_cascade, args.cascade_model)
+    if args.cache:
+        sentiment_analyzer.enable_result_cache(args.cache)
+    if args.metrics:
+        metrics.enable(metrics.PrometheusFileSink(args.metrics))
+
+    verified_facts = None
+    if args.facts:
+        if args.facts.endswith('.npz'):
+            verified_facts = FactIndex.load(args.facts)
+        else:
+            with open(args.facts) as f:
+                verified_facts = json.load(f)
+
+    topic_model = None
+    if args.topic_model:
+        topic_model = IncrementalTopicModel.load_or_create(args.topic_model)
+
+    embedding_store = None
+    if args.embedding_store:
+        embedding_store = EmbeddingStore(args.embedding_store)
+
+    rollups = None
+    if args.rollups:
+        rollups = RollupStore(args.rollups)
+
+    pool = None
+    if args.workers > 1:
+        pool = AnalysisPool(
+            args.workers, args.torch_threads, args.chunk_size, shared_weights=args.shared_weights
+        )
+
+    try:
+        n_rows = analyze_csv(
+            args.input, args.output, args.text_column,
+            args.csv_chunk_size, args.chunk_size, verified_facts, pool, topic_model,
+            embedding_store, args.id_column, rollups,
+            args.date_column, args.district_column, args.source_column
+        )
+    finally:
+        if pool is not None:
+            pool.close()
+        if rollups is not None:
+            rollups.close()
+
+    if topic_model is not None:
+        topic_model.save(args.topic_model)
+    metrics.flush()
+    print(f"Wrote {n_rows} rows to {args.output}")
+
+    if sentiment_analyzer.result_cache is not None:
+        stats = sentiment_analyzer.result_cache.stats()
+        print(f"Cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.1%} hit rate, {stats['entries']} entries)")
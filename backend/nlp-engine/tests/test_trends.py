@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sentiment_analyzer as sa
+from analytics_parity import detect_emerging_concerns_reference, rollups, same_trends
+from benchmark import scored_records
+
+
+def recent_frame(seed, n_rows=600, n_topics=12):
+    """
+    Scored records over the last week, with the cases the vectorized loop must keep
+
+    - two topics with exactly the same records, so their concerns tie on confidence
+    - a topic whose records all fall on one day
+    - NaN scores, including a whole day of them for one topic
+    """
+    # Both versions take "now" separately; keep records clear of the cutoff
+    cutoff = datetime.now() - timedelta(days=7, hours=-1)
+    records = [r for r in scored_records(n_rows, seed, n_topics) if r['timestamp'] > cutoff]
+    df = pd.DataFrame(records)[['timestamp', 'topic', 'source', 'score']]
+
+    rng = np.random.default_rng(seed)
+    df.loc[rng.random(len(df)) < 0.05, 'score'] = np.nan
+    twin = df[df['topic'] == 'topic 2'].assign(topic='topic 2 twin')
+    one_day = df.iloc[:15].assign(topic='one day', timestamp=df['timestamp'].iloc[0])
+    nan_day = df[df['topic'] == 'topic 1']
+    nan_day = nan_day.assign(score=np.where(
+        nan_day['timestamp'].dt.floor('D') == nan_day['timestamp'].max().floor('D'),
+        np.nan, nan_day['score']
+    ))
+    df = df[df['topic'] != 'topic 1']
+    return pd.concat([df, twin, one_day, nan_day], ignore_index=True)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('threshold', [0.5, 1.0, 2.0])
+def test_emerging_concerns_match_reference(seed, threshold):
+    df = recent_frame(seed)
+    expected = detect_emerging_concerns_reference(df.copy(), threshold=threshold)
+    actual = sa.detect_emerging_concerns(df.copy(), threshold=threshold)
+    assert actual == expected
+
+
+def test_emerging_concerns_keep_tie_order():
+    df = recent_frame(0)
+    concerns = sa.detect_emerging_concerns(df.copy(), threshold=0.5)
+    topics = [concern['topic'] for concern in concerns]
+    assert 'topic 2' in topics and 'topic 2 twin' in topics
+    assert 'one day' not in topics
+    by_topic = {concern['topic']: concern for concern in concerns}
+    assert by_topic['topic 2']['confidence'] == by_topic['topic 2 twin']['confidence']
+    assert concerns == detect_emerging_concerns_reference(df.copy(), threshold=0.5)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_rollup_trends_match_records(seed):
+    cutoff = datetime.now() - timedelta(days=7, hours=-1)
+    records = [r for r in scored_records(2000, seed, 20) if r['timestamp'] > cutoff]
+    for detect in (sa.detect_emerging_concerns, sa.detect_sentiment_spikes):
+        expected = detect(pd.DataFrame(records))
+        assert same_trends(detect(rollups(records)), expected)
@@ -0,0 +1,87 @@
+import pytest
+
+import sentiment_analyzer as sa
+from worker_memory import PeakMemoryMonitor, process_memory
+from worker_pool import AnalysisPool
+
+N_WORKERS = 2
+
+# Most memory a shared-weights worker may hold privately for the model, as a
+# fraction of the size of the parent's model weights
+MAX_SHARED_OVERHEAD = 0.25
+
+TEXTS = ['w1 w2 w3', 'w4 w5 w6 w7', 'w8'] * 8
+
+
+def save_stand_in_model(path, vocab_size, hidden_size, layers):
+    """Save a randomly initialized BERT classifier and return the size of its weights in MB"""
+    import torch
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    with open(path / 'vocab.txt', 'w') as f:
+        f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + [f'w{i}' for i in range(100)]))
+    BertTokenizerFast(vocab_file=str(path / 'vocab.txt')).save_pretrained(path)
+    torch.manual_seed(0)
+    model = BertForSequenceClassification(BertConfig(
+        vocab_size=vocab_size, hidden_size=hidden_size, num_hidden_layers=layers,
+        num_attention_heads=hidden_size // 64, intermediate_size=4 * hidden_size, num_labels=5
+    ))
+    model.save_pretrained(path)
+    return sum(p.numel() * p.element_size() for p in model.parameters()) / 2 ** 20
+
+
+@pytest.fixture(scope='module')
+def stand_in_models(tmp_path_factory):
+    """A small and a tiny stand-in sentiment model: (path, MB of weights) each"""
+    pytest.importorskip('torch')
+    pytest.importorskip('transformers')
+    models = {}
+    for name, size in (('small', (60000, 512, 4)), ('tiny', (200, 64, 1))):
+        path = tmp_path_factory.mktemp(f'{name}-sentiment-model')
+        models[name] = (str(path), save_stand_in_model(path, *size))
+    return models
+
+
+@pytest.fixture
+def offline_pipelines():
+    """spaCy pipelines without vectors, so only the sentiment model is shared and nothing is downloaded"""
+    import spacy
+
+    model_name = sa.SENTIMENT_MODEL_NAME
+    for language in sa.SPACY_MODELS:
+        sa.set_resource(f'nlp_{language}', spacy.blank('xx'))
+    yield
+    for language, spacy_model in sa.SPACY_MODELS.items():
+        sa.register_loader(f'nlp_{language}', sa._spacy_loader(spacy_model))
+    sa.use_sentiment_model(model_name)
+
+
+def shared_worker_memory(model_path):
+    """Peak memory of each worker of a shared-weights pool that scored TEXTS with a model"""
+    sa.use_sentiment_model(model_path)
+    with PeakMemoryMonitor() as monitor:
+        with AnalysisPool(N_WORKERS, torch_threads=1, resources=['sentiment_model'],
+                          shared_weights=True) as pool:
+            for future in [pool._executor.submit(sa.analyze_sentiment_batch, TEXTS)
+                           for _ in range(4 * N_WORKERS)]:
+                future.result()
+            pids = pool.worker_pids()
+            final = {pid: process_memory(pid) for pid in pids}
+    return [
+        {key: max(value, monitor.peaks.get(pid, {}).get(key, 0)) for key, value in final[pid].items()}
+        for pid in pids
+    ]
+
+
+def test_shared_weights_are_not_copied_into_workers(stand_in_models, offline_pipelines):
+    # Workers of both pools import and run the same code, so what one holds
+    # beyond the other is what its larger model costs it
+    small_path, small_mb = stand_in_models['small']
+    tiny_path, tiny_mb = stand_in_models['tiny']
+    tiny = shared_worker_memory(tiny_path)
+    small = shared_worker_memory(small_path)
+    model_mb = small_mb - tiny_mb
+
+    mean_uss = lambda workers: sum(w['uss'] for w in workers) / len(workers)
+    overhead = mean_uss(small) - mean_uss(tiny)
+    assert overhead < MAX_SHARED_OVERHEAD * model_mb
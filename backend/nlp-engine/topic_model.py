@@ -0,0 +1,176 @@
+import pickle
+
+import numpy as np
+
+# Rows used to choose the number of topics and to compute silhouette scores
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+# Size of the hashed feature space
+N_HASH_FEATURES = 2 ** 18
+
+
+class IncrementalTopicModel:
+    """
+    Topic model that is fitted once and then updated batch by batch
+
+    Texts are vectorized with a stateless HashingVectorizer (so there is no
+    vocabulary to refit) and topics come from an online MiniBatchNMF. Each
+    update nudges the existing topic components instead of refitting them, so
+    topic ids stay stable between runs and assigning topics to a new batch
+    costs O(batch). The number of topics is chosen once, on the first batch,
+    with KMeans and a sampled silhouette score.
+
+    Usage:
+        model = IncrementalTopicModel.load_or_create('topics.pkl')
+        topics = model.update(processed_texts)
+        model.save('topics.pkl')
+    """
+
+    def __init__(self, n_topics=None, max_topics=5, n_features=N_HASH_FEATURES,
+                 batch_size=1024, random_state=42):
+        """
+        Args:
+            n_topics: Fixed number of topics (chosen on the first batch if None)
+            max_topics: Largest number of topics considered when choosing
+            n_features: Size of the hashed feature space
+            batch_size: Mini-batch size for NMF updates
+            random_state: Seed for KMeans, sampling and NMF
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.n_topics = n_topics
+        self.max_topics = max_topics
+        self.n_features = n_features
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features, alternate_sign=False, norm='l2', stop_words='english'
+        )
+        self.nmf = None
+        # First term seen for each hashed feature (at most one per feature),
+        # used to label topics
+        self.terms = {}
+        self.n_documents = 0
+
+    @property
+    def fitted(self):
+        return self.nmf is not None
+
+    def _vectorize(self, texts):
+        """Hash texts into features, remembering which term each feature came from"""
+        from sklearn.utils import murmurhash3_32
+
+        analyzer = self.vectorizer.build_analyzer()
+        for text in texts:
+            for term in analyzer(text):
+                # Same feature index as HashingVectorizer
+                index = abs(murmurhash3_32(term, seed=0)) % self.n_features
+                if index not in self.terms:
+                    self.terms[index] = term
+
+        return self.vectorizer.transform(texts)
+
+    def _choose_n_topics(self, features):
+        """Pick the number of topics by silhouette score on a sample"""
+        from sklearn.cluster import KMeans
+        from sklearn.metrics import silhouette_score
+
+        n_docs = features.shape[0]
+        max_topics = min(self.max_topics, n_docs - 1)
+        if max_topics < 2:
+            return 2
+
+        rng = np.random.default_rng(self.random_state)
+        if n_docs > SILHOUETTE_SAMPLE_SIZE:
+            sample = features[rng.choice(n_docs, SILHOUETTE_SAMPLE_SIZE, replace=False)]
+        else:
+            sample = features
+
+        best_n, best_score = 2, -1.0
+        for n in range(2, max_topics + 1):
+            if sample.shape[0] <= n:
+                break
+            labels = KMeans(n_clusters=n, random_state=self.random_state, n_init=3).fit_predict(sample)
+            if len(set(labels)) < 2:
+                continue
+            score = silhouette_score(sample, labels, random_state=self.random_state)
+            if score > best_score:
+                best_n, best_score = n, score
+
+        return best_n
+
+    def partial_fit(self, texts):
+        """Update the topics with a new batch of preprocessed texts"""
+        from sklearn.decomposition import MiniBatchNMF
+
+        if len(texts) == 0:
+            return self
+
+        features = self._vectorize(texts)
+
+        if not self.fitted:
+            if self.n_topics is None:
+                self.n_topics = self._choose_n_topics(features)
+            self.nmf = MiniBatchNMF(
+                n_components=self.n_topics,
+                batch_size=self.batch_size,
+                random_state=self.random_state
+            )
+
+        self.nmf.partial_fit(features)
+        self.n_documents += len(texts)
+        return self
+
+    def transform(self, texts):
+        """Dominant topic id of each text"""
+        if len(texts) == 0:
+            return []
+        features = self.vectorizer.transform(texts)
+        return np.argmax(self.nmf.transform(features), axis=1).tolist()
+
+    def topics(self, n_words=10):
+        """Current topics in the same format as extract_topics"""
+        topics = []
+        for topic_idx, topic in enumerate(self.nmf.components_):
+            # Only features with a known term can label a topic
+            top_idx = np.argpartition(-topic, min(len(topic) - 1, 4 * n_words))[:4 * n_words]
+            top_idx = top_idx[np.argsort(-topic[top_idx])]
+            top_words = [self.terms[i] for i in top_idx if topic[i] > 0 and i in self.terms][:n_words]
+            topics.append({
+                'id': topic_idx,
+                'words': top_words,
+                'label': ' '.join(top_words[:3])  # Auto-label based on top 3 words
+            })
+        return topics
+
+    def update(self, texts):
+        """
+        Update the model with a batch and assign its topics
+
+        Returns:
+            Dict with 'topics' and 'document_topics', like extract_topics
+        """
+        self.partial_fit(texts)
+        if not self.fitted:
+            return {'topics': [], 'document_topics': []}
+        return {
+            'topics': self.topics(),
+            'document_topics': self.transform(texts)
+        }
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @classmethod
+    def load_or_create(cls, path, **kwargs):
+        """Load a saved model, or create a new one if path does not exist"""
+        try:
+            return cls.load(path)
+        except FileNotFoundError:
+            return cls(**kwargs)
@@ -0,0 +1,228 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+
+NS_PER_HOUR = 3600 * 10 ** 9
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+
+class RollingBuckets:
+    """
+    Fixed-size ring buffer of per-period score aggregates
+
+    Each slot holds one period (a day or an hour number) with its count, mean
+    and sum of squared deviations (M2), updated with Welford's algorithm. A
+    period's slot is reused once the period falls n_slots periods behind.
+    """
+
+    def __init__(self, n_slots):
+        self.period = np.full(n_slots, -1, dtype=np.int64)
+        self.count = np.zeros(n_slots, dtype=np.int64)
+        self.mean = np.zeros(n_slots)
+        self.m2 = np.zeros(n_slots)
+
+    def add(self, period, value):
+        """Add one value to a period; returns False if the period was already evicted"""
+        slot = period % len(self.period)
+        if self.period[slot] != period:
+            if self.period[slot] > period:
+                return False
+            self.period[slot] = period
+            self.count[slot] = 0
+            self.mean[slot] = 0.0
+            self.m2[slot] = 0.0
+
+        count = self.count[slot] + 1
+        delta = value - self.mean[slot]
+        self.mean[slot] += delta / count
+        self.m2[slot] += delta * (value - self.mean[slot])
+        self.count[slot] = count
+        return True
+
+    def window(self, first_period):
+        """
+        Non-empty periods from first_period on, oldest first
+
+        Returns:
+            (periods, counts, means, variances) arrays
+        """
+        mask = (self.period >= first_period) & (self.count > 0)
+        order = np.argsort(self.period[mask])
+        counts = self.count[mask][order]
+        m2 = self.m2[mask][order]
+        variances = np.divide(m2, counts - 1, out=np.full(len(counts), np.nan), where=counts > 1)
+        return self.period[mask][order], counts, self.mean[mask][order], variances
+
+
+class StreamingTrendDetector:
+    """
+    Incremental version of detect_emerging_concerns and detect_sentiment_spikes
+
+    Scored records are folded into rolling aggregates as they arrive: one ring
+    of daily buckets per topic and one ring of hourly buckets overall, each
+    covering time_window_days. Adding a record is O(1) and checking for
+    concerns or spikes only reads the rings, so an alert check costs the same
+    however much history has been seen. The results have the same format as
+    the batch functions; windows are aligned to whole days (concerns) and
+    hours (spikes), so the bucket straddling the cutoff is counted in full.
+
+    Usage:
+        detector = StreamingTrendDetector.load_or_create('trends.pkl')
+        detector.update(new_records)
+        concerns = detector.emerging_concerns()
+        spikes = detector.sentiment_spikes()
+        detector.save('trends.pkl')
+    """
+
+    def __init__(self, time_window_days=7, concern_threshold=2.0, spike_threshold=3.0):
+        """
+        Args:
+            time_window_days: Days of history kept and analyzed
+            concern_threshold: Standard deviation threshold for concerns
+            spike_threshold: Standard deviation threshold for spikes
+        """
+        self.time_window_days = time_window_days
+        self.concern_threshold = concern_threshold
+        self.spike_threshold = spike_threshold
+        self.topics = {}
+        self.hours = RollingBuckets(time_window_days * 24 + 1)
+        self.n_records = 0
+        self.n_dropped = 0
+
+    def add(self, timestamp, score, topic=None):
+        """Add one scored record"""
+        ns = pd.Timestamp(timestamp).value
+        if not self.hours.add(ns // NS_PER_HOUR, score):
+            self.n_dropped += 1
+            return
+
+        if topic is not None and topic == topic:  # NaN topics are skipped, like groupby does
+            days = self.topics.get(topic)
+            if days is None:
+                days = self.topics[topic] = RollingBuckets(self.time_window_days + 1)
+            days.add(ns // NS_PER_DAY, score)
+        self.n_records += 1
+
+    def update(self, records):
+        """
+        Add scored records
+
+        Args:
+            records: A dict or a list of dicts with 'timestamp', 'score' and
+                (for concerns) 'topic', like the batch functions take
+        """
+        if isinstance(records, dict):
+            records = [records]
+        for record in records:
+            self.add(record['timestamp'], record['score'], record.get('topic'))
+        return self
+
+    def _cutoff(self, now):
+        now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+        return (now - pd.Timedelta(days=self.time_window_days)).value
+
+    def emerging_concerns(self, now=None, threshold=None):
+        """
+        Topics with significantly declining daily sentiment
+
+        Same output as detect_emerging_concerns over the records added so far.
+
+        Args:
+            now: Reference time for the window (defaults to the current time)
+            threshold: Standard deviation threshold (defaults to concern_threshold)
+        """
+        threshold = self.concern_threshold if threshold is None else threshold
+        first_day = self._cutoff(now) // NS_PER_DAY
+
+        emerging_concerns = []
+        for topic, days in self.topics.items():
+            _, counts, sentiment_values, _ = days.window(first_day)
+
+            # Skip topics with too few data points
+            if len(sentiment_values) < 3 or counts.sum() < 10:
+                continue
+
+            # Moving average of the daily means
+            ma = np.convolve(sentiment_values, np.ones(3)/3, mode='valid')
+            std = np.std(sentiment_values)
+
+            if len(ma) >= 2 and ma[-1] < ma[0] - threshold * std:
+                emerging_concerns.append({
+                    'topic': topic,
+                    'sentiment_start': float(ma[0]),
+                    'sentiment_end': float(ma[-1]),
+                    'change': float(ma[-1] - ma[0]),
+                    'message_volume': int(counts.sum()),
+                    'confidence': float(min(1.0, abs(ma[-1] - ma[0]) / (std + 1e-5)))
+                })
+
+        emerging_concerns.sort(key=lambda x: x['confidence'], reverse=True)
+        return emerging_concerns
+
+    def sentiment_spikes(self, now=None, threshold=None):
+        """
+        Hours with a sudden drop in sentiment
+
+        Same output as detect_sentiment_spikes over the records added so far:
+        the first 80% of the hours between the oldest and newest record in the
+        window are the baseline, and the remaining hours are checked against it.
+
+        Args:
+            now: Reference time for the window (defaults to the current time)
+            threshold: Standard deviation threshold (defaults to spike_threshold)
+        """
+        threshold = self.spike_threshold if threshold is None else threshold
+        periods, counts, means, _ = self.hours.window(self._cutoff(now) // NS_PER_HOUR)
+        if len(periods) == 0:
+            return []
+
+        # Every hour between the first and last record, empty ones included
+        n_hours = int(periods[-1] - periods[0]) + 1
+        offsets = periods - periods[0]
+        hourly_mean = np.full(n_hours, np.nan)
+        hourly_mean[offsets] = means
+        hourly_count = np.zeros(n_hours, dtype=np.int64)
+        hourly_count[offsets] = counts
+
+        baseline_end_idx = int(n_hours * 0.8)
+        if baseline_end_idx < 3:  # Not enough data
+            return []
+
+        baseline = hourly_mean[:baseline_end_idx]
+        baseline = baseline[~np.isnan(baseline)]
+        baseline_mean = baseline.mean() if len(baseline) else np.nan
+        baseline_std = baseline.std(ddof=1) if len(baseline) > 1 else np.nan
+
+        spikes = []
+        for offset in range(baseline_end_idx, n_hours):
+            mean = hourly_mean[offset]
+            if mean < baseline_mean - threshold * baseline_std and hourly_count[offset] > 5:
+                spikes.append({
+                    'timestamp': pd.Timestamp((periods[0] + offset) * NS_PER_HOUR),
+                    'sentiment_value': float(mean),
+                    'baseline_mean': float(baseline_mean),
+                    'deviation': float(mean - baseline_mean),
+                    'message_count': int(hourly_count[offset]),
+                    'confidence': float(min(1.0, abs(mean - baseline_mean) / (baseline_std + 1e-5)))
+                })
+
+        spikes.sort(key=lambda x: x['confidence'], reverse=True)
+        return spikes
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+    @classmethod
+    def load_or_create(cls, path, **kwargs):
+        """Load a saved detector, or create a new one if path does not exist"""
+        try:
+            return cls.load(path)
+        except FileNotFoundError:
+            return cls(**kwargs)
@@ -0,0 +1,160 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+
+import pandas as pd
+
+import sentiment_analyzer as sa
+from worker_pool import AnalysisPool
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASET_PATH = os.path.join(ENGINE_DIR, 'Newdataset.csv')
+
+DEFAULT_WORKERS = 4
+
+# Seconds between two samples of the workers' memory while a pool runs
+SAMPLE_INTERVAL = 0.05
+
+
+def process_memory(pid='self'):
+    """
+    Memory of one process from /proc/<pid>/smaps_rollup, in MB
+
+    'rss' counts shared pages in full in every process mapping them, so it
+    overstates what a worker costs; 'pss' divides shared pages among their
+    processes and 'uss' (private pages only) is what the node saves by not
+    starting the process.
+    """
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'uss': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+
+class PeakMemoryMonitor:
+    """
+    Highest memory (see process_memory) each child process reached while active
+
+    Model loading can briefly hold more than the steady state, e.g. a
+    vector table read from disk and then dropped, so the peaks are what
+    decides how many workers fit on a node. Samples every SAMPLE_INTERVAL
+    seconds in a thread; a peak shorter than that can be missed.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peaks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while True:
+            for child in multiprocessing.active_children():
+                try:
+                    memory = process_memory(child.pid)
+                except (FileNotFoundError, ProcessLookupError, KeyError):
+                    continue
+                peak = self.peaks.setdefault(child.pid, dict(memory))
+                for key, value in memory.items():
+                    peak[key] = max(peak[key], value)
+            if self._stop.wait(self.interval):
+                break
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+
+def measure_pool(texts, n_workers=DEFAULT_WORKERS, shared_weights=False, start_method='spawn'):
+    """
+    Memory of the parent and every worker of a pool while and after it analyzes texts
+
+    With texts=None the workers load no model and analyze nothing, which
+    gives the baseline cost of a worker process (interpreter and libraries).
+
+    Returns:
+        Dict with the parent's memory, each worker's after the run and at its
+        peak, and their means and totals
+    """
+    resources = [] if texts is None else None
+    with PeakMemoryMonitor() as monitor:
+        with AnalysisPool(n_workers, torch_threads=1, start_method=start_method,
+                          resources=resources, shared_weights=shared_weights) as pool:
+            if texts is not None:
+                pool.analyze_batch(texts)
+            pids = pool.worker_pids()
+            workers = [process_memory(pid) for pid in pids]
+            parent = process_memory()
+    peaks = [monitor.peaks.get(pid, worker) for pid, worker in zip(pids, workers)]
+
+    return {
+        'mode': 'baseline' if texts is None else 'shared' if shared_weights else 'private',
+        'start_method': start_method,
+        'parent': parent,
+        'workers': workers,
+        'worker_mean': {key: sum(w[key] for w in workers) / len(workers) for key in parent},
+        'worker_peaks': peaks,
+        'worker_peak_mean': {key: sum(w[key] for w in peaks) / len(peaks) for key in parent},
+        # What the node actually holds for the whole pool
+        'total_pss': parent['pss'] + sum(w['pss'] for w in workers),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description='Measure per-worker memory of the analysis pool with and without shared weights'
+    )
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--start-method', default='spawn', choices=['spawn', 'forkserver', 'fork'])
+    parser.add_argument('--data', default=DATASET_PATH)
+    parser.add_argument('--text-column', default='Comment')
+    parser.add_argument('--max-overhead-ratio', type=float,
+                        help='Fail unless the peak PSS a shared-weights worker adds over the '
+                             'baseline is at most this fraction of what a private-weights one adds')
+    parser.add_argument('--output', help='Also write the measurements to this JSON file')
+    args = parser.parse_args()
+
+    texts = pd.read_csv(args.data)[args.text_column].tolist()
+    # Cached results would let the workers skip the models
+    sa.disable_result_cache()
+
+    runs = []
+    for run_texts, shared_weights in [(None, False), (texts, False), (texts, True)]:
+        run = measure_pool(run_texts, args.workers, shared_weights, args.start_method)
+        runs.append(run)
+        mean, peak = run['worker_mean'], run['worker_peak_mean']
+        print(f"{run['mode']} ({args.workers} workers, {args.start_method}):")
+        print(f"  parent        rss {run['parent']['rss']:8.1f}  pss {run['parent']['pss']:8.1f}  "
+              f"uss {run['parent']['uss']:8.1f} MB")
+        print(f"  worker (mean) rss {mean['rss']:8.1f}  pss {mean['pss']:8.1f}  uss {mean['uss']:8.1f} MB")
+        print(f"  worker (peak) rss {peak['rss']:8.1f}  pss {peak['pss']:8.1f}  uss {peak['uss']:8.1f} MB")
+        print(f"  pool total pss {run['total_pss']:.1f} MB")
+
+    # Memory each worker adds on top of an idle worker process, at its peak
+    baseline, private, shared = (run['worker_peak_mean']['pss'] for run in runs)
+    overheads = {'private': private - baseline, 'shared': shared - baseline}
+    ratio = overheads['shared'] / overheads['private'] if overheads['private'] > 0 else float('nan')
+    print(f"Per-worker peak PSS over the baseline: {overheads['private']:.1f} MB with private "
+          f"weights, {overheads['shared']:.1f} MB with shared weights ({ratio:.1%})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'runs': runs, 'worker_overhead_mb': overheads, 'overhead_ratio': ratio}, f, indent=2)
+
+    if args.max_overhead_ratio is not None and not ratio <= args.max_overhead_ratio:
+        print(f"FAIL: overhead ratio above {args.max_overhead_ratio:.1%}")
+        sys.exit(1)
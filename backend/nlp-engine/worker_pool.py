@@ -0,0 +1,238 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import numpy as np
+
+import sentiment_analyzer
+from dedup import NEAR_DUPLICATE_THRESHOLD
+from fact_index import FactIndex
+
+# Texts sent to a worker per task
+POOL_CHUNK_SIZE = 256
+
+# Resources whose weights the parent shares with the workers in shared-weights mode
+SHARED_RESOURCES = ('sentiment_model', 'nlp_en', 'nlp_fr')
+
+
+def share_weights(names=SHARED_RESOURCES):
+    """
+    Load resources in this process and move their weights to shared memory
+
+    The sentiment model's parameters are moved with Module.share_memory() and
+    each spaCy pipeline's word vector table is copied into a shared tensor
+    that this process then uses too, so there is one copy of each. A
+    pipeline's handle also carries its vector keys (key -> row, a few MB),
+    so workers can load the pipeline without any vectors. The handles
+    returned are picklable: sent to a spawned worker, torch passes the
+    shared memory segments instead of copying the data.
+
+    Returns:
+        Dict of resource name -> shared handle, for attach_shared_weights
+    """
+    import torch
+
+    shared = {}
+    for name in names:
+        if name == 'sentiment_model':
+            tokenizer, model = sentiment_analyzer.get_resource(name)
+            shared[name] = (tokenizer, model.share_memory())
+        elif name.startswith('nlp_'):
+            nlp = sentiment_analyzer.get_nlp(name[len('nlp_'):])
+            if nlp is None or nlp.vocab.vectors.size == 0:
+                continue
+            table = torch.from_numpy(np.ascontiguousarray(nlp.vocab.vectors.data)).share_memory_()
+            nlp.vocab.vectors.data = table.numpy()
+            shared[name] = (table, nlp.vocab.vectors.to_bytes(exclude=['strings', 'vectors']))
+    return shared
+
+
+def attach_shared_weights(shared):
+    """
+    Use weights shared by the parent (see share_weights) in this process
+
+    The sentiment model is used as is. spaCy pipelines are loaded from disk
+    without their vectors, which are then attached as a view of the shared
+    table, so no private copy of the table is ever read in.
+    """
+    for name, handle in shared.items():
+        if name == 'sentiment_model':
+            sentiment_analyzer.set_resource(name, handle)
+            continue
+
+        import spacy
+        from spacy.vectors import Vectors
+
+        table, vector_keys = handle
+        nlp = spacy.load(sentiment_analyzer.SPACY_MODELS[name[len('nlp_'):]], exclude=['vectors'])
+        vectors = Vectors(strings=nlp.vocab.strings, data=table.numpy(), name=nlp.vocab.vectors.name)
+        vectors.from_bytes(vector_keys, exclude=['strings', 'vectors'])
+        nlp.vocab.vectors = vectors
+        sentiment_analyzer.set_resource(name, nlp)
+
+
+def _init_worker(torch_threads, cache_path, sentiment_model, sentiment_backend, sentiment_cascade,
+                 resources, shared_weights):
+    """Runs once in each worker: cap torch threads and load the models"""
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    sentiment_analyzer.use_sentiment_model(sentiment_model)
+    sentiment_analyzer.use_sentiment_backend(*sentiment_backend)
+    sentiment_analyzer.use_sentiment_cascade(*sentiment_cascade)
+    if cache_path:
+        sentiment_analyzer.enable_result_cache(cache_path)
+    attach_shared_weights(shared_weights)
+    sentiment_analyzer.warmup(resources)
+
+
+def _worker_pid():
+    # Long enough that every idle worker picks up one of a round of probes
+    time.sleep(0.05)
+    return os.getpid()
+
+
+def _analyze_task(texts, verified_facts):
+    """Analyze one chunk inside a worker"""
+    return list(sentiment_analyzer.analyze_text_stream(texts, verified_facts, len(texts)))
+
+
+class AnalysisPool:
+    """
+    Process pool that runs the analysis pipeline on several cores
+
+    Each worker loads the models once in its initializer and then analyzes
+    chunks of texts; results always come back in input order. Keep
+    n_workers * torch_threads at or below the number of cores, otherwise torch's
+    intra-op threads fight each other for the CPU.
+
+    With shared_weights, the parent loads the sentiment model and the spaCy
+    vector tables once and the workers use them from shared memory, so each
+    worker adds little more than its own activations and the rest of the
+    spaCy pipelines (see share_weights; measure with worker_memory.py). The
+    'torch' backend benefits fully; 'int8' quantizes a private copy of the
+    model and 'onnx' opens its own session in each worker.
+
+    Usage:
+        with AnalysisPool(n_workers=8) as pool:
+            results = pool.analyze_batch(texts)
+    """
+
+    def __init__(self, n_workers=None, torch_threads=None, chunk_size=POOL_CHUNK_SIZE,
+                 start_method='spawn', resources=None, shared_weights=False):
+        """
+        Args:
+            n_workers: Number of worker processes (defaults to the number of cores)
+            torch_threads: Intra-op threads per worker (defaults to cores / n_workers)
+            chunk_size: Number of texts per task
+            start_method: multiprocessing start method ('spawn', 'fork' or 'forkserver')
+            resources: Resource names each worker loads up front (defaults to all)
+            shared_weights: Load the model weights once here and share them
+                with the workers instead of loading a copy in each
+        """
+        n_cores = os.cpu_count() or 1
+        self.n_workers = n_workers or n_cores
+        self.torch_threads = torch_threads or max(1, n_cores // self.n_workers)
+        self.chunk_size = chunk_size
+
+        # Workers share the parent's result cache file, if one is enabled,
+        # and its choice of sentiment model, backend and cascade
+        cache = sentiment_analyzer.result_cache
+        cache_path = cache.path if cache is not None else None
+        sentiment_model = sentiment_analyzer.SENTIMENT_MODEL_NAME
+        sentiment_backend = (
+            sentiment_analyzer.SENTIMENT_BACKEND, sentiment_analyzer.SENTIMENT_ONNX_PATH
+        )
+        if sentiment_backend[0] == 'onnx' and not os.path.exists(sentiment_backend[1]):
+            # Export once here rather than racing to export in every worker
+            sentiment_analyzer.get_sentiment_backend()
+        sentiment_cascade = (
+            sentiment_analyzer.SENTIMENT_CASCADE_THRESHOLD, sentiment_analyzer.SENTIMENT_CASCADE_PATH
+        )
+        if sentiment_cascade[0] is not None:
+            # Likewise, train the linear tier once if it has not been saved yet
+            sentiment_analyzer.get_resource('sentiment_cascade')
+
+        shared = share_weights() if shared_weights else {}
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.n_workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(
+                self.torch_threads, cache_path, sentiment_model, sentiment_backend,
+                sentiment_cascade, resources, shared
+            )
+        )
+
+    def stream(self, texts, verified_facts=None):
+        """
+        Analyze an iterable of texts on the pool, yielding results in order
+
+        At most two tasks per worker are in flight, so memory stays bounded
+        for inputs of any size. Topics are not assigned (see analyze_batch).
+        """
+        # Build the fact index once here rather than in every task
+        if verified_facts and not isinstance(verified_facts, FactIndex):
+            verified_facts = sentiment_analyzer.build_fact_index(verified_facts)
+
+        iterator = iter(texts)
+        pending = deque()
+        max_pending = 2 * self.n_workers
+
+        while True:
+            while len(pending) < max_pending:
+                chunk = list(islice(iterator, self.chunk_size))
+                if not chunk:
+                    break
+                pending.append(self._executor.submit(_analyze_task, chunk, verified_facts))
+
+            if not pending:
+                break
+            yield from pending.popleft().result()
+
+    def worker_pids(self, timeout=600):
+        """Process ids of the workers, once every one of them has started (or timeout seconds)"""
+        pids = set()
+        deadline = time.monotonic() + timeout
+        while len(pids) < self.n_workers and time.monotonic() < deadline:
+            futures = [self._executor.submit(_worker_pid) for _ in range(self.n_workers)]
+            pids.update(future.result() for future in futures)
+        return sorted(pids)
+
+    def analyze_batch(self, texts, verified_facts=None, topic_model=None, dedup=True,
+                      near_duplicate_threshold=NEAR_DUPLICATE_THRESHOLD):
+        """
+        Parallel equivalent of analyze_text_batch, including duplicate collapse and topic extraction
+
+        Duplicates are found here and only the distinct texts go to the workers.
+        """
+        texts = list(texts)
+        duplicate_of = sentiment_analyzer.collapse_duplicates(texts, dedup, near_duplicate_threshold)
+        results = list(self.stream(
+            (text for text, representative in zip(texts, duplicate_of) if representative is None),
+            verified_facts
+        ))
+        results = sentiment_analyzer.assign_topics(results, topic_model)
+        return sentiment_analyzer.expand_duplicates(texts, duplicate_of, results)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def analyze_text_batch_parallel(texts, verified_facts=None, n_workers=None,
+                                torch_threads=None, chunk_size=POOL_CHUNK_SIZE, dedup=True,
+                                near_duplicate_threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Run analyze_text_batch on a temporary process pool"""
+    with AnalysisPool(n_workers, torch_threads, chunk_size) as pool:
+        return pool.analyze_batch(texts, verified_facts, dedup=dedup,
+                                  near_duplicate_threshold=near_duplicate_threshold)
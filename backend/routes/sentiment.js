@@ -5,9 +5,17 @@ const router = express.Router();
 const { authenticateUser } = require('../middleware/auth');
 const SentimentData = require('../models/SentimentData');
 const SentimentTrend = require('../models/SentimentTrend');
+const nlpInference = require('../services/nlpInference');
 const multer = require('multer');
 const upload = multer({ dest: 'uploads/' });
 
+// Where /overview reads from: 'sentimentData' (default) aggregates the MongoDB
+// SentimentData documents; 'rollups' reads the inference server's hourly/daily
+// rollups, which hold what the Python pipeline scored (stream_pipeline.py
+// --rollups), not the SentimentData collection. The two are different datasets,
+// so there is no fallback from one to the other; responses name their source.
+const OVERVIEW_SOURCE = process.env.NLP_OVERVIEW_SOURCE === 'rollups' ? 'rollups' : 'sentimentData';
+
 /**
  * @route   GET /api/sentiment/overview
  * @desc    Get sentiment overview data
@@ -16,6 +24,28 @@ const upload = multer({ dest: 'uploads/' });
 router.get('/overview', authenticateUser, async (req, res) => {
   try {
     const { timeframe = 'monthly', startDate, endDate } = req.query;
+
+    if (OVERVIEW_SOURCE === 'rollups') {
+      let overview;
+      try {
+        const range = startDate && endDate ? { startDate, endDate } : {};
+        overview = await nlpInference.overview({ timeframe, ...range });
+      } catch (err) {
+        if (!(err instanceof nlpInference.InferenceError)) {
+          throw err;
+        }
+        const status = [400, 503, 504].includes(err.status) ? err.status : 502;
+        return res.status(status).json({ error: err.message, dataSource: OVERVIEW_SOURCE });
+      }
+      await SentimentTrend.create({
+        date: new Date(),
+        timeframe: overview.timeframe,
+        overallSentiment: overview.overallSentiment,
+        trend: overview.trend,
+        dataPoints: overview.sentimentTrends
+      });
+      return res.json({ ...overview, dataSource: OVERVIEW_SOURCE });
+    }
     
     // Build date filter
     const dateFilter = {};
@@ -177,7 +207,8 @@ router.get('/overview', authenticateUser, async (req, res) => {
         ? Math.abs(trend / Math.abs(previousPeriodSentiment[0].avgScore)) * 100 
         : 0,
       timeframe,
-      sentimentTrends
+      sentimentTrends,
+      dataSource: OVERVIEW_SOURCE
     });
   } catch (err) {
     console.error('Error fetching sentiment overview:', err);
@@ -395,6 +426,50 @@ router.get('/raw', authenticateUser, async (req, res) => {
   }
 });
 
+/**
+ * @route   POST /api/sentiment/score
+ * @desc    Score new comments with the NLP inference server
+ * @body    { text } for one comment or { texts: [...] } for several
+ * @access  Private
+ */
+router.post('/score', authenticateUser, async (req, res) => {
+  try {
+    const { text, texts } = req.body || {};
+
+    if (typeof text === 'string' && text.trim()) {
+      return res.json(await nlpInference.scoreText(text));
+    }
+    if (Array.isArray(texts) && texts.length > 0 && texts.every(t => typeof t === 'string')) {
+      return res.json({ results: await nlpInference.scoreTexts(texts) });
+    }
+    res.status(400).json({ error: "Provide 'text' or a non-empty 'texts' array" });
+  } catch (err) {
+    if (err instanceof nlpInference.InferenceError) {
+      // Pass backpressure through so clients retry instead of piling up
+      if (err.status === 503 && err.retryAfter) {
+        res.set('Retry-After', err.retryAfter);
+      }
+      const status = [400, 413, 503, 504].includes(err.status) ? err.status : 502;
+      return res.status(status).json({ error: err.message });
+    }
+    console.error('Error scoring sentiment:', err);
+    res.status(500).json({ error: 'Failed to score sentiment' });
+  }
+});
+
+/**
+ * @route   GET /api/sentiment/inference-health
+ * @desc    Status of the NLP inference server
+ * @access  Private
+ */
+router.get('/inference-health', authenticateUser, async (req, res) => {
+  try {
+    res.json(await nlpInference.health());
+  } catch (err) {
+    res.status(503).json({ status: 'unavailable', error: err.message });
+  }
+});
+
 /**
  * @route   POST /api/sentiment/batch
  * @desc    Upload and process a batch of sentiment data
@@ -0,0 +1,118 @@
+// services/nlpInference.js - Client for the Python NLP inference server
+//
+// Start the server with `python backend/nlp-engine/inference_server.py`
+// (add `--unix-socket /tmp/nlp-inference.sock` to use a Unix socket) and set
+// NLP_INFERENCE_SOCKET or NLP_INFERENCE_URL accordingly.
+
+const http = require('http');
+
+const INFERENCE_URL = new URL(process.env.NLP_INFERENCE_URL || 'http://127.0.0.1:8765');
+const INFERENCE_SOCKET = process.env.NLP_INFERENCE_SOCKET;
+const DEFAULT_TIMEOUT_MS = parseInt(process.env.NLP_INFERENCE_TIMEOUT_MS || '2000');
+
+// Reuse connections so each request skips the TCP/socket handshake
+const agent = new http.Agent({ keepAlive: true, maxSockets: 64 });
+
+/**
+ * Error returned by the inference server (or raised when it cannot be reached)
+ * status is the HTTP status, or 502 when the server did not answer
+ */
+class InferenceError extends Error {
+  constructor(message, status, retryAfter) {
+    super(message);
+    this.name = 'InferenceError';
+    this.status = status;
+    this.retryAfter = retryAfter;
+  }
+}
+
+function request(method, path, body, timeoutMs = DEFAULT_TIMEOUT_MS) {
+  const payload = body === undefined ? null : Buffer.from(JSON.stringify(body));
+  const options = {
+    method,
+    path,
+    agent,
+    headers: { 'Content-Type': 'application/json' }
+  };
+  if (payload) {
+    options.headers['Content-Length'] = payload.length;
+  }
+  if (INFERENCE_SOCKET) {
+    options.socketPath = INFERENCE_SOCKET;
+  } else {
+    options.hostname = INFERENCE_URL.hostname;
+    options.port = INFERENCE_URL.port;
+  }
+
+  return new Promise((resolve, reject) => {
+    const req = http.request(options, (res) => {
+      const chunks = [];
+      res.on('data', (chunk) => chunks.push(chunk));
+      res.on('end', () => {
+        let data;
+        try {
+          data = JSON.parse(Buffer.concat(chunks).toString('utf8'));
+        } catch (err) {
+          return reject(new InferenceError('Invalid response from inference server', 502));
+        }
+        if (res.statusCode !== 200) {
+          return reject(new InferenceError(
+            data.error || `Inference server returned ${res.statusCode}`,
+            res.statusCode,
+            res.headers['retry-after']
+          ));
+        }
+        resolve(data);
+      });
+    });
+
+    req.setTimeout(timeoutMs, () => {
+      req.destroy(new InferenceError('Inference server timed out', 504));
+    });
+    req.on('error', (err) => {
+      reject(err instanceof InferenceError
+        ? err
+        : new InferenceError(`Inference server unavailable: ${err.message}`, 502));
+    });
+
+    if (payload) {
+      req.write(payload);
+    }
+    req.end();
+  });
+}
+
+/**
+ * Score one text
+ * Resolves to { language, language_confidence, sentiment: { sentiment, score, confidence } }
+ */
+exports.scoreText = (text, options = {}) =>
+  request('POST', '/v1/sentiment', { text }, options.timeoutMs);
+
+/**
+ * Score several texts in one request (at most 256)
+ * Resolves to a list of results in the same order as texts
+ */
+exports.scoreTexts = async (texts, options = {}) => {
+  const data = await request('POST', '/v1/sentiment', { texts }, options.timeoutMs);
+  return data.results;
+};
+
+/**
+ * Inference server status: queue depth, batch counters and configuration
+ */
+exports.health = (options = {}) => request('GET', '/health', undefined, options.timeoutMs);
+
+/**
+ * Sentiment overview from the server's rollup store (needs --rollups); these are the
+ * records the Python pipeline scored, not the SentimentData collection
+ * params: { timeframe, startDate, endDate }; resolves to the /api/sentiment/overview response
+ */
+exports.overview = (params = {}, options = {}) => {
+  const query = new URLSearchParams(
+    Object.entries(params).filter(([, value]) => value !== undefined && value !== null)
+  );
+  return request('GET', `/v1/overview?${query}`, undefined, options.timeoutMs);
+};
+
+exports.InferenceError = InferenceError;